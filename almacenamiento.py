@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Utilidades de almacenamiento para los CSV de datos_tratados.
+Permite escribir y localizar CSV comprimidos (gzip o zstd) de forma transparente.
+pandas detecta la compresión por la extensión al leer (.csv.gz, .csv.zst).
+También guarda libros de Excel en segundo plano mientras se calcula el siguiente.
+"""
+
+import gzip
+import json
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+from typing import IO, Any, Callable, Iterator, List, Optional
+
+try:
+    import zstandard
+except ImportError:  # zstd es opcional
+    zstandard = None
+
+
+# Extensión añadida al nombre del CSV según el códec
+EXTENSIONES_COMPRESION = {
+    None: '',
+    'gzip': '.gz',
+    'zstd': '.zst',
+}
+
+# Nivel por defecto de cada códec si no se indica otro
+NIVELES_POR_DEFECTO = {
+    'gzip': 6,
+    'zstd': 3,
+}
+
+# Patrones de los CSV admitidos al buscar archivos de salida
+PATRONES_CSV = ['*.csv'] + [f'*.csv{ext}' for ext in EXTENSIONES_COMPRESION.values() if ext]
+
+
+def validar_compresion(compresion: Optional[str]):
+    """Comprueba que el códec es conocido y está disponible."""
+    if compresion not in EXTENSIONES_COMPRESION:
+        raise ValueError(f"Compresión no soportada: {compresion} "
+                         f"(opciones: {', '.join(c for c in EXTENSIONES_COMPRESION if c)})")
+    if compresion == 'zstd' and zstandard is None:
+        raise ValueError("La compresión zstd requiere el paquete 'zstandard' (pip install zstandard)")
+
+
+def ruta_con_compresion(ruta: Path, compresion: Optional[str]) -> Path:
+    """Añade la extensión del códec a una ruta .csv (sin cambios si no hay compresión)."""
+    return ruta.with_name(ruta.name + EXTENSIONES_COMPRESION[compresion])
+
+
+def eliminar_otras_compresiones(ruta: Path, compresion: Optional[str]):
+    """
+    Borra las copias de un CSV (ruta terminada en .csv) escritas con otro códec. Los
+    lectores buscan todas las extensiones, así que una copia antigua se contaría dos veces.
+    """
+    for otra in EXTENSIONES_COMPRESION:
+        if otra != compresion:
+            ruta_con_compresion(ruta, otra).unlink(missing_ok=True)
+
+
+def eliminar_csv(ruta: Path):
+    """Borra un CSV (ruta terminada en .csv) en cualquiera de las compresiones."""
+    for compresion in EXTENSIONES_COMPRESION:
+        ruta_con_compresion(ruta, compresion).unlink(missing_ok=True)
+
+
+def compresion_de_ruta(ruta: Path) -> Optional[str]:
+    """Códec de un CSV según su extensión (None si no está comprimido)."""
+    nombre = Path(ruta).name.lower()
+    return next((compresion for compresion, extension in EXTENSIONES_COMPRESION.items()
+                 if extension and nombre.endswith(extension)), None)
+
+
+def abrir_texto_escritura(ruta: Path, compresion: Optional[str] = None, nivel: Optional[int] = None,
+                          encoding: str = 'utf-8-sig') -> IO[str]:
+    """
+    Abre un archivo de texto para escritura, comprimiendo en streaming si se indica.
+
+    Args:
+        ruta: Ruta final del archivo (ya con la extensión del códec)
+        compresion: None, 'gzip' o 'zstd'
+        nivel: Nivel de compresión (None = nivel por defecto del códec)
+        encoding: Codificación del texto
+
+    Returns:
+        Manejador de texto listo para csv.writer / csv.DictWriter
+    """
+    validar_compresion(compresion)
+
+    if compresion is None:
+        return open(ruta, 'w', newline='', encoding=encoding)
+
+    if nivel is None:
+        nivel = NIVELES_POR_DEFECTO[compresion]
+
+    if compresion == 'gzip':
+        return gzip.open(ruta, 'wt', compresslevel=nivel, newline='', encoding=encoding)
+
+    return zstandard.open(ruta, 'wt', cctx=zstandard.ZstdCompressor(level=nivel),
+                          newline='', encoding=encoding)
+
+
+@contextmanager
+def ruta_temporal_atomica(ruta: Path) -> Iterator[Path]:
+    """
+    Proporciona una ruta temporal en la misma carpeta que se renombra a la ruta final
+    solo si el bloque termina sin errores. Así nunca quedan archivos a medio escribir.
+    """
+    ruta.parent.mkdir(parents=True, exist_ok=True)
+    # Nombre oculto y con .tmp para que no coincida con los patrones de búsqueda de CSV
+    ruta_temporal = ruta.with_name(f'.{ruta.name}.{os.getpid()}.tmp')
+
+    try:
+        yield ruta_temporal
+        os.replace(ruta_temporal, ruta)
+    finally:
+        if ruta_temporal.exists():
+            ruta_temporal.unlink()
+
+
+@contextmanager
+def abrir_texto_escritura_atomica(ruta: Path, compresion: Optional[str] = None, nivel: Optional[int] = None,
+                                  encoding: str = 'utf-8-sig') -> Iterator[IO[str]]:
+    """Como abrir_texto_escritura, pero escribiendo en un temporal que se renombra al cerrar."""
+    with ruta_temporal_atomica(ruta) as ruta_temporal:
+        with abrir_texto_escritura(ruta_temporal, compresion, nivel, encoding) as f:
+            yield f
+
+
+@contextmanager
+def abrir_texto_anexado_atomico(ruta: Path, compresion: Optional[str] = None, nivel: Optional[int] = None,
+                                encoding: str = 'utf-8') -> Iterator[IO[str]]:
+    """
+    Añade texto al final de un archivo existente sin dejarlo nunca a medias: se copia a un
+    temporal, se añade ahí y se renombra al cerrar. Con gzip se añade un miembro nuevo,
+    que gzip y pandas leen a continuación del anterior. zstd no se admite: los lectores
+    de pandas se detienen al final del primer frame.
+
+    Args:
+        encoding: Codificación del texto añadido (sin BOM: el archivo ya tiene el suyo)
+    """
+    validar_compresion(compresion)
+    if compresion == 'zstd':
+        raise ValueError("No se puede añadir a un CSV comprimido con zstd")
+
+    with ruta_temporal_atomica(ruta) as ruta_temporal:
+        shutil.copyfile(ruta, ruta_temporal)
+        if compresion is None:
+            f = open(ruta_temporal, 'a', newline='', encoding=encoding)
+        else:
+            f = gzip.open(ruta_temporal, 'at', newline='', encoding=encoding,
+                          compresslevel=NIVELES_POR_DEFECTO[compresion] if nivel is None else nivel)
+        with f:
+            yield f
+
+
+def guardar_json_atomico(ruta: Path, datos: Any, indent: Optional[int] = 2):
+    """Guarda un JSON de forma atómica (temporal + renombrado)."""
+    with ruta_temporal_atomica(ruta) as ruta_temporal:
+        with open(ruta_temporal, 'w', encoding='utf-8') as f:
+            json.dump(datos, f, ensure_ascii=False, indent=indent)
+
+
+def abrir_texto_lectura(ruta: Path, encoding: str = 'utf-8-sig') -> IO[str]:
+    """Abre un CSV (comprimido o no, según su extensión) para lectura en streaming."""
+    nombre = ruta.name.lower()
+
+    if nombre.endswith('.gz'):
+        return gzip.open(ruta, 'rt', newline='', encoding=encoding)
+
+    if nombre.endswith('.zst'):
+        validar_compresion('zstd')
+        return zstandard.open(ruta, 'rt', newline='', encoding=encoding)
+
+    return open(ruta, 'r', newline='', encoding=encoding)
+
+
+def buscar_csv(carpeta: Path, prefijo: str) -> List[Path]:
+    """
+    Busca recursivamente los CSV de un tipo (ej: 'libro_diario_') en cualquier compresión.
+
+    Args:
+        carpeta: Carpeta donde buscar
+        prefijo: Prefijo del nombre de archivo
+
+    Returns:
+        Lista de rutas encontradas
+    """
+    archivos = []
+    for patron in PATRONES_CSV:
+        archivos.extend(carpeta.glob(f'**/{prefijo}{patron}'))
+    return archivos
+
+
+class GuardadoSegundoPlano:
+    """
+    Guarda libros de Excel (openpyxl) en un hilo aparte. La compresión zip del .xlsx
+    se solapa con el cálculo del libro siguiente; como mucho hay un libro guardándose
+    y otro esperando, así la memoria no crece con el número de libros.
+    Los avisos de fin (al_terminar) se ejecutan siempre en el hilo principal.
+    """
+
+    def __init__(self, max_pendientes: int = 1):
+        self.ejecutor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='guardado_excel')
+        self.max_pendientes = max_pendientes
+        self.pendientes = []
+
+    def guardar(self, libro, ruta: Path, al_terminar: Callable[[Optional[Exception]], None] = None):
+        """
+        Encola el guardado atómico de un libro.
+
+        Args:
+            libro: Workbook de openpyxl ya completo (no se debe modificar después)
+            ruta: Ruta final del .xlsx
+            al_terminar: Función opcional llamada con None si se guardó o con la excepción si falló
+        """
+        while len(self.pendientes) > self.max_pendientes:
+            self.completar(self.pendientes[0])
+
+        def tarea():
+            with ruta_temporal_atomica(Path(ruta)) as ruta_temporal:
+                libro.save(ruta_temporal)
+
+        self.pendientes.append((self.ejecutor.submit(tarea), Path(ruta), al_terminar))
+
+    def completar(self, pendiente):
+        """Espera un guardado encolado y avisa de su resultado."""
+        futuro, ruta, al_terminar = pendiente
+        self.pendientes.remove(pendiente)
+        error = futuro.exception()
+        if error is not None:
+            print(f"❌ Error guardando {ruta.name}: {error}")
+        if al_terminar is not None:
+            al_terminar(error)
+
+    def esperar(self):
+        """Espera a que terminen todos los guardados encolados."""
+        while self.pendientes:
+            self.completar(self.pendientes[0])
+
+    def cerrar(self):
+        """Espera los guardados pendientes y libera el hilo."""
+        self.esperar()
+        self.ejecutor.shutdown()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark de códecs de compresión para los CSV de datos_tratados.
+
+Mide, para cada códec y nivel, el tiempo de compresión y descompresión en streaming,
+la ratio obtenida y el tiempo total estimado al escribir y leer en una unidad de red
+de un ancho de banda dado. Sirve para elegir --compresion/--nivel-compresion de
+procesar_datos.py sin cambiar I/O de red por CPU.
+
+Uso:
+    python benchmark_compresion.py <archivo.csv> [ancho_banda_MBps]
+"""
+
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from almacenamiento import abrir_texto_escritura, abrir_texto_lectura, ruta_con_compresion, zstandard
+
+
+# Códecs y niveles a comparar
+CANDIDATOS = [
+    (None, None),
+    ('gzip', 1),
+    ('gzip', 3),
+    ('gzip', 6),
+    ('zstd', 1),
+    ('zstd', 3),
+    ('zstd', 9),
+]
+
+
+def medir_codec(texto: str, carpeta: Path, compresion, nivel) -> dict:
+    """Escribe y relee el texto con un códec y devuelve tiempos y tamaño."""
+    ruta = ruta_con_compresion(carpeta / 'benchmark.csv', compresion)
+
+    inicio = time.perf_counter()
+    with abrir_texto_escritura(ruta, compresion, nivel) as f:
+        f.write(texto)
+    tiempo_escritura = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    with abrir_texto_lectura(ruta) as f:
+        while f.read(1 << 20):
+            pass
+    tiempo_lectura = time.perf_counter() - inicio
+
+    tamano = ruta.stat().st_size
+    ruta.unlink()
+
+    return {
+        'tamano': tamano,
+        'escritura': tiempo_escritura,
+        'lectura': tiempo_lectura,
+    }
+
+
+def main():
+    """Función principal."""
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+
+    ruta_csv = Path(sys.argv[1])
+    ancho_banda = float(sys.argv[2]) if len(sys.argv) > 2 else 12.5  # MB/s (~100 Mbit/s)
+
+    with abrir_texto_lectura(ruta_csv) as f:
+        texto = f.read()
+    tamano_original = len(texto.encode('utf-8'))
+    mb_original = tamano_original / (1024 * 1024)
+
+    print(f"📄 Archivo: {ruta_csv.name} ({mb_original:.2f} MB sin comprimir)")
+    print(f"🌐 Ancho de banda supuesto: {ancho_banda:.1f} MB/s\n")
+    print(f"{'Códec':<10}{'Nivel':>6}{'Ratio':>8}{'Comp. MB/s':>12}{'Desc. MB/s':>12}"
+          f"{'Escribir s':>12}{'Leer s':>10}")
+    print("-" * 70)
+
+    carpeta = Path(tempfile.mkdtemp(prefix='benchmark_compresion_'))
+    try:
+        for compresion, nivel in CANDIDATOS:
+            if compresion == 'zstd' and zstandard is None:
+                continue
+
+            r = medir_codec(texto, carpeta, compresion, nivel)
+            mb_salida = r['tamano'] / (1024 * 1024)
+            # Tiempo total en red = CPU local + transferencia del archivo resultante
+            total_escritura = r['escritura'] + mb_salida / ancho_banda
+            total_lectura = r['lectura'] + mb_salida / ancho_banda
+
+            print(f"{compresion or 'ninguno':<10}{nivel if nivel is not None else '-':>6}"
+                  f"{tamano_original / r['tamano']:>8.2f}"
+                  f"{mb_original / r['escritura']:>12.1f}{mb_original / r['lectura']:>12.1f}"
+                  f"{total_escritura:>12.2f}{total_lectura:>10.2f}")
+    finally:
+        shutil.rmtree(carpeta, ignore_errors=True)
+
+    if zstandard is None:
+        print("\nℹ️  zstd no disponible (pip install zstandard)")
+
+
+if __name__ == '__main__':
+    main()
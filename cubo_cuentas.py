@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Cubo de agregados por niveles de cuenta (dígitos del PGC) de la totalidad de una sociedad.
+
+generar_totalidad.py guarda junto a cada Totalidad_<sociedad>.xlsx un .cubo.npz con las
+cuentas del Resumen_Por_Cuenta ordenadas como texto y las sumas acumuladas de sus
+importes. Las cuentas que comparten prefijo (grupo de 1 dígito, subgrupo de 2, cuenta de
+3...) quedan contiguas, así que el total de cualquier prefijo es la diferencia de dos
+filas de las sumas acumuladas (dos búsquedas binarias) y un nivel completo es una sola
+pasada vectorizada, sin volver a agrupar líneas.
+"""
+
+from pathlib import Path
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+from almacenamiento import ruta_temporal_atomica
+
+
+# Columnas del Resumen_Por_Cuenta que se acumulan en el cubo
+COLUMNAS_CUBO = ['GT_DEBE', 'GT_HABER', 'GT_IMPORTE_MONEDA_LOCAL', 'GT_ARRASTRE_SALDOS',
+                 'GT_SALDO_PERIODO_SyS', 'GT_DIFERENCIA']
+
+# Niveles de cuenta del PGC: grupo, subgrupo, cuenta y subcuentas
+NIVELES_PGC = {1: 'Grupo', 2: 'Subgrupo', 3: 'Cuenta', 4: 'Subcuenta'}
+
+
+def construir_cubo(resumen_cuenta: pd.DataFrame) -> Dict[str, np.ndarray]:
+    """
+    Construye el cubo a partir del resumen por cuenta (calcular_resumen_cuenta).
+
+    Returns:
+        Diccionario con 'cuentas' (texto, ordenadas), 'acumulados' (n+1 filas x
+        COLUMNAS_CUBO, empezando en ceros) y 'no_cumplen' (n+1, cuentas acumuladas con
+        |GT_DIFERENCIA| >= 0.01)
+    """
+    cuentas = resumen_cuenta['GT_CUENTA'].astype(str).to_numpy(dtype=str)
+    orden = np.argsort(cuentas, kind='stable')
+
+    importes = resumen_cuenta[COLUMNAS_CUBO].to_numpy(dtype=float)[orden]
+    no_cumple = (np.abs(importes[:, COLUMNAS_CUBO.index('GT_DIFERENCIA')]) >= 0.01).astype(np.int64)
+
+    return {
+        'cuentas': cuentas[orden],
+        'acumulados': np.vstack([np.zeros((1, len(COLUMNAS_CUBO))), np.cumsum(importes, axis=0)]),
+        'no_cumplen': np.concatenate([[0], np.cumsum(no_cumple)]),
+    }
+
+
+def ruta_cubo(ruta_excel: Path) -> Path:
+    """Ruta del cubo de un Excel de totalidad (Totalidad_X.xlsx -> Totalidad_X.cubo.npz)."""
+    return ruta_excel.with_suffix('.cubo.npz')
+
+
+def guardar_cubo(cubo: Dict[str, np.ndarray], ruta: Path):
+    """Guarda el cubo comprimido de forma atómica."""
+    with ruta_temporal_atomica(ruta) as ruta_temporal:
+        with open(ruta_temporal, 'wb') as f:
+            np.savez_compressed(f, **cubo)
+
+
+def cargar_cubo(ruta: Path) -> Dict[str, np.ndarray]:
+    """Carga un cubo guardado con guardar_cubo."""
+    with np.load(ruta) as datos:
+        return {clave: datos[clave] for clave in datos.files}
+
+
+def totales_prefijo(cubo: Dict[str, np.ndarray], prefijo: str) -> Dict[str, float]:
+    """
+    Totales de las cuentas que empiezan por 'prefijo' (ej: '4', '47', '472').
+
+    Returns:
+        Diccionario con COLUMNAS_CUBO redondeadas, 'Cuentas' y 'No_Cumplen'
+    """
+    cuentas = cubo['cuentas']
+    inicio = int(np.searchsorted(cuentas, prefijo, side='left'))
+    # Todo texto que empieza por el prefijo es menor que prefijo + el mayor carácter posible
+    fin = int(np.searchsorted(cuentas, prefijo + '\U0010ffff', side='left'))
+
+    totales = cubo['acumulados'][fin] - cubo['acumulados'][inicio]
+    resultado = {columna: round(float(valor), 2) for columna, valor in zip(COLUMNAS_CUBO, totales)}
+    resultado['Cuentas'] = fin - inicio
+    resultado['No_Cumplen'] = int(cubo['no_cumplen'][fin] - cubo['no_cumplen'][inicio])
+    return resultado
+
+
+def nivel(cubo: Dict[str, np.ndarray], digitos: int, prefijo: Optional[str] = None) -> pd.DataFrame:
+    """
+    Totales de todas las cuentas agrupadas por sus primeros 'digitos' caracteres.
+
+    Args:
+        cubo: Cubo de construir_cubo o cargar_cubo
+        digitos: Longitud del prefijo (1 = grupo, 2 = subgrupo, 3 = cuenta...)
+        prefijo: Si se indica, solo las cuentas que empiezan por él (para bajar de nivel)
+
+    Returns:
+        DataFrame con Prefijo, Cuentas, No_Cumplen y COLUMNAS_CUBO, ordenado por prefijo
+    """
+    cuentas = cubo['cuentas']
+    inicio, fin = 0, len(cuentas)
+    if prefijo:
+        inicio = int(np.searchsorted(cuentas, prefijo, side='left'))
+        fin = int(np.searchsorted(cuentas, prefijo + '\U0010ffff', side='left'))
+
+    # Al estar ordenadas, los prefijos iguales son filas contiguas: basta con sus límites
+    prefijos = cuentas[inicio:fin].astype(f'<U{max(int(digitos), 1)}')
+    cambios = np.flatnonzero(np.r_[True, prefijos[1:] != prefijos[:-1]]) if len(prefijos) else np.array([], dtype=int)
+    limites_inicio = cambios + inicio
+    limites_fin = np.r_[cambios[1:], len(prefijos)].astype(int) + inicio
+
+    acumulados = cubo['acumulados']
+    totales = (acumulados[limites_fin] - acumulados[limites_inicio]).round(2)
+    df = pd.DataFrame(totales, columns=COLUMNAS_CUBO)
+    df.insert(0, 'Prefijo', prefijos[cambios] if len(prefijos) else [])
+    df.insert(1, 'Cuentas', limites_fin - limites_inicio)
+    df.insert(2, 'No_Cumplen', cubo['no_cumplen'][limites_fin] - cubo['no_cumplen'][limites_inicio])
+    return df
+
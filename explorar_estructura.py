@@ -14,16 +14,34 @@ El resultado incluye:
 - Extensiones
 - Fechas de modificación
 
+Las carpetas se leen en paralelo (os.scandir, un hilo por carpeta pendiente). Con
+--cache se guarda además una caché de estadísticas ('_cache_estructura.json' junto al
+archivo de salida): una carpeta cuya fecha de modificación no ha cambiado se lista
+desde la caché sin consultar sus archivos. La caché es opcional porque puede quedar
+desactualizada: la fecha de una carpeta cambia al crear, borrar o renombrar archivos,
+pero no al sobrescribir uno existente, así que el tamaño y la fecha de ese archivo
+serían los de la ejecución anterior.
+
 Autor: Script de exploración de estructura
 Fecha: 2025-10-31
 """
 
+import json
 import os
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from pathlib import Path
 from datetime import datetime
+from typing import Dict, Tuple
 import sys
 
 
+# Carpetas que se leen a la vez (en un recurso de red domina la latencia, no la CPU)
+HILOS_EXPLORACION = 16
+
+# Nombre de la caché de estadísticas, junto al archivo de salida
+NOMBRE_CACHE = '_cache_estructura.json'
+
+
 def formatear_tamano(tamano_bytes: int) -> str:
     """
     Convierte un tamaño en bytes a una representación legible.
@@ -41,14 +59,126 @@ def formatear_tamano(tamano_bytes: int) -> str:
     return f"{tamano_bytes:.2f} TB"
 
 
-def explorar_directorio(ruta_base: str, archivo_salida: str = 'estructura_datos.txt'):
+def es_directorio(entrada: os.DirEntry) -> bool:
+    """Como Path.is_dir(): sigue enlaces y devuelve False si no se puede consultar."""
+    try:
+        return entrada.is_dir()
+    except OSError:
+        return False
+
+
+def leer_directorio(ruta: Path, cache: Dict[str, dict]) -> Tuple[Path, dict]:
+    """
+    Lee una carpeta (sin recursión): elementos ordenados con carpetas primero y, para
+    los archivos, tamaño y fecha de modificación.
+
+    Args:
+        ruta: Carpeta a leer (su ruta absoluta es la clave de la caché)
+        cache: Caché de ejecuciones anteriores (ruta -> carpeta leída)
+
+    Returns:
+        Tupla (ruta, carpeta) con carpeta = {'mtime_ns', 'elementos', 'total', 'error'};
+        cada elemento es [nombre, es_carpeta, tamaño, mtime]
+    """
+    try:
+        mtime_ns = os.stat(ruta).st_mtime_ns
+    except OSError:
+        mtime_ns = None
+
+    cacheado = cache.get(os.path.abspath(ruta))
+    if cacheado is not None and mtime_ns is not None and cacheado['mtime_ns'] == mtime_ns:
+        return ruta, cacheado
+
+    elementos = []
+    total = 0
+    error = None
+    try:
+        with os.scandir(ruta) as iterador:
+            entradas = [(entrada, es_directorio(entrada)) for entrada in iterador]
+        entradas.sort(key=lambda x: (not x[1], x[0].name.lower()))
+        total = len(entradas)
+
+        for entrada, es_carpeta in entradas:
+            if es_carpeta:
+                elementos.append([entrada.name, True, 0, 0.0])
+            else:
+                # En Windows scandir ya trae las estadísticas y stat() no vuelve a consultar
+                stats = entrada.stat()
+                elementos.append([entrada.name, False, stats.st_size, stats.st_mtime])
+
+    except PermissionError:
+        error = "[ERROR: Sin permisos para acceder a esta carpeta]"
+    except Exception as e:
+        error = f"[ERROR: {str(e)}]"
+
+    return ruta, {'mtime_ns': mtime_ns, 'elementos': elementos, 'total': total, 'error': error}
+
+
+def leer_arbol(raiz: Path, cache: Dict[str, dict], hilos: int = HILOS_EXPLORACION) -> Dict[str, dict]:
+    """
+    Lee todas las carpetas bajo raiz repartiéndolas entre varios hilos.
+
+    Returns:
+        Diccionario ruta absoluta -> carpeta leída (ver leer_directorio)
+    """
+    directorios = {}
+    with ThreadPoolExecutor(max_workers=hilos, thread_name_prefix='explorar') as ejecutor:
+        pendientes = {ejecutor.submit(leer_directorio, raiz, cache)}
+        while pendientes:
+            terminados, pendientes = wait(pendientes, return_when=FIRST_COMPLETED)
+            for futuro in terminados:
+                ruta, directorio = futuro.result()
+                directorios[os.path.abspath(ruta)] = directorio
+                for nombre, es_carpeta, _, _ in directorio['elementos']:
+                    if es_carpeta:
+                        pendientes.add(ejecutor.submit(leer_directorio, ruta / nombre, cache))
+
+    return directorios
+
+
+def cargar_cache(ruta_cache: Path) -> Dict[str, dict]:
+    """Carga la caché de estadísticas; si no existe o no es válida, empieza vacía."""
+    if not ruta_cache.exists():
+        return {}
+    try:
+        with open(ruta_cache, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"⚠️  Caché de estructura no válida, se regenera: {e}")
+        return {}
+
+
+def guardar_cache(ruta_cache: Path, cache: Dict[str, dict], raiz: Path, directorios: Dict[str, dict]):
+    """
+    Guarda la caché: se conservan las entradas de otras raíces y las de esta raíz se
+    sustituyen por las carpetas leídas ahora (sin las que dieron error).
+    """
+    # Solo con --cache: el explorador sin caché no carga almacenamiento (ni zstandard)
+    from almacenamiento import guardar_json_atomico
+
+    raiz = os.path.abspath(raiz)
+    nueva = {clave: valor for clave, valor in cache.items()
+             if clave != raiz and not clave.startswith(raiz.rstrip(os.sep) + os.sep)}
+    nueva.update({clave: valor for clave, valor in directorios.items() if valor['error'] is None})
+    try:
+        guardar_json_atomico(ruta_cache, nueva, indent=None)
+    except OSError as e:
+        print(f"⚠️  No se pudo guardar la caché de estructura: {e}")
+
+
+def explorar_directorio(ruta_base: str, archivo_salida: str = 'estructura_datos.txt',
+                        usar_cache: bool = False, hilos: int = HILOS_EXPLORACION):
     """
     Explora recursivamente un directorio y genera un archivo con su estructura.
 
     Args:
         ruta_base: Ruta del directorio a explorar
         archivo_salida: Nombre del archivo de salida donde guardar la estructura
+        usar_cache: Si es True, las carpetas sin cambios se listan desde la caché (puede
+            mostrar datos antiguos de archivos sobrescritos, ver la descripción del módulo)
+        hilos: Carpetas que se leen a la vez
     """
+    ruta_cache = Path(archivo_salida).with_name(NOMBRE_CACHE) if usar_cache else None
 
     # Abrir archivo de salida para escritura
     with open(archivo_salida, 'w', encoding='utf-8') as f:
@@ -72,69 +202,74 @@ def explorar_directorio(ruta_base: str, archivo_salida: str = 'estructura_datos.
             print(f"ERROR: '{ruta_base}' no es una carpeta")
             return
 
+        # Leer el árbol en paralelo (o desde la caché) y escribirlo después en orden
+        cache = cargar_cache(ruta_cache) if ruta_cache else {}
+        directorios = leer_arbol(ruta_datos, cache, hilos)
+        if ruta_cache:
+            guardar_cache(ruta_cache, cache, ruta_datos, directorios)
+
         # Contadores para estadísticas
         total_carpetas = 0
         total_archivos = 0
         total_bytes = 0
         extensiones = {}
 
-        # Función recursiva para explorar directorios
+        # Función recursiva para escribir el árbol ya leído
         def explorar_recursivo(ruta_actual: Path, nivel: int = 0, prefijo: str = ""):
             nonlocal total_carpetas, total_archivos, total_bytes, extensiones
 
-            try:
-                # Obtener todos los elementos en el directorio actual
-                elementos = sorted(ruta_actual.iterdir(), key=lambda x: (not x.is_dir(), x.name.lower()))
-
-                for idx, elemento in enumerate(elementos):
-                    # Determinar si es el último elemento
-                    es_ultimo = (idx == len(elementos) - 1)
-
-                    # Símbolos para el árbol
-                    if es_ultimo:
-                        simbolo = "└── "
-                        extension_prefijo = "    "
+            directorio = directorios[os.path.abspath(ruta_actual)]
+            elementos = directorio['elementos']
+
+            for idx, (nombre, es_carpeta, tamano, mtime) in enumerate(elementos):
+                # Determinar si es el último elemento
+                es_ultimo = (idx == directorio['total'] - 1)
+
+                # Símbolos para el árbol
+                if es_ultimo:
+                    simbolo = "└── "
+                    extension_prefijo = "    "
+                else:
+                    simbolo = "├── "
+                    extension_prefijo = "│   "
+
+                if es_carpeta:
+                    # Es un directorio
+                    total_carpetas += 1
+                    nombre_carpeta = f"[{nombre}]"
+                    f.write(f"{prefijo}{simbolo}{nombre_carpeta}\n")
+
+                    # Explorar recursivamente
+                    explorar_recursivo(ruta_actual / nombre, nivel + 1, prefijo + extension_prefijo)
+
+                else:
+                    # Es un archivo
+                    total_archivos += 1
+                    total_bytes += tamano
+                    fecha_mod = datetime.fromtimestamp(mtime)
+                    sufijo = Path(nombre).suffix
+                    extension = sufijo.lower() if sufijo else '(sin extensión)'
+
+                    # Contar extensiones
+                    if extension in extensiones:
+                        extensiones[extension] += 1
                     else:
-                        simbolo = "├── "
-                        extension_prefijo = "│   "
+                        extensiones[extension] = 1
 
-                    if elemento.is_dir():
-                        # Es un directorio
-                        total_carpetas += 1
-                        nombre_carpeta = f"[{elemento.name}]"
-                        f.write(f"{prefijo}{simbolo}{nombre_carpeta}\n")
+                    # Formatear información del archivo
+                    info_archivo = (
+                        f"{nombre} "
+                        f"[{formatear_tamano(tamano)}] "
+                        f"[{fecha_mod.strftime('%d/%m/%Y %H:%M')}]"
+                    )
 
-                        # Explorar recursivamente
-                        explorar_recursivo(elemento, nivel + 1, prefijo + extension_prefijo)
+                    f.write(f"{prefijo}{simbolo}{info_archivo}\n")
 
-                    else:
-                        # Es un archivo
-                        total_archivos += 1
-                        stats = elemento.stat()
-                        tamano = stats.st_size
-                        total_bytes += tamano
-                        fecha_mod = datetime.fromtimestamp(stats.st_mtime)
-                        extension = elemento.suffix.lower() if elemento.suffix else '(sin extensión)'
-
-                        # Contar extensiones
-                        if extension in extensiones:
-                            extensiones[extension] += 1
-                        else:
-                            extensiones[extension] = 1
-
-                        # Formatear información del archivo
-                        info_archivo = (
-                            f"{elemento.name} "
-                            f"[{formatear_tamano(tamano)}] "
-                            f"[{fecha_mod.strftime('%d/%m/%Y %H:%M')}]"
-                        )
-
-                        f.write(f"{prefijo}{simbolo}{info_archivo}\n")
-
-            except PermissionError:
-                f.write(f"{prefijo}[ERROR: Sin permisos para acceder a esta carpeta]\n")
-            except Exception as e:
-                f.write(f"{prefijo}[ERROR: {str(e)}]\n")
+            if directorio['error']:
+                # Si falló la consulta de un archivo, ya se había contado
+                if len(elementos) < directorio['total']:
+                    total_archivos += 1
+                f.write(f"{prefijo}{directorio['error']}\n")
 
         # Escribir nombre de la carpeta raíz
         f.write(f"[{ruta_datos.name}]\n")
@@ -179,20 +314,24 @@ if __name__ == "__main__":
     """
     Punto de entrada principal del script.
     """
+    # --cache lista desde la caché las carpetas sin cambios (ver la descripción del módulo)
+    argumentos = [a for a in sys.argv[1:] if a != '--cache']
+    usar_cache = len(argumentos) < len(sys.argv) - 1
+
     # Permitir especificar una ruta personalizada como argumento
-    if len(sys.argv) > 1:
-        ruta = sys.argv[1]
+    if len(argumentos) > 0:
+        ruta = argumentos[0]
     else:
         ruta = './datos_braide'
 
     # Archivo de salida (se puede personalizar como segundo argumento)
-    if len(sys.argv) > 2:
-        salida = sys.argv[2]
+    if len(argumentos) > 1:
+        salida = argumentos[1]
     else:
         salida = 'estructura_datos_braide.txt'
 
     try:
-        explorar_directorio(ruta, salida)
+        explorar_directorio(ruta, salida, usar_cache=usar_cache)
     except KeyboardInterrupt:
         print("\n\nOperación cancelada por el usuario.")
         sys.exit(0)
@@ -6,42 +6,171 @@ Procesa archivos CSV de libro diario y sumas y saldos, generando un Excel
 con validación de cuadres contables.
 """
 
+import hashlib
+import json
+import numpy as np
 import pandas as pd
 import os
+import re
 from pathlib import Path
-from typing import Dict, List, Tuple
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 from openpyxl import Workbook
 from openpyxl.styles import Font, PatternFill, Alignment
 from openpyxl.utils.dataframe import dataframe_to_rows
 from openpyxl.worksheet.table import Table, TableStyleInfo
 import warnings
+from pandas.api.types import union_categoricals
+
+import almacenamiento
+import cubo_cuentas
+import indice_periodos
+import mapeo_columnas
+import memoria
+from almacenamiento import (GuardadoSegundoPlano, buscar_csv, compresion_de_ruta, guardar_json_atomico,
+                            ruta_temporal_atomica)
+from cubo_cuentas import construir_cubo, guardar_cubo, ruta_cubo
+from mapeo_columnas import CacheMapeoColumnas, leer_cabecera_csv
+from indice_periodos import cargar_indice, expandir_periodos, leer_csv_periodos, ruta_indice
+from memoria import AgregadorDesbordable, PresupuestoMemoria
+from perfilado import perfilar
+from progreso import INTERVALO_PROGRESO, abrir_lectura
 
 warnings.filterwarnings('ignore')
 
+# Filas por lote al leer libros diarios en modo de memoria acotada
+TAMANO_LOTE_CSV = 500_000
+
+# Columnas de importe del libro diario que se suman por cuenta y por asiento
+COLUMNAS_IMPORTE_LD = ['GT_DEBE', 'GT_HABER', 'GT_IMPORTE_MONEDA_LOCAL']
+
+# Columnas de importe de sumas y saldos que se suman por cuenta
+COLUMNAS_IMPORTE_SYS = ['GT_PERIODOS_ANTERIORES', 'GT_ARRASTRE_SALDOS', 'GT_SALDO_DEBE_SyS',
+                        'GT_SALDO_HABER_SyS', 'GT_SALDO_PERIODO_SyS']
+
+
+def concatenar_libro_diario(partes: List[pd.DataFrame]) -> pd.DataFrame:
+    """
+    Concatena lotes de libro diario. pd.concat convierte a texto las categóricas con
+    categorías distintas, así que GT_CUENTA se une aparte para que siga siendo categórica.
+    """
+    cuentas = [df['GT_CUENTA'] for df in partes]
+    if not all(isinstance(cuenta.dtype, pd.CategoricalDtype) for cuenta in cuentas):
+        return pd.concat(partes, ignore_index=True)
+
+    df = pd.concat([df.drop(columns=['GT_CUENTA']) for df in partes], ignore_index=True)
+    df.insert(partes[0].columns.get_loc('GT_CUENTA'), 'GT_CUENTA',
+              union_categoricals(cuentas, sort_categories=True))
+    return df
+
+
+def ruta_detalle(ruta_excel: Path) -> Path:
+    """Ruta del detalle completo de un Excel de totalidad (Totalidad_X.xlsx -> Totalidad_X.detalle.npz)."""
+    return ruta_excel.with_suffix('.detalle.npz')
+
+
+def guardar_detalle(tablas: Dict[str, pd.DataFrame], ruta: Path):
+    """
+    Guarda varias tablas por columnas en un .npz comprimido, de forma atómica.
+    Cada columna es un array con clave '<tabla>.<columna>'; los textos se guardan como
+    texto de ancho fijo, que el zip comprime casi por completo.
+    """
+    columnas = {}
+    for nombre, df in tablas.items():
+        for columna in df.columns:
+            valores = df[columna]
+            if pd.api.types.is_numeric_dtype(valores):
+                columnas[f'{nombre}.{columna}'] = valores.to_numpy()
+            else:
+                columnas[f'{nombre}.{columna}'] = valores.astype(str).to_numpy(dtype=str)
+
+    with ruta_temporal_atomica(ruta) as ruta_temporal:
+        with open(ruta_temporal, 'wb') as f:
+            np.savez_compressed(f, **columnas)
+
+
+def cargar_detalle(ruta: Path) -> Dict[str, pd.DataFrame]:
+    """Carga las tablas guardadas con guardar_detalle, con sus columnas en el orden original."""
+    tablas = {}
+    with np.load(ruta) as datos:
+        for clave in datos.files:
+            nombre, columna = clave.split('.', 1)
+            tablas.setdefault(nombre, {})[columna] = datos[clave]
+    return {nombre: pd.DataFrame(columnas) for nombre, columnas in tablas.items()}
+
 
 class GeneradorTotalidad:
     """Clase para generar reportes de totalidad por sociedad."""
 
-    def __init__(self, ruta_datos_tratados: str, ruta_salida: str):
+    def __init__(self, ruta_datos_tratados: str, ruta_salida: str, periodos: List[str] = None,
+                 usar_cache: bool = True, memoria_max_mb: int = None, carpeta_temporal: str = None,
+                 carpeta_perfiles: str = None, intervalo_progreso: Optional[float] = INTERVALO_PROGRESO,
+                 solo_excepciones: bool = False):
         """
         Inicializa el generador de totalidad.
 
         Args:
             ruta_datos_tratados: Ruta a la carpeta con datos procesados
             ruta_salida: Ruta donde se guardarán los reportes de totalidad
+            periodos: Meses (AAAA-MM) o trimestres (AAAA-Qn) a incluir del libro diario.
+                Si se indica, solo se leen esas filas usando el índice de períodos.
+            usar_cache: Si es True, no se regenera el Excel de una sociedad cuyas entradas
+                y código no han cambiado desde la última ejecución
+            memoria_max_mb: Memoria máxima (MB) por sociedad. Si se indica, el libro diario se
+                lee por lotes y solo se acumulan sus sumas por cuenta y por asiento, que se
+                vuelcan a disco si superan el límite. None = se carga el libro diario completo
+            carpeta_temporal: Carpeta en disco local para los volcados (por defecto la del sistema)
+            carpeta_perfiles: Si se indica, el cálculo de cada sociedad se perfila con cProfile
+                y tracemalloc y los resultados se guardan en esa carpeta
+            intervalo_progreso: Segundos entre informes de progreso (MB/s, ETA) al leer cada
+                CSV de libro diario o de sumas y saldos. None o 0 = sin informes
+            solo_excepciones: Si es True, el Excel solo lleva los asientos descuadrados y las
+                cuentas con |GT_DIFERENCIA| >= 0.01; el detalle completo de esas hojas se
+                guarda por columnas en Totalidad_<sociedad>.detalle.npz (ver guardar_detalle)
         """
         self.ruta_datos_tratados = Path(ruta_datos_tratados)
         self.ruta_salida = Path(ruta_salida)
+        self.periodos = list(periodos) if periodos else None
+        self.presupuesto = PresupuestoMemoria(memoria_max_mb, carpeta_temporal) if memoria_max_mb else None
+
+        self.carpeta_perfiles = Path(carpeta_perfiles) if carpeta_perfiles else None
+        self.intervalo_progreso = intervalo_progreso
+        self.solo_excepciones = solo_excepciones
+
+        # Guardado de los Excel en segundo plano (solo durante procesar_todas_las_sociedades)
+        self.guardado = None
 
         # Crear carpeta de salida si no existe
         self.ruta_salida.mkdir(parents=True, exist_ok=True)
 
+        # Caché de mapeos de columnas compartida con procesar_datos.py
+        self.cache_columnas = CacheMapeoColumnas(self.ruta_datos_tratados / '_mapeo_columnas.json')
+
+        # Caché de resultados de totalidad por sociedad (huella de entradas -> validación)
+        self.usar_cache = usar_cache
+        self.ruta_cache = self.ruta_salida / '_cache_totalidad.json'
+        self.cache = {}
+        if self.ruta_cache.exists():
+            try:
+                with open(self.ruta_cache, 'r', encoding='utf-8') as f:
+                    self.cache = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"⚠️  Caché de totalidad no válida, se regenera: {e}")
+
+        # Versión del código: cualquier cambio en los módulos que intervienen invalida la caché
+        version = hashlib.sha1()
+        for modulo in (__file__, almacenamiento.__file__, mapeo_columnas.__file__, indice_periodos.__file__,
+                       memoria.__file__, cubo_cuentas.__file__):
+            version.update(Path(modulo).read_bytes())
+        self.version_codigo = version.hexdigest()
+
     def buscar_archivos_por_sociedad(self) -> Dict[str, Dict[str, List[Path]]]:
         """
         Busca y agrupa archivos CSV por sociedad.
 
         Returns:
-            Diccionario con estructura: {nombre_sociedad: {'libro_diario': [paths], 'sumas_saldos': [paths]}}
+            Diccionario con estructura: {nombre_sociedad: {'libro_diario': [paths], 'sumas_saldos': [paths],
+            'resumen_asientos': [paths]}}. 'resumen_asientos' solo se rellena si todos los
+            libros diarios tienen su resumen por asiento generado durante el parseo.
         """
         sociedades = {}
 
@@ -52,18 +181,74 @@ class GeneradorTotalidad:
 
             nombre_sociedad = carpeta_sociedad.name
 
-            # Buscar archivos de libro diario y sumas y saldos
-            archivos_ld = list(carpeta_sociedad.glob('**/libro_diario_*.csv'))
-            archivos_sys = list(carpeta_sociedad.glob('**/sumas_saldos_*.csv'))
+            # Buscar archivos de libro diario (plano o normalizado) y sumas y saldos
+            archivos_ld = buscar_csv(carpeta_sociedad, 'libro_diario_')
+            archivos_ld += buscar_csv(carpeta_sociedad, 'lineas_diario_')
+            archivos_sys = buscar_csv(carpeta_sociedad, 'sumas_saldos_')
+
+            archivos_resumen = [
+                archivo.with_name(re.sub(r'^(libro_diario|lineas_diario)_', 'resumen_asientos_', archivo.name))
+                for archivo in archivos_ld
+            ]
+            if not all(archivo.exists() for archivo in archivos_resumen):
+                archivos_resumen = []
 
             if archivos_ld or archivos_sys:
                 sociedades[nombre_sociedad] = {
                     'libro_diario': archivos_ld,
-                    'sumas_saldos': archivos_sys
+                    'sumas_saldos': archivos_sys,
+                    'resumen_asientos': archivos_resumen
                 }
 
         return sociedades
 
+    def archivos_entrada(self, archivos: Dict[str, List[Path]]) -> List[Path]:
+        """Todos los archivos que se leen para la totalidad de una sociedad."""
+        entradas = []
+        for archivo in archivos.get('libro_diario', []):
+            entradas.append(archivo)
+            if archivo.name.startswith('lineas_diario_'):
+                entradas.append(archivo.with_name(archivo.name.replace('lineas_diario_', 'asientos_diario_', 1)))
+            if self.periodos:
+                entradas.append(ruta_indice(archivo))
+        entradas += archivos.get('sumas_saldos', [])
+        if not self.periodos:
+            entradas += archivos.get('resumen_asientos', [])
+        return sorted(entradas)
+
+    def huella_entradas(self, archivos: Dict[str, List[Path]]) -> str:
+        """
+        Huella de las entradas de una sociedad: nombre, tamaño y fecha de modificación de
+        cada archivo, períodos solicitados y versión del código.
+        """
+        huella = hashlib.sha1(self.version_codigo.encode('utf-8'))
+        huella.update(repr(self.periodos).encode('utf-8'))
+        if self.solo_excepciones:
+            huella.update(b'solo_excepciones')
+        for archivo in self.archivos_entrada(archivos):
+            info = archivo.stat() if archivo.exists() else None
+            estado = f"{info.st_size}:{info.st_mtime_ns}" if info else 'ausente'
+            huella.update(f"{archivo.relative_to(self.ruta_datos_tratados)}|{estado}\n".encode('utf-8'))
+        return huella.hexdigest()
+
+    def ruta_excel_totalidad(self, nombre_sociedad: str) -> Path:
+        """Ruta del Excel de totalidad de una sociedad (con sufijo de períodos si aplica)."""
+        if self.periodos:
+            return self.ruta_salida / f"Totalidad_{nombre_sociedad}_{'_'.join(self.periodos)}.xlsx"
+        return self.ruta_salida / f"Totalidad_{nombre_sociedad}.xlsx"
+
+    def salidas_totalidad(self, nombre_sociedad: str) -> List[Path]:
+        """Archivos que genera la totalidad de una sociedad: el Excel, su cubo y, con solo_excepciones, su detalle."""
+        ruta_excel = self.ruta_excel_totalidad(nombre_sociedad)
+        salidas = [ruta_excel, ruta_cubo(ruta_excel)]
+        if self.solo_excepciones:
+            salidas.append(ruta_detalle(ruta_excel))
+        return salidas
+
+    def abrir_csv(self, archivo: Path):
+        """Abre un CSV en binario para pd.read_csv, informando del progreso de lectura."""
+        return abrir_lectura(archivo, intervalo=self.intervalo_progreso)
+
     def convertir_a_numerico(self, df: pd.DataFrame, columnas: List[str]) -> pd.DataFrame:
         """
         Convierte las columnas especificadas a tipo numérico.
@@ -83,6 +268,121 @@ class GeneradorTotalidad:
 
         return df_resultado
 
+    def leer_libro_diario(self, archivo: Path) -> pd.DataFrame:
+        """
+        Lee un archivo de libro diario completo y crea las columnas GT_.
+
+        Args:
+            archivo: Path al CSV de libro diario o de líneas
+
+        Returns:
+            DataFrame con una fila por línea y las columnas de origen usadas más las GT_
+        """
+        return next(self.leer_lotes_libro_diario(archivo))
+
+    def leer_lotes_libro_diario(self, archivo: Path, tamano_lote: int = None,
+                                todas_las_columnas: bool = False) -> Iterator[pd.DataFrame]:
+        """
+        Lee un archivo de libro diario por lotes y crea las columnas GT_ de cada lote.
+        Solo se cargan las columnas necesarias, resueltas a partir de la cabecera mediante
+        la caché de mapeos. Si es un lineas_diario_*.csv del formato normalizado, las
+        columnas de cabecera se toman de asientos_diario_*.csv uniendo por ID_ASIENTO.
+        La compresión (.csv.gz, .csv.zst) se detecta por la extensión.
+
+        Args:
+            archivo: Path al CSV de libro diario o de líneas
+            tamano_lote: Filas máximas por lote (None = un único lote con todo el archivo)
+            todas_las_columnas: Si es True se cargan todas las columnas de origen, como texto
+                (para mostrar líneas completas, ver servicio_consultas.py)
+
+        Returns:
+            Iterador de DataFrames con las columnas de origen usadas más las GT_
+        """
+        cols_lineas = leer_cabecera_csv(archivo)
+        cols_asientos = []
+        archivo_asientos = None
+
+        if archivo.name.startswith('lineas_diario_'):
+            archivo_asientos = archivo.with_name(archivo.name.replace('lineas_diario_', 'asientos_diario_', 1))
+            cols_asientos = leer_cabecera_csv(archivo_asientos)
+
+        # Como en el formato plano, las columnas se consideran ordenadas por nombre
+        # y si existen en cabecera y detalle prevalece el detalle
+        columnas = sorted((set(cols_lineas) | set(cols_asientos)) - {'ID_ASIENTO'})
+        mapeo = self.cache_columnas.obtener('LD', columnas)
+        usadas = [col for col in mapeo.values() if col]
+        tipos = {col: str for col in (mapeo['cuenta'], mapeo['asiento']) if col}
+        if todas_las_columnas:
+            usadas = columnas
+            tipos = {col: str for col in columnas}
+
+        usadas_lineas = [col for col in usadas if col in cols_lineas]
+        df_asientos = None
+        if archivo_asientos is not None:
+            usadas_lineas = ['ID_ASIENTO'] + usadas_lineas
+            usadas_asientos = [col for col in usadas if col not in cols_lineas]
+            if usadas_asientos:
+                df_asientos = pd.read_csv(archivo_asientos, usecols=['ID_ASIENTO'] + usadas_asientos, dtype=tipos)
+
+        for df in self.leer_filas_periodos(archivo, cols_lineas, usecols=usadas_lineas, dtype=tipos,
+                                           tamano_lote=tamano_lote):
+            if archivo_asientos is not None:
+                if df_asientos is not None:
+                    df = df.merge(df_asientos, on='ID_ASIENTO', how='left')
+                df = df.drop(columns=['ID_ASIENTO'])
+
+            yield self.crear_columnas_gt_ld(df, mapeo)
+
+    def crear_columnas_gt_ld(self, df: pd.DataFrame, mapeo: Dict[str, Optional[str]]) -> pd.DataFrame:
+        """Crea las columnas GT_ de un libro diario a partir de su mapeo de columnas."""
+        col_debe, col_haber = mapeo['debe'], mapeo['haber']
+        col_cuenta, col_asiento = mapeo['cuenta'], mapeo['asiento']
+
+        df['GT_DEBE'] = pd.to_numeric(df[col_debe] if col_debe else 0, errors='coerce').fillna(0)
+        df['GT_HABER'] = pd.to_numeric(df[col_haber] if col_haber else 0, errors='coerce').fillna(0)
+        df['GT_IMPORTE_MONEDA_LOCAL'] = df['GT_DEBE'] - df['GT_HABER']
+        # Pocas cuentas distintas en muchas líneas: categórica (códigos enteros), que ocupa
+        # mucho menos y agrupa más rápido en calcular_resumen_cuenta
+        df['GT_CUENTA'] = df[col_cuenta].astype(str).astype('category') if col_cuenta else 'Sin_Cuenta'
+        df['GT_ASIENTO'] = df[col_asiento].astype(str) if col_asiento else 'Sin_Asiento'
+
+        return df
+
+    def leer_filas_periodos(self, archivo: Path, columnas: List[str], usecols: List[str],
+                            dtype: Dict[str, type], tamano_lote: int = None) -> Iterator[pd.DataFrame]:
+        """
+        Lee las columnas indicadas de un CSV de libro diario, limitado a self.periodos si
+        se ha configurado. Con índice de períodos se leen solo los rangos de filas de esos
+        meses; sin índice se lee todo y se filtra por GT_PERIODO.
+        Devuelve lotes de tamano_lote filas, o un único lote si es None.
+        """
+        def lotes(lectura):
+            return [lectura] if tamano_lote is None else lectura
+
+        with self.abrir_csv(archivo) as fuente:
+            opciones = {'usecols': usecols, 'dtype': dtype, 'compression': compresion_de_ruta(archivo)}
+
+            if not self.periodos:
+                yield from lotes(pd.read_csv(fuente, chunksize=tamano_lote, **opciones))
+                return
+
+            indice = cargar_indice(archivo)
+            if indice is not None:
+                yield from lotes(leer_csv_periodos(fuente, indice, self.periodos, chunksize=tamano_lote,
+                                                   **opciones))
+                return
+
+            if 'GT_PERIODO' not in columnas:
+                print(f"⚠️  {archivo.name} no tiene GT_PERIODO ni índice de períodos, se usa completo")
+                yield from lotes(pd.read_csv(fuente, chunksize=tamano_lote, **opciones))
+                return
+
+            meses = expandir_periodos(self.periodos)
+            opciones['usecols'] = usecols + ['GT_PERIODO']
+            opciones['dtype'] = {**dtype, 'GT_PERIODO': str}
+            for df in lotes(pd.read_csv(fuente, chunksize=tamano_lote, **opciones)):
+                yield df[df['GT_PERIODO'].isin(meses)].drop(columns=['GT_PERIODO']).reset_index(drop=True)
+
     def procesar_libro_diario(self, archivos_ld: List[Path]) -> pd.DataFrame:
         """
         Procesa uno o más archivos de libro diario y crea las columnas GT_.
@@ -97,7 +397,7 @@ class GeneradorTotalidad:
         df_list = []
         for archivo in archivos_ld:
             try:
-                df = pd.read_csv(archivo)
+                df = self.leer_libro_diario(archivo)
                 df_list.append(df)
             except Exception as e:
                 print(f"⚠️  Error leyendo {archivo.name}: {e}")
@@ -105,34 +405,66 @@ class GeneradorTotalidad:
         if not df_list:
             return pd.DataFrame()
 
-        df_diario = pd.concat(df_list, ignore_index=True)
-
-        # Mapear columnas a formato GT_
-        # Buscar columnas de debe, haber, cuenta y asiento
-        col_debe = None
-        col_haber = None
-        col_cuenta = None
-        col_asiento = None
-
-        for col in df_diario.columns:
-            col_lower = col.lower()
-            if 'debe' in col_lower and 'moneda local' in col_lower and col_debe is None:
-                col_debe = col
-            elif 'haber' in col_lower and 'moneda local' in col_lower and col_haber is None:
-                col_haber = col
-            elif col_lower == 'gt_cuenta' and col_cuenta is None:
-                col_cuenta = col
-            elif col_lower == 'nº doc.' and col_asiento is None:
-                col_asiento = col
-
-        # Crear columnas GT_
-        df_diario['GT_DEBE'] = pd.to_numeric(df_diario[col_debe] if col_debe else 0, errors='coerce').fillna(0)
-        df_diario['GT_HABER'] = pd.to_numeric(df_diario[col_haber] if col_haber else 0, errors='coerce').fillna(0)
-        df_diario['GT_IMPORTE_MONEDA_LOCAL'] = df_diario['GT_DEBE'] - df_diario['GT_HABER']
-        df_diario['GT_CUENTA'] = df_diario[col_cuenta].astype(str) if col_cuenta else 'Sin_Cuenta'
-        df_diario['GT_ASIENTO'] = df_diario[col_asiento].astype(str) if col_asiento else 'Sin_Asiento'
-
-        return df_diario
+        return concatenar_libro_diario(df_list)
+
+    def agregar_libro_diario(self, archivos_ld: List[Path]) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """
+        Modo de memoria acotada: lee los libros diarios por lotes y acumula solo sus sumas
+        por cuenta y por asiento, que se vuelcan a disco si superan self.presupuesto.
+
+        Args:
+            archivos_ld: Lista de paths a archivos CSV de libro diario
+
+        Returns:
+            Tupla (sumas por GT_CUENTA, sumas por GT_ASIENTO), ambas con COLUMNAS_IMPORTE_LD.
+            Sirven en lugar del libro diario y del resumen por asiento en generar_excel_totalidad.
+        """
+        por_cuenta = AgregadorDesbordable('GT_CUENTA', self.presupuesto)
+        por_asiento = AgregadorDesbordable('GT_ASIENTO', self.presupuesto)
+
+        for archivo in archivos_ld:
+            try:
+                for df in self.leer_lotes_libro_diario(archivo, TAMANO_LOTE_CSV):
+                    por_cuenta.agregar(df[['GT_CUENTA'] + COLUMNAS_IMPORTE_LD])
+                    por_asiento.agregar(df[['GT_ASIENTO'] + COLUMNAS_IMPORTE_LD])
+            except Exception as e:
+                print(f"⚠️  Error leyendo {archivo.name}: {e}")
+
+        return por_cuenta.resultado(COLUMNAS_IMPORTE_LD), por_asiento.resultado(COLUMNAS_IMPORTE_LD)
+
+    def leer_sumas_saldos(self, archivo: Path) -> pd.DataFrame:
+        """
+        Lee un archivo de sumas y saldos cargando solo las columnas necesarias
+        y crea las columnas GT_.
+
+        Args:
+            archivo: Path al CSV de sumas y saldos
+
+        Returns:
+            DataFrame con las columnas de origen usadas más las GT_
+        """
+        mapeo = self.cache_columnas.obtener_de_archivo('SYS', archivo)
+        usadas = [col for col in mapeo.values() if col]
+        tipos = {mapeo['cuenta']: str} if mapeo['cuenta'] else None
+        with self.abrir_csv(archivo) as fuente:
+            df_sumas = pd.read_csv(fuente, usecols=usadas, dtype=tipos, compression=compresion_de_ruta(archivo))
+
+        return self.crear_columnas_gt_sys(df_sumas, mapeo)
+
+    def crear_columnas_gt_sys(self, df_sumas: pd.DataFrame, mapeo: Dict[str, Optional[str]]) -> pd.DataFrame:
+        """Crea las columnas GT_ de sumas y saldos a partir de su mapeo de columnas."""
+        def columna_numerica(rol: str):
+            col = mapeo[rol]
+            return pd.to_numeric(df_sumas[col] if col else 0, errors='coerce').fillna(0)
+
+        df_sumas['GT_CUENTA'] = df_sumas[mapeo['cuenta']].astype(str) if mapeo['cuenta'] else 'Sin_Cuenta'
+        df_sumas['GT_ARRASTRE_SALDOS'] = columna_numerica('arrastre')
+        df_sumas['GT_PERIODOS_ANTERIORES'] = columna_numerica('periodos_anteriores')
+        df_sumas['GT_SALDO_DEBE_SyS'] = columna_numerica('debe')
+        df_sumas['GT_SALDO_HABER_SyS'] = columna_numerica('haber')
+        df_sumas['GT_SALDO_PERIODO_SyS'] = columna_numerica('saldo_periodo')
+
+        return df_sumas
 
     def procesar_sumas_saldos(self, archivos_sys: List[Path]) -> pd.DataFrame:
         """
@@ -148,7 +480,7 @@ class GeneradorTotalidad:
         df_list = []
         for archivo in archivos_sys:
             try:
-                df = pd.read_csv(archivo)
+                df = self.leer_sumas_saldos(archivo)
                 df_list.append(df)
             except Exception as e:
                 print(f"⚠️  Error leyendo {archivo.name}: {e}")
@@ -156,40 +488,33 @@ class GeneradorTotalidad:
         if not df_list:
             return pd.DataFrame()
 
-        df_sumas = pd.concat(df_list, ignore_index=True)
-
-        # Mapear columnas a formato GT_
-        col_cuenta = None
-        col_arrastre = None
-        col_periodos_ant = None
-        col_debe_sys = None
-        col_haber_sys = None
-        col_saldo_periodo = None
-
-        for col in df_sumas.columns:
-            col_lower = col.lower()
-            if 'cta' in col_lower and 'mayor' in col_lower and col_cuenta is None:
-                col_cuenta = col
-            elif 'arrastre' in col_lower and 'saldo' in col_lower and col_arrastre is None:
-                col_arrastre = col
-            elif ('saldo' in col_lower or 'per') and 'anterior' in col_lower and col_periodos_ant is None:
-                col_periodos_ant = col
-            elif 'debe' in col_lower and ('período' in col_lower or 'periodo' in col_lower or 'per.inf' in col_lower) and col_debe_sys is None:
-                col_debe_sys = col
-            elif 'haber' in col_lower and ('período' in col_lower or 'periodo' in col_lower or 'per.inf' in col_lower) and col_haber_sys is None:
-                col_haber_sys = col
-            elif 'saldo acumulado' in col_lower and col_saldo_periodo is None:
-                col_saldo_periodo = col
-
-        # Crear columnas GT_
-        df_sumas['GT_CUENTA'] = df_sumas[col_cuenta].astype(str) if col_cuenta else 'Sin_Cuenta'
-        df_sumas['GT_ARRASTRE_SALDOS'] = pd.to_numeric(df_sumas[col_arrastre] if col_arrastre else 0, errors='coerce').fillna(0)
-        df_sumas['GT_PERIODOS_ANTERIORES'] = pd.to_numeric(df_sumas[col_periodos_ant] if col_periodos_ant else 0, errors='coerce').fillna(0)
-        df_sumas['GT_SALDO_DEBE_SyS'] = pd.to_numeric(df_sumas[col_debe_sys] if col_debe_sys else 0, errors='coerce').fillna(0)
-        df_sumas['GT_SALDO_HABER_SyS'] = pd.to_numeric(df_sumas[col_haber_sys] if col_haber_sys else 0, errors='coerce').fillna(0)
-        df_sumas['GT_SALDO_PERIODO_SyS'] = pd.to_numeric(df_sumas[col_saldo_periodo] if col_saldo_periodo else 0, errors='coerce').fillna(0)
+        return pd.concat(df_list, ignore_index=True)
 
-        return df_sumas
+    def procesar_resumen_asientos(self, archivos_resumen: List[Path]) -> pd.DataFrame:
+        """
+        Lee los resúmenes por asiento generados durante el parseo del libro diario.
+
+        Args:
+            archivos_resumen: Lista de paths a archivos resumen_asientos_*.csv
+
+        Returns:
+            DataFrame con columnas GT_ASIENTO, GT_DEBE, GT_HABER, GT_IMPORTE_MONEDA_LOCAL
+            (vacío si no hay resúmenes o alguno no se puede leer)
+        """
+        df_list = []
+        for archivo in archivos_resumen:
+            try:
+                df = pd.read_csv(archivo, dtype={'GT_ASIENTO': str}, keep_default_na=False,
+                                 usecols=['GT_ASIENTO', 'GT_DEBE', 'GT_HABER', 'GT_IMPORTE_MONEDA_LOCAL'])
+                df_list.append(df)
+            except Exception as e:
+                print(f"⚠️  Error leyendo {archivo.name}: {e}")
+                return pd.DataFrame()
+
+        if not df_list:
+            return pd.DataFrame()
+
+        return pd.concat(df_list, ignore_index=True)
 
     def aplicar_formato_tabla(self, worksheet, dataframe, rango_inicio: str, nombre_tabla: str):
         """
@@ -246,20 +571,186 @@ class GeneradorTotalidad:
                 if isinstance(celda.value, (int, float)):
                     celda.number_format = '#,##0.00'
 
+    def calcular_resumen_cuenta(self, df_diario: pd.DataFrame, df_sumas: pd.DataFrame,
+                                claves: List[str] = None) -> pd.DataFrame:
+        """
+        Cruza por GT_CUENTA el libro diario con sumas y saldos y calcula GT_DIFERENCIA.
+        Con self.periodos el libro diario solo tiene los movimientos de esos períodos, así
+        que se compara con los movimientos del período de informe de sumas y saldos
+        (GT_SALDO_DEBE_SyS - GT_SALDO_HABER_SyS) en lugar de con el saldo acumulado.
+
+        Args:
+            df_diario: DataFrame del libro diario procesado
+            df_sumas: DataFrame de sumas y saldos procesado
+            claves: Columnas de cruce (por defecto ['GT_CUENTA']; validar_sociedades usa
+                ['GT_SOCIEDAD', 'GT_CUENTA'] para todas las sociedades a la vez)
+
+        Returns:
+            DataFrame con una fila por cuenta (hoja Resumen_Por_Cuenta)
+        """
+        claves = claves or ['GT_CUENTA']
+
+        # Resumen del libro diario por cuenta
+        resumen_cuenta = df_diario.groupby(claves).agg({
+            'GT_DEBE': 'sum',
+            'GT_HABER': 'sum',
+            'GT_IMPORTE_MONEDA_LOCAL': 'sum'
+        }).reset_index()
+
+        # Resumen de sumas y saldos por cuenta
+        resumen_sumas_cuenta = df_sumas.groupby(claves).agg({
+            'GT_PERIODOS_ANTERIORES': 'sum',
+            'GT_ARRASTRE_SALDOS': 'sum',
+            'GT_SALDO_DEBE_SyS': 'sum',
+            'GT_SALDO_HABER_SyS': 'sum',
+            'GT_SALDO_PERIODO_SyS': 'sum'
+        }).reset_index()
+
+        # JOIN
+        resumen_final = pd.merge(
+            resumen_cuenta,
+            resumen_sumas_cuenta,
+            on=claves,
+            how='outer'
+        ).fillna(0).round(2)
+
+        # Calcular diferencia
+        if self.periodos:
+            resumen_final['GT_DIFERENCIA'] = resumen_final['GT_IMPORTE_MONEDA_LOCAL'] - (
+                resumen_final['GT_SALDO_DEBE_SyS'] - resumen_final['GT_SALDO_HABER_SyS']
+            )
+        else:
+            resumen_final['GT_DIFERENCIA'] = (
+                resumen_final['GT_IMPORTE_MONEDA_LOCAL'] +
+                resumen_final['GT_ARRASTRE_SALDOS']
+            ) - resumen_final['GT_SALDO_PERIODO_SyS']
+        resumen_final['GT_DIFERENCIA'] = resumen_final['GT_DIFERENCIA'].round(2)
+
+        return resumen_final
+
+    def evaluar_validacion(self, resumen_final: pd.DataFrame) -> Tuple[bool, int]:
+        """
+        Evalúa la validación: como máximo 2 cuentas con |GT_DIFERENCIA| >= 0.01.
+
+        Returns:
+            Tupla (validacion_exitosa, número de cuentas que no cumplen)
+        """
+        no_cumplen = int((abs(resumen_final['GT_DIFERENCIA']) >= 0.01).sum())
+        return no_cumplen <= 2, no_cumplen
+
+    def cargar_datos_validacion(self, archivos: Dict[str, List[Path]]) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """
+        Libro diario (o sus sumas por cuenta con presupuesto de memoria) y sumas y saldos
+        de una sociedad, lo necesario para calcular su validación.
+
+        Args:
+            archivos: Archivos de la sociedad según buscar_archivos_por_sociedad
+
+        Returns:
+            Tupla (df_diario, df_sumas)
+        """
+        if self.presupuesto:
+            try:
+                df_diario, _ = self.agregar_libro_diario(archivos.get('libro_diario', []))
+            finally:
+                self.presupuesto.limpiar()
+        else:
+            df_diario = self.procesar_libro_diario(archivos.get('libro_diario', []))
+        df_sumas = self.procesar_sumas_saldos(archivos.get('sumas_saldos', []))
+
+        if df_diario.empty or df_sumas.empty:
+            raise ValueError("faltan datos de libro diario o de sumas y saldos")
+
+        return df_diario, df_sumas
+
+    def validar_sociedades(self, archivos_por_sociedad: Dict[str, Dict[str, List[Path]]]) -> pd.DataFrame:
+        """
+        Validación de todas las sociedades en un solo cálculo (hotusa.py validate).
+
+        De cada sociedad solo se leen sus sumas por cuenta del libro diario y sus sumas y
+        saldos; se apilan con la sociedad como clave y el cruce, GT_DIFERENCIA y el recuento
+        de cuentas que no cumplen se calculan una sola vez para todo el grupo, con el mismo
+        criterio que evaluar_validacion.
+
+        Args:
+            archivos_por_sociedad: Resultado de buscar_archivos_por_sociedad
+
+        Returns:
+            DataFrame con una fila por sociedad (en orden alfabético): Sociedad, Cuentas,
+            No_Cumplen, Validacion_Exitosa y Error (vacío si se pudo validar)
+        """
+        diarios, sumas, errores = [], [], {}
+
+        for nombre_sociedad, archivos in sorted(archivos_por_sociedad.items()):
+            try:
+                df_diario, df_sumas = self.cargar_datos_validacion(archivos)
+            except Exception as e:
+                errores[nombre_sociedad] = str(e)
+                continue
+
+            # Solo las sumas por cuenta: la memoria no crece con las líneas de cada sociedad
+            por_cuenta = df_diario.groupby('GT_CUENTA', sort=False)[COLUMNAS_IMPORTE_LD].sum().reset_index()
+            por_cuenta['GT_CUENTA'] = por_cuenta['GT_CUENTA'].astype(str)
+            diarios.append(por_cuenta.assign(GT_SOCIEDAD=nombre_sociedad))
+            sumas.append(df_sumas[['GT_CUENTA'] + COLUMNAS_IMPORTE_SYS].assign(GT_SOCIEDAD=nombre_sociedad))
+
+        no_cumplen = pd.Series(dtype=int)
+        cuentas = pd.Series(dtype=int)
+        if diarios:
+            resumen = self.calcular_resumen_cuenta(pd.concat(diarios, ignore_index=True),
+                                                   pd.concat(sumas, ignore_index=True),
+                                                   claves=['GT_SOCIEDAD', 'GT_CUENTA'])
+            # Mismo criterio que evaluar_validacion
+            no_cumple = abs(resumen['GT_DIFERENCIA']) >= 0.01
+            no_cumplen = no_cumple.groupby(resumen['GT_SOCIEDAD']).sum()
+            cuentas = resumen.groupby('GT_SOCIEDAD').size()
+
+        filas = []
+        for nombre_sociedad in sorted(archivos_por_sociedad):
+            if nombre_sociedad in errores:
+                filas.append({'Sociedad': nombre_sociedad, 'Cuentas': 0, 'No_Cumplen': 0,
+                              'Validacion_Exitosa': False, 'Error': errores[nombre_sociedad]})
+                continue
+            fallos = int(no_cumplen.get(nombre_sociedad, 0))
+            filas.append({'Sociedad': nombre_sociedad, 'Cuentas': int(cuentas.get(nombre_sociedad, 0)),
+                          'No_Cumplen': fallos, 'Validacion_Exitosa': fallos <= 2, 'Error': ''})
+
+        return pd.DataFrame(filas, columns=['Sociedad', 'Cuentas', 'No_Cumplen', 'Validacion_Exitosa', 'Error'])
+
+    def guardar_libro(self, wb: Workbook, ruta: Path, al_terminar: Callable[[Optional[Exception]], None] = None):
+        """
+        Guarda un libro en segundo plano si self.guardado está activo, o directamente si no.
+        al_terminar recibe None cuando el archivo ya está escrito, o la excepción si falló.
+        """
+        if self.guardado is not None:
+            self.guardado.guardar(wb, ruta, al_terminar)
+            return
+
+        wb.save(ruta)
+        if al_terminar is not None:
+            al_terminar(None)
+
     def generar_excel_totalidad(self, nombre_sociedad: str, df_diario: pd.DataFrame,
-                                df_sumas: pd.DataFrame) -> Tuple[bool, str]:
+                                df_sumas: pd.DataFrame,
+                                df_resumen_asientos: pd.DataFrame = None,
+                                al_guardar: Callable[[bool, Optional[Exception]], None] = None) -> Tuple[bool, str]:
         """
         Genera el archivo Excel de totalidad para una sociedad.
 
         Args:
             nombre_sociedad: Nombre de la sociedad
-            df_diario: DataFrame del libro diario procesado
+            df_diario: DataFrame del libro diario procesado, o sus sumas por GT_CUENTA
+                en modo de memoria acotada
             df_sumas: DataFrame de sumas y saldos procesado
+            df_resumen_asientos: Resumen por asiento calculado en el parseo (opcional).
+                Si se indica, se usa en lugar de agrupar todo el libro diario.
+            al_guardar: Función opcional llamada con (validacion_exitosa, error) cuando el
+                archivo termina de guardarse (error es None si se guardó bien)
 
         Returns:
             Tupla (validacion_exitosa, ruta_archivo)
         """
-        archivo_salida = self.ruta_salida / f"Totalidad_{nombre_sociedad}.xlsx"
+        archivo_salida = self.ruta_excel_totalidad(nombre_sociedad)
 
         # Crear workbook
         wb = Workbook()
@@ -286,12 +777,21 @@ class GeneradorTotalidad:
 
         # HOJA 2: Resumen por Asiento
         ws2 = wb.create_sheet("Resumen_Por_Asiento")
-        resumen_asiento = df_diario.groupby('GT_ASIENTO').agg({
+        if df_resumen_asientos is not None and not df_resumen_asientos.empty:
+            df_asientos = df_resumen_asientos
+        else:
+            df_asientos = df_diario
+        resumen_asiento = df_asientos.groupby('GT_ASIENTO').agg({
             'GT_DEBE': 'sum',
             'GT_HABER': 'sum',
             'GT_IMPORTE_MONEDA_LOCAL': 'sum'
         }).reset_index().round(2)
 
+        # Solo excepciones: el detalle completo va al .detalle.npz y al Excel los descuadrados
+        detalle = {'Resumen_Por_Asiento': resumen_asiento}
+        if self.solo_excepciones:
+            resumen_asiento = resumen_asiento[resumen_asiento['GT_IMPORTE_MONEDA_LOCAL'].abs() >= 0.01]
+
         for r_idx, row in enumerate(dataframe_to_rows(resumen_asiento, index=False, header=True), 1):
             for c_idx, value in enumerate(row, 1):
                 celda = ws2.cell(row=r_idx, column=c_idx, value=value)
@@ -308,36 +808,21 @@ class GeneradorTotalidad:
         # HOJA 3: Resumen por Cuenta
         ws3 = wb.create_sheet("Resumen_Por_Cuenta")
 
-        # Resumen del libro diario por cuenta
-        resumen_cuenta = df_diario.groupby('GT_CUENTA').agg({
-            'GT_DEBE': 'sum',
-            'GT_HABER': 'sum',
-            'GT_IMPORTE_MONEDA_LOCAL': 'sum'
-        }).reset_index()
+        resumen_final = self.calcular_resumen_cuenta(df_diario, df_sumas)
 
-        # Resumen de sumas y saldos por cuenta
-        resumen_sumas_cuenta = df_sumas.groupby('GT_CUENTA').agg({
-            'GT_PERIODOS_ANTERIORES': 'sum',
-            'GT_ARRASTRE_SALDOS': 'sum',
-            'GT_SALDO_DEBE_SyS': 'sum',
-            'GT_SALDO_HABER_SyS': 'sum',
-            'GT_SALDO_PERIODO_SyS': 'sum'
-        }).reset_index()
+        # Cubo por niveles de cuenta (hotusa.py niveles) a partir del resumen ya agregado
+        guardar_cubo(construir_cubo(resumen_final), ruta_cubo(self.ruta_excel_totalidad(nombre_sociedad)))
 
-        # JOIN
-        resumen_final = pd.merge(
-            resumen_cuenta,
-            resumen_sumas_cuenta,
-            on='GT_CUENTA',
-            how='outer'
-        ).fillna(0).round(2)
+        # Verificar validación (diferencias cercanas a cero) sobre todas las cuentas
+        validacion_exitosa, no_cumplen = self.evaluar_validacion(resumen_final)
 
-        # Calcular diferencia
-        resumen_final['GT_DIFERENCIA'] = (
-            resumen_final['GT_IMPORTE_MONEDA_LOCAL'] +
-            resumen_final['GT_ARRASTRE_SALDOS']
-        ) - resumen_final['GT_SALDO_PERIODO_SyS']
-        resumen_final['GT_DIFERENCIA'] = resumen_final['GT_DIFERENCIA'].round(2)
+        detalle['Resumen_Por_Cuenta'] = resumen_final
+        if self.solo_excepciones:
+            guardar_detalle(detalle, ruta_detalle(archivo_salida))
+            resumen_final = resumen_final[resumen_final['GT_DIFERENCIA'].abs() >= 0.01]
+        elif ruta_detalle(archivo_salida).exists():
+            # Un detalle de una ejecución anterior ya no corresponde a este Excel
+            ruta_detalle(archivo_salida).unlink()
 
         for r_idx, row in enumerate(dataframe_to_rows(resumen_final, index=False, header=True), 1):
             for c_idx, value in enumerate(row, 1):
@@ -352,10 +837,6 @@ class GeneradorTotalidad:
             ws3.column_dimensions[col_letra].width = 20
         self.aplicar_formato_tabla(ws3, resumen_final, 'A1', f'Tabla_ResumenCuenta_{nombre_sociedad.replace(" ", "_")}')
 
-        # Verificar validación (diferencias cercanas a cero)
-        no_cumplen = sum(abs(resumen_final['GT_DIFERENCIA']) >= 0.01)
-        validacion_exitosa = no_cumplen <= 2
-
         # HOJA 4: Documentación
         ws4 = wb.create_sheet("Documentacion")
 
@@ -364,6 +845,7 @@ class GeneradorTotalidad:
             ['', ''],
             ['Sociedad:', nombre_sociedad],
             ['Fecha de generación:', pd.Timestamp.now().strftime('%Y-%m-%d %H:%M:%S')],
+            *([['Períodos del libro diario:', ', '.join(self.periodos)]] if self.periodos else []),
             ['', ''],
             ['CÁLCULOS REALIZADOS', ''],
             ['', ''],
@@ -385,7 +867,12 @@ class GeneradorTotalidad:
             ['  GT_SALDO_DEBE_SyS', '= Del archivo sumas y saldos'],
             ['  GT_SALDO_HABER_SyS', '= Del archivo sumas y saldos'],
             ['  GT_SALDO_PERIODO_SyS', '= Del archivo sumas y saldos'],
-            ['  GT_DIFERENCIA', '= (GT_IMPORTE_MONEDA_LOCAL + GT_ARRASTRE_SALDOS) - GT_SALDO_PERIODO_SyS'],
+            *([['  GT_DIFERENCIA', '= GT_IMPORTE_MONEDA_LOCAL - (GT_SALDO_DEBE_SyS - GT_SALDO_HABER_SyS)'],
+               ['  ', 'Con períodos: el libro diario de esos períodos frente a los movimientos del '
+                      'período de informe de sumas y saldos (no al saldo acumulado)'],
+               ['  ', 'Sumas y saldos debe estar exportado para los mismos períodos']]
+              if self.periodos else
+              [['  GT_DIFERENCIA', '= (GT_IMPORTE_MONEDA_LOCAL + GT_ARRASTRE_SALDOS) - GT_SALDO_PERIODO_SyS']]),
             ['  ', 'Debe ser 0,00 o muy cercano a 0'],
             ['', ''],
             ['VALIDACIÓN:', 'EXITOSA' if validacion_exitosa else 'NO EXITOSA'],
@@ -393,11 +880,23 @@ class GeneradorTotalidad:
             ['Tolerancia:', 'Máximo 2 diferencias >= 0.01'],
         ]
 
+        if self.solo_excepciones:
+            doc_data += [
+                ['', ''],
+                ['SOLO EXCEPCIONES', ''],
+                ['', ''],
+                ['Asientos:', str(len(detalle['Resumen_Por_Asiento']))],
+                ['Asientos descuadrados (Hoja 2):', str(len(resumen_asiento))],
+                ['Cuentas:', str(len(detalle['Resumen_Por_Cuenta']))],
+                ['Cuentas con diferencia (Hoja 3):', str(len(resumen_final))],
+                ['Detalle completo:', ruta_detalle(archivo_salida).name],
+            ]
+
         for r_idx, row_data in enumerate(doc_data, 1):
             for c_idx, value in enumerate(row_data, 1):
                 celda = ws4.cell(row=r_idx, column=c_idx, value=value)
                 # Formato especial para títulos
-                if 'DOCUMENTACIÓN' in str(value) or 'CÁLCULOS' in str(value):
+                if 'DOCUMENTACIÓN' in str(value) or 'CÁLCULOS' in str(value) or 'EXCEPCIONES' in str(value):
                     celda.font = Font(bold=True, size=14)
                 elif value.endswith(':') and c_idx == 1:
                     celda.font = Font(bold=True)
@@ -405,8 +904,9 @@ class GeneradorTotalidad:
         ws4.column_dimensions['A'].width = 35
         ws4.column_dimensions['B'].width = 60
 
-        # Guardar archivo
-        wb.save(archivo_salida)
+        # Guardar archivo (en segundo plano durante procesar_todas_las_sociedades)
+        self.guardar_libro(wb, archivo_salida,
+                           al_guardar and (lambda error: al_guardar(validacion_exitosa, error)))
 
         simbolo = "✅" if validacion_exitosa else "❌"
         print(f"{simbolo} Totalidad generada: {nombre_sociedad} - Validación: {'EXITOSA' if validacion_exitosa else 'NO EXITOSA'}")
@@ -433,6 +933,9 @@ class GeneradorTotalidad:
             'errores': []
         }
 
+        # Cada Excel se comprime y escribe en un hilo aparte mientras se calcula el siguiente
+        self.guardado = GuardadoSegundoPlano()
+
         for nombre_sociedad, archivos in sociedades.items():
             try:
                 print(f"Procesando: {nombre_sociedad}")
@@ -450,24 +953,44 @@ class GeneradorTotalidad:
                     resultados['errores'].append(nombre_sociedad)
                     continue
 
-                # Procesar archivos
-                df_diario = self.procesar_libro_diario(archivos_ld)
-                df_sumas = self.procesar_sumas_saldos(archivos_sys)
-
-                if df_diario.empty:
-                    print(f"⚠️  Libro diario vacío para {nombre_sociedad}")
-                    resultados['errores'].append(nombre_sociedad)
+                # Reutilizar el resultado si las entradas y el código no han cambiado y siguen
+                # ahí todos sus archivos (si falta el cubo o el detalle, se regenera)
+                huella = self.huella_entradas(archivos)
+                cacheado = self.cache.get(self.ruta_excel_totalidad(nombre_sociedad).name)
+                if (self.usar_cache and cacheado and cacheado['huella'] == huella
+                        and all(ruta.exists() for ruta in self.salidas_totalidad(nombre_sociedad))):
+                    validacion_exitosa = cacheado['validacion_exitosa']
+                    print(f"⏭️  Sin cambios: {nombre_sociedad} - Validación: "
+                          f"{'EXITOSA' if validacion_exitosa else 'NO EXITOSA'} (resultado en caché)")
+                    resultados['exitosas' if validacion_exitosa else 'no_exitosas'].append(nombre_sociedad)
                     continue
 
-                # Generar Excel
-                validacion_exitosa, ruta_archivo = self.generar_excel_totalidad(
-                    nombre_sociedad, df_diario, df_sumas
-                )
-
-                if validacion_exitosa:
-                    resultados['exitosas'].append(nombre_sociedad)
-                else:
-                    resultados['no_exitosas'].append(nombre_sociedad)
+                # Cálculo y Excel de la sociedad, perfilados si se pidió --profile
+                with perfilar('totalidad', nombre_sociedad, self.carpeta_perfiles):
+                    # Procesar archivos
+                    if self.presupuesto:
+                        # Solo las sumas por cuenta y por asiento, nunca las líneas completas
+                        try:
+                            df_diario, df_resumen_asientos = self.agregar_libro_diario(archivos_ld)
+                        finally:
+                            self.presupuesto.limpiar()
+                    else:
+                        df_diario = self.procesar_libro_diario(archivos_ld)
+                        # El resumen por asiento del parseo cubre el año completo
+                        if self.periodos:
+                            df_resumen_asientos = None
+                        else:
+                            df_resumen_asientos = self.procesar_resumen_asientos(archivos.get('resumen_asientos', []))
+                    df_sumas = self.procesar_sumas_saldos(archivos_sys)
+
+                    if df_diario.empty:
+                        print(f"⚠️  Libro diario vacío para {nombre_sociedad}")
+                        resultados['errores'].append(nombre_sociedad)
+                        continue
+
+                    # Generar Excel (se guarda mientras se calcula la sociedad siguiente)
+                    self.generar_sociedad(nombre_sociedad, df_diario, df_sumas, df_resumen_asientos,
+                                          resultados, huella)
 
             except Exception as e:
                 print(f"❌ Error procesando {nombre_sociedad}: {e}")
@@ -475,7 +998,51 @@ class GeneradorTotalidad:
                 traceback.print_exc()
                 resultados['errores'].append(nombre_sociedad)
 
-        # Resumen final
+        # Esperar a los últimos guardados antes del resumen
+        self.guardado.cerrar()
+        self.guardado = None
+
+        self.imprimir_resumen(resultados)
+
+    def generar_sociedad(self, nombre_sociedad: str, df_diario: pd.DataFrame, df_sumas: pd.DataFrame,
+                         df_resumen_asientos: Optional[pd.DataFrame], resultados: Dict[str, List[str]],
+                         huella: Optional[str]):
+        """
+        Genera el Excel de una sociedad y anota su resultado en 'resultados'.
+
+        Args:
+            huella: Huella de las entradas para la caché, o None si los datos no vienen de
+                los CSV (modo pipeline): entonces se borra la entrada de la sociedad en la caché
+        """
+        def al_guardar(validacion_exitosa: bool, error: Optional[Exception]):
+            # El resultado solo entra en la caché cuando el Excel ya está escrito
+            clave = self.ruta_excel_totalidad(nombre_sociedad).name
+            if error is None and huella is not None:
+                self.cache[clave] = {
+                    'huella': huella,
+                    'validacion_exitosa': bool(validacion_exitosa)
+                }
+                guardar_json_atomico(self.ruta_cache, self.cache)
+            else:
+                if self.cache.pop(clave, None) is not None:
+                    guardar_json_atomico(self.ruta_cache, self.cache)
+            if error is not None:
+                for lista in ('exitosas', 'no_exitosas'):
+                    if nombre_sociedad in resultados[lista]:
+                        resultados[lista].remove(nombre_sociedad)
+                resultados['errores'].append(nombre_sociedad)
+
+        validacion_exitosa, _ = self.generar_excel_totalidad(
+            nombre_sociedad, df_diario, df_sumas, df_resumen_asientos, al_guardar
+        )
+
+        if validacion_exitosa:
+            resultados['exitosas'].append(nombre_sociedad)
+        else:
+            resultados['no_exitosas'].append(nombre_sociedad)
+
+    def imprimir_resumen(self, resultados: Dict[str, List[str]]):
+        """Imprime el resumen final de validaciones."""
         print("\n" + "="*70)
         print("📈 RESUMEN DE TOTALIDAD")
         print("="*70)
@@ -500,14 +1067,134 @@ class GeneradorTotalidad:
                 print(f"   - {sociedad}")
 
 
+class ReceptorTotalidad:
+    """
+    Totalidad en el mismo proceso que procesar_datos.py (hotusa.py pipeline).
+
+    ProcesadorDatos entrega cada grupo ya parseado y, al terminar cada sociedad, se genera
+    su Excel con los mismos cálculos que desde los CSV, sin buscarlos, leerlos ni volver a
+    detectar sus columnas. De cada grupo solo se conservan las columnas GT_ necesarias.
+    """
+
+    def __init__(self, generador: GeneradorTotalidad):
+        """
+        Args:
+            generador: Generador con la carpeta de salida, los períodos y las cachés
+        """
+        self.generador = generador
+        self.sociedades = {}
+        self.resultados = {'exitosas': [], 'no_exitosas': [], 'errores': []}
+        generador.guardado = GuardadoSegundoPlano()
+
+    def datos_sociedad(self, nombre_sociedad: str) -> Dict[str, list]:
+        """Datos recibidos hasta ahora de una sociedad (se crean vacíos la primera vez)."""
+        return self.sociedades.setdefault(nombre_sociedad, {
+            'libro_diario': [], 'sumas_saldos': [], 'resumen_asientos': [], 'resumen_completo': True
+        })
+
+    def recibir_libro_diario(self, nombre_sociedad: str, columnas: List[str],
+                             extraer: Callable[[List[str]], pd.DataFrame], resumen_asientos: Iterable[dict]):
+        """
+        Recibe un libro diario consolidado (un grupo de procesar_datos.py).
+
+        Args:
+            nombre_sociedad: Nombre normalizado (carpeta en datos_tratados)
+            columnas: Columnas que tendría su CSV, para resolver el mapeo
+            extraer: Devuelve las columnas pedidas con los valores que tendría el CSV
+            resumen_asientos: Resumen por asiento calculado en el parseo (vacío si no hay)
+        """
+        generador = self.generador
+        datos = self.datos_sociedad(nombre_sociedad)
+        mapeo = generador.cache_columnas.obtener('LD', columnas)
+        usadas = [col for col in mapeo.values() if col]
+        tipos = {col: str for col in (mapeo['cuenta'], mapeo['asiento']) if col}
+
+        filtrar = bool(generador.periodos) and 'GT_PERIODO' in columnas
+        df = extraer(usadas + (['GT_PERIODO'] if filtrar else [])).astype(tipos)
+        if filtrar:
+            meses = expandir_periodos(generador.periodos)
+            df = df[df['GT_PERIODO'].isin(meses)].drop(columns=['GT_PERIODO']).reset_index(drop=True)
+
+        df = generador.crear_columnas_gt_ld(df, mapeo)
+        datos['libro_diario'].append(df[['GT_CUENTA', 'GT_ASIENTO'] + COLUMNAS_IMPORTE_LD])
+
+        resumen = pd.DataFrame(list(resumen_asientos), columns=['GT_ASIENTO'] + COLUMNAS_IMPORTE_LD)
+        if resumen.empty:
+            datos['resumen_completo'] = False
+        else:
+            resumen['GT_ASIENTO'] = resumen['GT_ASIENTO'].astype(str)
+            datos['resumen_asientos'].append(resumen)
+
+    def recibir_sumas_saldos(self, nombre_sociedad: str, columnas: List[str],
+                             extraer: Callable[[List[str]], pd.DataFrame]):
+        """Recibe unas sumas y saldos consolidadas (argumentos como en recibir_libro_diario)."""
+        generador = self.generador
+        mapeo = generador.cache_columnas.obtener('SYS', columnas)
+        usadas = [col for col in mapeo.values() if col]
+        tipos = {mapeo['cuenta']: str} if mapeo['cuenta'] else {}
+
+        df = generador.crear_columnas_gt_sys(extraer(usadas).astype(tipos), mapeo)
+        self.datos_sociedad(nombre_sociedad)['sumas_saldos'].append(df)
+
+    def descartar_sociedad(self, nombre_sociedad: str):
+        """Descarta lo recibido de una sociedad cuyo procesamiento falló."""
+        self.sociedades.pop(nombre_sociedad, None)
+        self.resultados['errores'].append(nombre_sociedad)
+
+    def terminar_sociedad(self, nombre_sociedad: str):
+        """Genera el Excel de totalidad de una sociedad con todo lo recibido de ella."""
+        datos = self.datos_sociedad(nombre_sociedad)
+        del self.sociedades[nombre_sociedad]
+
+        generador = self.generador
+        try:
+            if not datos['libro_diario']:
+                print(f"⚠️  No se encontró libro diario para {nombre_sociedad}")
+                self.resultados['errores'].append(nombre_sociedad)
+                return
+
+            if not datos['sumas_saldos']:
+                print(f"⚠️  No se encontró sumas y saldos para {nombre_sociedad}")
+                self.resultados['errores'].append(nombre_sociedad)
+                return
+
+            df_diario = concatenar_libro_diario(datos['libro_diario'])
+            df_sumas = pd.concat(datos['sumas_saldos'], ignore_index=True)
+            # El resumen por asiento del parseo cubre el año completo
+            if generador.periodos:
+                df_resumen_asientos = None
+            elif datos['resumen_completo']:
+                df_resumen_asientos = pd.concat(datos['resumen_asientos'], ignore_index=True)
+            else:
+                df_resumen_asientos = pd.DataFrame()
+
+            if df_diario.empty:
+                print(f"⚠️  Libro diario vacío para {nombre_sociedad}")
+                self.resultados['errores'].append(nombre_sociedad)
+                return
+
+            generador.generar_sociedad(nombre_sociedad, df_diario, df_sumas, df_resumen_asientos,
+                                       self.resultados, huella=None)
+
+        except Exception as e:
+            print(f"❌ Error generando la totalidad de {nombre_sociedad}: {e}")
+            import traceback
+            traceback.print_exc()
+            self.resultados['errores'].append(nombre_sociedad)
+
+    def finalizar(self):
+        """Espera los últimos Excel e imprime el resumen de validaciones."""
+        self.generador.guardado.cerrar()
+        self.generador.guardado = None
+        self.generador.imprimir_resumen(self.resultados)
+
+
 def main():
-    """Función principal."""
-    generador = GeneradorTotalidad(
-        ruta_datos_tratados='datos_tratados',
-        ruta_salida='totalidad'
-    )
+    """Función principal. Equivale a 'python hotusa.py totalidad'."""
+    import sys
+    import hotusa
 
-    generador.procesar_todas_las_sociedades()
+    hotusa.main(['totalidad'] + sys.argv[1:], prog='generar_totalidad.py')
 
 
 if __name__ == '__main__':
@@ -0,0 +1,387 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Punto de entrada único del pipeline de datos contables de Hotusa.
+
+Subcomandos:
+    inventory  Lista sociedades y archivos de estructura_json.json (sin pandas)
+    preview    Comprueba rápidamente si el parser entiende uno o más archivos originales
+    process    Procesa los archivos originales a CSV (procesar_datos.py)
+    pipeline   Procesa y genera la totalidad en un solo proceso, sin releer los CSV
+    totalidad  Genera los Excel de totalidad por sociedad (generar_totalidad.py)
+    validate   Calcula solo la validación de totalidad, sin generar Excel
+    niveles    Totales por nivel de cuenta (grupo, subgrupo...) desde el cubo de la totalidad
+    serve      Servicio local de consultas (saldo, asiento, conciliación) con caché en memoria
+
+pandas y openpyxl solo se importan dentro de los subcomandos que los necesitan,
+de modo que --help e inventory arrancan en unas decenas de milisegundos.
+"""
+
+import argparse
+import json
+import sys
+from pathlib import Path
+from typing import List
+
+
+def comando_inventory(args) -> int:
+    """Muestra el inventario de sociedades y archivos de la estructura JSON."""
+    with open(args.estructura, 'r', encoding='utf-8') as f:
+        estructura = json.load(f)
+
+    ruta_originales = Path(args.datos_originales)
+    total_archivos = 0
+    faltan = 0
+
+    for sociedad_info in estructura['sociedades']:
+        nombre = sociedad_info['sociedad']
+
+        # Lista de (subcarpeta de año o '', tipo, info de archivo)
+        grupos = []
+        if 'por_anios' in sociedad_info:
+            for anio_info in sociedad_info['por_anios']:
+                grupos += [(anio_info['anio'], 'LD', item) for item in anio_info['libros_diarios']]
+                grupos += [(anio_info['anio'], 'SYS', item) for item in anio_info['sumas_saldos']]
+        else:
+            grupos += [('', 'LD', item) for item in sociedad_info.get('libros_diarios', [])]
+            grupos += [('', 'SYS', item) for item in sociedad_info.get('sumas_saldos', [])]
+
+        num_ld = sum(1 for _, tipo, _ in grupos if tipo == 'LD')
+        print(f"{nombre}: {num_ld} libros diarios, {len(grupos) - num_ld} sumas y saldos")
+
+        if args.detalle or args.comprobar:
+            for anio, tipo, item in grupos:
+                marca = ''
+                if args.comprobar:
+                    existe = (ruta_originales / nombre / anio / item['archivo']).exists()
+                    marca = '  ✅' if existe else '  ❌ no encontrado'
+                    faltan += 0 if existe else 1
+                prefijo = f"[{anio}] " if anio else ''
+                print(f"   {tipo:<4}{prefijo}{item['archivo']} {item.get('tamano', '')}{marca}")
+
+        total_archivos += len(grupos)
+
+    print(f"\nSociedades: {len(estructura['sociedades'])} - Archivos: {total_archivos}")
+    if args.comprobar and faltan:
+        print(f"❌ Archivos no encontrados: {faltan}")
+        return 1
+    return 0
+
+
+def comando_preview(args) -> int:
+    """Previsualiza archivos originales leyendo solo el inicio y unas muestras."""
+    from procesar_datos import ProcesadorDatos
+
+    procesador = ProcesadorDatos(ruta_estructura_json=None, ruta_datos_originales='.',
+                                 ruta_datos_tratados='.')
+    fallidos = 0
+    for archivo in args.archivos:
+        resultado = procesador.previsualizar_archivo(
+            Path(archivo), kb_inicio=args.kb, muestras=args.muestras,
+            registros_por_muestra=args.registros, semilla=args.semilla
+        )
+        if resultado['tipo'] is None or not all(resultado['muestras'].values()):
+            fallidos += 1
+
+    return 1 if fallidos else 0
+
+
+def comando_process(args) -> int:
+    """Procesa los archivos originales de todas las sociedades."""
+    from procesar_datos import ProcesadorDatos
+
+    procesador = ProcesadorDatos(
+        ruta_estructura_json=args.estructura,
+        ruta_datos_originales=args.datos_originales,
+        ruta_datos_tratados=args.datos_tratados,
+        formato_normalizado=args.normalizado,
+        compresion=args.compresion,
+        nivel_compresion=args.nivel_compresion,
+        reanudar=args.resume,
+        prefijos_eliminacion=args.prefijos_eliminacion,
+        deduplicar=not args.sin_deduplicar,
+        ordenar_diario=args.ordenar,
+        memoria_max_mb=args.memoria_max,
+        carpeta_temporal=args.dir_temporal,
+        carpeta_perfiles=args.profile,
+        intervalo_progreso=args.progreso
+    )
+
+    procesador.procesar_todo()
+    return 0
+
+
+def comando_pipeline(args) -> int:
+    """Procesa los originales y genera la totalidad de cada sociedad en el mismo proceso."""
+    from procesar_datos import ProcesadorDatos
+    from generar_totalidad import GeneradorTotalidad, ReceptorTotalidad
+
+    generador = GeneradorTotalidad(
+        ruta_datos_tratados=args.datos_tratados,
+        ruta_salida=args.salida,
+        periodos=args.periodos,
+        usar_cache=False,
+        solo_excepciones=args.solo_excepciones
+    )
+    receptor = ReceptorTotalidad(generador)
+
+    procesador = ProcesadorDatos(
+        ruta_estructura_json=args.estructura,
+        ruta_datos_originales=args.datos_originales,
+        ruta_datos_tratados=args.datos_tratados,
+        formato_normalizado=args.normalizado,
+        compresion=args.compresion,
+        nivel_compresion=args.nivel_compresion,
+        prefijos_eliminacion=args.prefijos_eliminacion,
+        deduplicar=not args.sin_deduplicar,
+        ordenar_diario=args.ordenar,
+        memoria_max_mb=args.memoria_max,
+        carpeta_temporal=args.dir_temporal,
+        carpeta_perfiles=args.profile,
+        receptor=receptor,
+        escribir_csv=not args.sin_csv,
+        intervalo_progreso=args.progreso
+    )
+
+    procesador.procesar_todo()
+    receptor.finalizar()
+    return 0
+
+
+def comando_totalidad(args) -> int:
+    """Genera los reportes de totalidad por sociedad."""
+    from generar_totalidad import GeneradorTotalidad
+
+    generador = GeneradorTotalidad(
+        ruta_datos_tratados=args.datos_tratados,
+        ruta_salida=args.salida,
+        periodos=args.periodos,
+        usar_cache=not args.forzar,
+        solo_excepciones=args.solo_excepciones,
+        memoria_max_mb=args.memoria_max,
+        carpeta_temporal=args.dir_temporal,
+        carpeta_perfiles=args.profile,
+        intervalo_progreso=args.progreso
+    )
+
+    generador.procesar_todas_las_sociedades()
+    return 0
+
+
+def comando_validate(args) -> int:
+    """Calcula la validación de totalidad de cada sociedad sin generar Excel."""
+    from generar_totalidad import GeneradorTotalidad
+
+    generador = GeneradorTotalidad(
+        ruta_datos_tratados=args.datos_tratados,
+        ruta_salida=args.salida,
+        periodos=args.periodos,
+        memoria_max_mb=args.memoria_max,
+        carpeta_temporal=args.dir_temporal,
+        intervalo_progreso=args.progreso
+    )
+
+    # Todas las sociedades se cruzan y validan en un único cálculo
+    tabla = generador.validar_sociedades(generador.buscar_archivos_por_sociedad())
+
+    for fila in tabla.itertuples(index=False):
+        if fila.Error:
+            print(f"⚠️  {fila.Sociedad}: {fila.Error}")
+            continue
+        simbolo = "✅" if fila.Validacion_Exitosa else "❌"
+        print(f"{simbolo} {fila.Sociedad}: {fila.No_Cumplen} diferencias")
+
+    if args.tabla:
+        tabla.to_csv(args.tabla, index=False, encoding='utf-8-sig')
+        print(f"✅ Tabla de validación guardada: {args.tabla}")
+
+    return 0 if tabla['Validacion_Exitosa'].all() else 1
+
+
+def comando_niveles(args) -> int:
+    """Muestra los totales de una sociedad agrupados por los primeros dígitos de cuenta."""
+    import pandas as pd
+    from cubo_cuentas import NIVELES_PGC, cargar_cubo, nivel, ruta_cubo
+    from generar_totalidad import GeneradorTotalidad
+
+    generador = GeneradorTotalidad(ruta_datos_tratados=args.datos_tratados, ruta_salida=args.salida,
+                                   periodos=args.periodos)
+    ruta = ruta_cubo(generador.ruta_excel_totalidad(args.sociedad))
+    if not ruta.exists():
+        print(f"❌ No existe {ruta}: genera antes la totalidad (hotusa.py totalidad)")
+        return 1
+
+    tabla = nivel(cargar_cubo(ruta), args.digitos, args.prefijo)
+    nombre_nivel = NIVELES_PGC.get(args.digitos, f'{args.digitos} dígitos')
+    filtro = f" de {args.prefijo}" if args.prefijo else ''
+    print(f"🔎 {args.sociedad}: {nombre_nivel}{filtro} ({len(tabla)} filas)")
+    with pd.option_context('display.max_rows', None, 'display.width', 200):
+        print(tabla.to_string(index=False))
+    return 0
+
+
+def comando_serve(args) -> int:
+    """Arranca el servicio local de consultas sobre datos_tratados."""
+    from servicio_consultas import servir
+
+    servir(args.datos_tratados, puerto=args.puerto, cache_max_mb=args.cache_max, ruta_salida=args.salida)
+    return 0
+
+
+def agregar_opciones_memoria(parser: argparse.ArgumentParser):
+    """Opciones del modo de memoria acotada con desbordamiento a disco."""
+    parser.add_argument('--memoria-max', type=int, default=None, metavar='MB',
+                        help='Memoria máxima para datos acumulados; el exceso se vuelca a disco')
+    parser.add_argument('--dir-temporal', default=None,
+                        help='Carpeta en disco local para los volcados (por defecto la del sistema)')
+
+
+def agregar_opcion_perfilado(parser: argparse.ArgumentParser):
+    """Opción --profile: perfil de tiempo y memoria por sociedad."""
+    parser.add_argument('--profile', nargs='?', const='perfiles', default=None, metavar='CARPETA',
+                        help='Perfila cada sociedad con cProfile y tracemalloc (por defecto en ./perfiles)')
+
+
+def agregar_opcion_progreso(parser: argparse.ArgumentParser):
+    """Opción --progreso: informes de MB, líneas/s y ETA de los archivos grandes."""
+    from progreso import INTERVALO_PROGRESO
+
+    parser.add_argument('--progreso', type=float, default=INTERVALO_PROGRESO, metavar='SEG',
+                        help='Segundos entre informes de progreso de cada archivo (0 = sin informes)')
+
+
+def agregar_opcion_excepciones(parser: argparse.ArgumentParser):
+    """Opción --solo-excepciones: Excel de totalidad solo con descuadres y diferencias."""
+    parser.add_argument('--solo-excepciones', action='store_true',
+                        help='El Excel solo lleva asientos descuadrados y cuentas con diferencia; '
+                             'el detalle completo se guarda en Totalidad_<sociedad>.detalle.npz')
+
+
+def agregar_opciones_process(parser: argparse.ArgumentParser):
+    """Opciones de entrada y salida del procesamiento de originales (process y pipeline)."""
+    parser.add_argument('--estructura', default='estructura_json.json')
+    parser.add_argument('--datos-originales', default='datos_originales')
+    parser.add_argument('--datos-tratados', default='datos_tratados')
+    parser.add_argument('--normalizado', action='store_true',
+                        help='Guarda los libros diarios como tablas de asientos y líneas')
+    parser.add_argument('--compresion', choices=['gzip', 'zstd'], default=None,
+                        help='Comprime los CSV de salida con el códec indicado (zstd requiere el '
+                             'paquete zstandard y no admite --resume)')
+    parser.add_argument('--nivel-compresion', type=int, default=None,
+                        help='Nivel del códec (ver benchmark_compresion.py)')
+    parser.add_argument('--eliminar-prefijo', action='append', dest='prefijos_eliminacion', default=None,
+                        help='Prefijo de cuenta a eliminar en la consolidación de grupo (repetible)')
+    parser.add_argument('--sin-deduplicar', action='store_true',
+                        help='No elimina las líneas repetidas entre libros diarios solapados')
+    parser.add_argument('--ordenar', action='store_true',
+                        help='Guarda cada libro diario anual ordenado por asiento (fecha contable, Nº doc.), '
+                             'con las líneas de cada asiento en su orden original')
+
+
+def crear_parser(prog: str = None) -> argparse.ArgumentParser:
+    """Crea el parser de argumentos con todos los subcomandos."""
+    parser = argparse.ArgumentParser(prog=prog, description='Pipeline de datos contables de Hotusa.')
+    subparsers = parser.add_subparsers(dest='comando', required=True)
+
+    # inventory
+    p_inventory = subparsers.add_parser('inventory', help='Lista sociedades y archivos de la estructura')
+    p_inventory.add_argument('--estructura', default='estructura_json.json')
+    p_inventory.add_argument('--datos-originales', default='datos_originales')
+    p_inventory.add_argument('--detalle', action='store_true', help='Muestra cada archivo')
+    p_inventory.add_argument('--comprobar', action='store_true',
+                             help='Comprueba que cada archivo existe en datos_originales')
+    p_inventory.set_defaults(funcion=comando_inventory)
+
+    # preview
+    p_preview = subparsers.add_parser('preview', help='Comprueba rápidamente el formato de archivos originales')
+    p_preview.add_argument('archivos', nargs='+', help='Archivos LD o SyS (.XLS de SAP, .xlsx)')
+    p_preview.add_argument('--kb', type=int, default=256, help='KB leídos del inicio del archivo')
+    p_preview.add_argument('--muestras', type=int, default=4, help='Fragmentos aleatorios a leer')
+    p_preview.add_argument('--registros', type=int, default=3, help='Registros de ejemplo por fragmento')
+    p_preview.add_argument('--semilla', type=int, default=0, help='Semilla de las posiciones aleatorias')
+    p_preview.set_defaults(funcion=comando_preview)
+
+    # process
+    p_process = subparsers.add_parser('process', help='Procesa los archivos originales a CSV')
+    agregar_opciones_process(p_process)
+    p_process.add_argument('--resume', action='store_true',
+                           help='Reanuda la última ejecución omitiendo sociedades y archivos ya completados; '
+                                'a un libro diario con archivos nuevos solo se le anexan esos (si la '
+                                'ejecución anterior también usó --resume, que guarda sus huellas)')
+    agregar_opciones_memoria(p_process)
+    agregar_opcion_perfilado(p_process)
+    agregar_opcion_progreso(p_process)
+    p_process.set_defaults(funcion=comando_process)
+
+    # pipeline
+    p_pipeline = subparsers.add_parser('pipeline', help='Procesa y genera la totalidad sin releer los CSV')
+    agregar_opciones_process(p_pipeline)
+    p_pipeline.add_argument('--salida', default='totalidad')
+    p_pipeline.add_argument('--periodo', action='append', dest='periodos', default=None,
+                            help='Mes (AAAA-MM) o trimestre (AAAA-Qn) del libro diario a incluir (repetible)')
+    p_pipeline.add_argument('--sin-csv', action='store_true',
+                            help='No escribe los CSV de libro diario, sumas y saldos ni resumen por asiento')
+    agregar_opcion_excepciones(p_pipeline)
+    agregar_opciones_memoria(p_pipeline)
+    agregar_opcion_perfilado(p_pipeline)
+    agregar_opcion_progreso(p_pipeline)
+    p_pipeline.set_defaults(funcion=comando_pipeline)
+
+    # totalidad y validate comparten opciones
+    for nombre, ayuda, funcion in [('totalidad', 'Genera los Excel de totalidad', comando_totalidad),
+                                   ('validate', 'Calcula solo la validación de totalidad', comando_validate)]:
+        p_sub = subparsers.add_parser(nombre, help=ayuda)
+        p_sub.add_argument('--datos-tratados', default='datos_tratados')
+        p_sub.add_argument('--salida', default='totalidad')
+        p_sub.add_argument('--periodo', action='append', dest='periodos', default=None,
+                           help='Mes (AAAA-MM) o trimestre (AAAA-Qn) del libro diario a incluir (repetible)')
+        if nombre == 'totalidad':
+            p_sub.add_argument('--forzar', action='store_true',
+                               help='Regenera todos los Excel aunque sus entradas no hayan cambiado')
+            agregar_opcion_excepciones(p_sub)
+            agregar_opcion_perfilado(p_sub)
+        else:
+            p_sub.add_argument('--tabla', default=None, metavar='CSV',
+                               help='Guarda la tabla de validación de todas las sociedades en un CSV')
+        agregar_opciones_memoria(p_sub)
+        agregar_opcion_progreso(p_sub)
+        p_sub.set_defaults(funcion=funcion)
+
+    # niveles
+    p_niveles = subparsers.add_parser('niveles', help='Totales por nivel de cuenta desde el cubo de la totalidad')
+    p_niveles.add_argument('sociedad', help='Nombre normalizado de la sociedad (ej: Argon_Hotel)')
+    p_niveles.add_argument('--digitos', type=int, default=1,
+                           help='Dígitos del prefijo: 1 grupo, 2 subgrupo, 3 cuenta...')
+    p_niveles.add_argument('--prefijo', default=None, help='Solo las cuentas que empiezan por este prefijo')
+    p_niveles.add_argument('--datos-tratados', default='datos_tratados')
+    p_niveles.add_argument('--salida', default='totalidad')
+    p_niveles.add_argument('--periodo', action='append', dest='periodos', default=None,
+                           help='Períodos con los que se generó la totalidad (repetible)')
+    p_niveles.set_defaults(funcion=comando_niveles)
+
+    # serve
+    p_serve = subparsers.add_parser('serve', help='Servicio local de consultas con caché de sociedades')
+    p_serve.add_argument('--datos-tratados', default='datos_tratados')
+    p_serve.add_argument('--salida', default='totalidad')
+    p_serve.add_argument('--puerto', type=int, default=8765, help='Puerto en 127.0.0.1')
+    p_serve.add_argument('--cache-max', type=int, default=2048, metavar='MB',
+                         help='Memoria máxima de las sociedades en caché (se expulsa la menos usada)')
+    p_serve.set_defaults(funcion=comando_serve)
+
+    return parser
+
+
+def main(argv: List[str] = None, prog: str = None):
+    """Función principal."""
+    parser = crear_parser(prog)
+    args = parser.parse_args(argv)
+    # Los lectores de zstd (pandas incluido) se detienen al final del primer frame: un
+    # CSV .zst no se puede ampliar con otro frame, así que reanudar no podría anexar
+    if getattr(args, 'resume', False) and args.compresion == 'zstd':
+        parser.error("--resume no admite --compresion zstd (un libro diario .zst no se puede ampliar); "
+                     "use --compresion gzip o ejecute sin --resume")
+    sys.exit(args.funcion(args))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Índice de períodos (meses) de los libros diarios procesados.
+
+procesar_datos.py añade a cada línea GT_FECHA (fecha contable ISO) y GT_PERIODO (AAAA-MM)
+y guarda junto a cada libro diario un indice_periodos_<anio>.json con los rangos de filas
+de cada período. Con él se pueden leer solo las filas de un mes o trimestre sin
+recorrer el año completo.
+"""
+
+import json
+import re
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from almacenamiento import guardar_json_atomico
+
+
+PATRON_FECHA = re.compile(r'^(\d{1,2})[./-](\d{1,2})[./-](\d{2}|\d{4})$')
+PATRON_TRIMESTRE = re.compile(r'^(\d{4})-?[QT]([1-4])$', re.IGNORECASE)
+
+
+def parsear_fecha(valor: str) -> Optional[str]:
+    """
+    Convierte una fecha de SAP (dd.mm.aaaa o dd.mm.aa) a formato ISO aaaa-mm-dd.
+
+    Returns:
+        Fecha ISO o None si el valor no es una fecha válida
+    """
+    match = PATRON_FECHA.match(valor.strip()) if valor else None
+    if not match:
+        return None
+
+    dia, mes, anio = (int(g) for g in match.groups())
+    if anio < 100:
+        anio += 2000
+    if not (1 <= mes <= 12 and 1 <= dia <= 31):
+        return None
+
+    return f"{anio:04d}-{mes:02d}-{dia:02d}"
+
+
+def expandir_periodos(periodos: Iterable[str]) -> List[str]:
+    """
+    Expande una lista de períodos a meses AAAA-MM.
+    Admite meses (2025-07) y trimestres (2025-Q3 / 2025-T3).
+    """
+    meses = []
+    for periodo in periodos:
+        match = PATRON_TRIMESTRE.match(periodo.strip())
+        if match:
+            anio, trimestre = match.group(1), int(match.group(2))
+            meses.extend(f"{anio}-{mes:02d}" for mes in range(3 * trimestre - 2, 3 * trimestre + 1))
+        else:
+            meses.append(periodo.strip())
+    return meses
+
+
+def construir_indice(periodos_por_fila: Iterable[str], nombre_archivo: str) -> Dict[str, Any]:
+    """
+    Construye el índice de rangos de filas por período.
+
+    Args:
+        periodos_por_fila: GT_PERIODO de cada fila de datos, en el orden del archivo
+        nombre_archivo: Nombre del CSV indexado
+
+    Returns:
+        Diccionario {'archivo', 'filas', 'periodos': {periodo: [[inicio, fin), ...]}}
+        con filas numeradas desde 0 sin contar la cabecera
+    """
+    periodos = {}
+    periodo_actual = None
+    inicio = 0
+    total = 0
+
+    for fila, periodo in enumerate(periodos_por_fila):
+        if fila == 0:
+            periodo_actual = periodo
+        elif periodo != periodo_actual:
+            periodos.setdefault(periodo_actual or '', []).append([inicio, fila])
+            periodo_actual, inicio = periodo, fila
+        total = fila + 1
+
+    if total:
+        periodos.setdefault(periodo_actual or '', []).append([inicio, total])
+
+    return {'archivo': nombre_archivo, 'filas': total, 'periodos': periodos}
+
+
+def anexar_indice(indice: Dict[str, Any], periodos_por_fila: Iterable[str]) -> Dict[str, Any]:
+    """
+    Índice del mismo CSV tras añadir filas al final: el mismo resultado que construir_indice
+    sobre todas las filas, sin recorrer las que ya estaban indexadas.
+
+    Args:
+        indice: Índice actual (construir_indice o cargar_indice)
+        periodos_por_fila: GT_PERIODO de cada fila añadida, en orden
+    """
+    anexado = construir_indice(periodos_por_fila, indice['archivo'])
+    desplazamiento = indice['filas']
+    periodos = {periodo: [list(rango) for rango in rangos] for periodo, rangos in indice['periodos'].items()}
+
+    for periodo, rangos in anexado['periodos'].items():
+        for inicio, fin in rangos:
+            existentes = periodos.setdefault(periodo, [])
+            # La primera fila añadida continúa el último rango si es del mismo período
+            if existentes and existentes[-1][1] == inicio + desplazamiento:
+                existentes[-1][1] = fin + desplazamiento
+            else:
+                existentes.append([inicio + desplazamiento, fin + desplazamiento])
+
+    return {'archivo': indice['archivo'], 'filas': desplazamiento + anexado['filas'], 'periodos': periodos}
+
+
+def guardar_indice(indice: Dict[str, Any], ruta: Path):
+    """Guarda el índice de períodos de forma atómica y compacta."""
+    guardar_json_atomico(ruta, indice, indent=None)
+
+
+def ruta_indice(archivo_ld: Path) -> Path:
+    """Ruta del índice de períodos correspondiente a un libro_diario_/lineas_diario_ CSV."""
+    nombre = re.sub(r'^(libro_diario|lineas_diario)_', 'indice_periodos_', archivo_ld.name)
+    return archivo_ld.with_name(re.sub(r'\.csv(\.\w+)?$', '.json', nombre))
+
+
+def cargar_indice(archivo_ld: Path) -> Optional[Dict[str, Any]]:
+    """Carga el índice de un libro diario si existe y corresponde a ese archivo."""
+    ruta = ruta_indice(archivo_ld)
+    if not ruta.exists():
+        return None
+
+    with open(ruta, 'r', encoding='utf-8') as f:
+        indice = json.load(f)
+
+    return indice if indice.get('archivo') == archivo_ld.name else None
+
+
+def rangos_de_periodos(indice: Dict[str, Any], periodos: Iterable[str]) -> List[Tuple[int, int]]:
+    """
+    Rangos de filas [inicio, fin) que cubren los períodos pedidos, ordenados y fusionados.
+    """
+    rangos = sorted(
+        tuple(rango)
+        for periodo in expandir_periodos(periodos)
+        for rango in indice['periodos'].get(periodo, [])
+    )
+
+    fusionados = []
+    for inicio, fin in rangos:
+        if fusionados and inicio <= fusionados[-1][1]:
+            fusionados[-1] = (fusionados[-1][0], max(fusionados[-1][1], fin))
+        else:
+            fusionados.append((inicio, fin))
+    return fusionados
+
+
+def leer_csv_periodos(archivo: Path, indice: Dict[str, Any], periodos: Iterable[str], **kwargs):
+    """
+    Lee de un CSV solo las filas de los períodos indicados usando el índice.
+    La lectura se detiene al final del último rango; las filas de otros períodos
+    anteriores a ese punto se saltan sin convertirlas.
+
+    Args:
+        archivo: CSV indexado
+        indice: Índice cargado con cargar_indice
+        periodos: Meses (AAAA-MM) o trimestres (AAAA-Qn)
+        **kwargs: Argumentos adicionales para pd.read_csv (usecols, dtype...)
+
+    Returns:
+        DataFrame con las filas de esos períodos
+    """
+    import pandas as pd
+
+    rangos = rangos_de_periodos(indice, periodos)
+
+    if not rangos:
+        return pd.read_csv(archivo, nrows=0, **kwargs)
+
+    if len(rangos) == 1:
+        inicio, fin = rangos[0]
+        return pd.read_csv(archivo, skiprows=range(1, inicio + 1), nrows=fin - inicio, **kwargs)
+
+    # Varios rangos: una sola lectura saltando los huecos (la fila 0 del archivo es la cabecera)
+    saltar = set()
+    anterior = 0
+    for inicio, fin in rangos:
+        saltar.update(range(anterior + 1, inicio + 1))
+        anterior = fin
+
+    filas = sum(fin - inicio for inicio, fin in rangos)
+    return pd.read_csv(archivo, skiprows=saltar, nrows=filas, **kwargs)
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Detección de columnas de los CSV de libro diario y sumas y saldos.
+
+Cada variante de exportación de SAP (etiquetas de período en castellano,
+"Saldo Haber per.inf.", etc.) produce una cabecera distinta. La correspondencia
+cabecera -> columnas GT_ se resuelve una sola vez por firma de cabecera y se guarda
+en un JSON compartido por procesar_datos.py y generar_totalidad.py.
+"""
+
+import csv
+import hashlib
+import json
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from almacenamiento import abrir_texto_lectura, guardar_json_atomico
+
+
+def detectar_columnas_ld(columnas: List[str]) -> Dict[str, Optional[str]]:
+    """
+    Detecta las columnas de debe, haber, cuenta y asiento de un libro diario.
+
+    Args:
+        columnas: Nombres de columnas del CSV
+
+    Returns:
+        Diccionario {'debe', 'haber', 'cuenta', 'asiento'} -> nombre de columna o None
+    """
+    mapeo = {'debe': None, 'haber': None, 'cuenta': None, 'asiento': None}
+
+    for col in columnas:
+        col_lower = col.lower()
+        if 'debe' in col_lower and 'moneda local' in col_lower and mapeo['debe'] is None:
+            mapeo['debe'] = col
+        elif 'haber' in col_lower and 'moneda local' in col_lower and mapeo['haber'] is None:
+            mapeo['haber'] = col
+        elif col_lower == 'gt_cuenta' and mapeo['cuenta'] is None:
+            mapeo['cuenta'] = col
+        elif col_lower == 'nº doc.' and mapeo['asiento'] is None:
+            mapeo['asiento'] = col
+
+    return mapeo
+
+
+def detectar_columnas_sys(columnas: List[str]) -> Dict[str, Optional[str]]:
+    """
+    Detecta las columnas de cuenta y saldos de un archivo de sumas y saldos.
+
+    Args:
+        columnas: Nombres de columnas del CSV
+
+    Returns:
+        Diccionario {'cuenta', 'arrastre', 'periodos_anteriores', 'debe', 'haber',
+        'saldo_periodo'} -> nombre de columna o None
+    """
+    mapeo = {
+        'cuenta': None,
+        'arrastre': None,
+        'periodos_anteriores': None,
+        'debe': None,
+        'haber': None,
+        'saldo_periodo': None
+    }
+
+    for col in columnas:
+        col_lower = col.lower()
+        es_periodo = 'período' in col_lower or 'periodo' in col_lower or 'per.inf' in col_lower
+        if 'cta' in col_lower and 'mayor' in col_lower and mapeo['cuenta'] is None:
+            mapeo['cuenta'] = col
+        elif 'arrastre' in col_lower and 'saldo' in col_lower and mapeo['arrastre'] is None:
+            mapeo['arrastre'] = col
+        elif 'anterior' in col_lower and mapeo['periodos_anteriores'] is None:
+            mapeo['periodos_anteriores'] = col
+        elif 'debe' in col_lower and es_periodo and mapeo['debe'] is None:
+            mapeo['debe'] = col
+        elif 'haber' in col_lower and es_periodo and mapeo['haber'] is None:
+            mapeo['haber'] = col
+        elif 'saldo acumulado' in col_lower and mapeo['saldo_periodo'] is None:
+            mapeo['saldo_periodo'] = col
+
+    return mapeo
+
+
+# Cambiar si cambian las reglas de detección para invalidar las cachés existentes
+VERSION_MAPEO = 1
+
+DETECTORES = {
+    'LD': detectar_columnas_ld,
+    'SYS': detectar_columnas_sys,
+}
+
+
+def leer_cabecera_csv(archivo: Path) -> List[str]:
+    """Lee solo la fila de encabezados de un CSV (comprimido o no)."""
+    with abrir_texto_lectura(archivo) as f:
+        return next(csv.reader(f), [])
+
+
+class CacheMapeoColumnas:
+    """Caché persistente firma de cabecera -> mapeo de columnas."""
+
+    def __init__(self, ruta_cache: Path):
+        """
+        Inicializa la caché. El JSON se carga la primera vez que se necesita.
+
+        Args:
+            ruta_cache: Ruta al archivo JSON de la caché
+        """
+        self.ruta_cache = Path(ruta_cache)
+        self.mapeos = None
+
+    def firma(self, tipo: str, columnas: List[str]) -> str:
+        """Firma de una cabecera: tipo + versión de las reglas + hash de los nombres en orden."""
+        resumen = hashlib.sha1('\x1f'.join(columnas).encode('utf-8')).hexdigest()
+        return f"{tipo}:v{VERSION_MAPEO}:{resumen}"
+
+    def cargar(self):
+        """Carga la caché desde disco (vacía si no existe o está dañada)."""
+        self.mapeos = {}
+        if self.ruta_cache.exists():
+            try:
+                with open(self.ruta_cache, 'r', encoding='utf-8') as f:
+                    self.mapeos = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"⚠️  Caché de columnas no válida, se regenera: {e}")
+
+    def obtener(self, tipo: str, columnas: List[str]) -> Dict[str, Optional[str]]:
+        """
+        Devuelve el mapeo de columnas para una cabecera, detectándolo solo si es nueva.
+
+        Args:
+            tipo: 'LD' o 'SYS'
+            columnas: Nombres de columnas en el orden del archivo
+
+        Returns:
+            Diccionario rol -> nombre de columna o None
+        """
+        if self.mapeos is None:
+            self.cargar()
+
+        clave = self.firma(tipo, columnas)
+        if clave not in self.mapeos:
+            self.mapeos[clave] = DETECTORES[tipo](columnas)
+            try:
+                guardar_json_atomico(self.ruta_cache, self.mapeos)
+            except OSError as e:
+                print(f"⚠️  No se pudo guardar la caché de columnas: {e}")
+
+        return self.mapeos[clave]
+
+    def obtener_de_archivo(self, tipo: str, archivo: Path) -> Dict[str, Optional[str]]:
+        """Devuelve el mapeo de columnas de un CSV leyendo solo su cabecera."""
+        return self.obtener(tipo, leer_cabecera_csv(archivo))
@@ -0,0 +1,352 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Modo de memoria acotada con desbordamiento a disco.
+
+Con un presupuesto de memoria configurado, las listas de registros y los agregados
+parciales (groupby) que lo superan se vuelcan a archivos temporales en disco local y se
+recombinan al final. El resultado es el mismo; solo cambia el tiempo de ejecución.
+La ordenación externa (tramos ordenados + mezcla en streaming) usa las mismas listas.
+"""
+
+import heapq
+import pickle
+import shutil
+import sys
+import tempfile
+import weakref
+from pathlib import Path
+from typing import Any, Callable, Iterable, Iterator, List, Optional
+
+import pandas as pd
+
+
+# Elementos por bloque al volcar una lista; al releerla solo hay un bloque en memoria
+ELEMENTOS_POR_BLOQUE = 50_000
+
+# Cada cuántos elementos se vuelve a medir el tamaño medio de los elementos de una lista
+MUESTREO_TAMANO = 1_000
+
+# Particiones por clave de los agregados volcados a disco
+PARTICIONES_AGREGADO = 16
+
+# Elementos máximos por tramo ordenado en memoria en la ordenación externa con presupuesto
+ELEMENTOS_POR_TRAMO = 200_000
+
+
+def referencias_valor_propio() -> int:
+    """Referencias que ve estimar_tamano a un valor que solo está en un diccionario."""
+    registro = {'valor': ''.join(['valor', 'propio'])}
+    return max(sys.getrefcount(valor) for valor in registro.values())
+
+
+# Con más referencias que esta, un valor de registro es compartido (textos internados)
+REFERENCIAS_VALOR_PROPIO = referencias_valor_propio()
+
+
+def estimar_tamano(elemento: Any) -> int:
+    """
+    Tamaño aproximado en bytes de un registro (diccionario de textos) o de un valor.
+    Los valores compartidos con otros registros (los textos internados de procesar_datos)
+    no se suman: del registro solo ocupan su puntero, ya incluido en el del diccionario.
+    """
+    if isinstance(elemento, dict):
+        return sys.getsizeof(elemento) + sum(sys.getsizeof(valor) for valor in elemento.values()
+                                             if sys.getrefcount(valor) <= REFERENCIAS_VALOR_PROPIO)
+    return sys.getsizeof(elemento)
+
+
+class PresupuestoMemoria:
+    """
+    Presupuesto de memoria compartido por las estructuras desbordables.
+    Cuando el total estimado supera el límite, se vuelca a disco la estructura más grande.
+    """
+
+    def __init__(self, limite_mb: int, carpeta_temporal: str = None):
+        """
+        Args:
+            limite_mb: Memoria máxima (MB) para registros y agregados acumulados
+            carpeta_temporal: Carpeta en disco local para los volcados (por defecto la del sistema)
+        """
+        self.limite_bytes = int(limite_mb) * 1024 * 1024
+        self.carpeta_base = carpeta_temporal
+        self.carpeta = None
+        self.usado = 0
+        self.estructuras = weakref.WeakSet()
+        self.volcados = 0
+
+    def registrar(self, estructura):
+        """Registra una estructura (con bytes_memoria y volcar()) en el presupuesto."""
+        self.estructuras.add(estructura)
+
+    def ruta_temporal(self, prefijo: str) -> Path:
+        """Ruta nueva para un archivo de volcado, creando la carpeta temporal si hace falta."""
+        if self.carpeta is None:
+            if self.carpeta_base:
+                Path(self.carpeta_base).mkdir(parents=True, exist_ok=True)
+            self.carpeta = Path(tempfile.mkdtemp(prefix='hotusa_', dir=self.carpeta_base))
+        self.volcados += 1
+        return self.carpeta / f"{prefijo}_{self.volcados:06d}.pkl"
+
+    def comprobar(self):
+        """Vuelca a disco las estructuras más grandes hasta volver a estar dentro del límite."""
+        while self.usado > self.limite_bytes:
+            candidatas = [e for e in self.estructuras if e.bytes_memoria > 0]
+            if not candidatas:
+                return
+            max(candidatas, key=lambda e: e.bytes_memoria).volcar()
+
+    def lista(self) -> 'ListaDesbordable':
+        """Crea una lista desbordable asociada a este presupuesto."""
+        return ListaDesbordable(self)
+
+    def limpiar(self):
+        """Elimina los archivos temporales. Las estructuras creadas antes dejan de ser válidas."""
+        if self.carpeta is not None:
+            shutil.rmtree(self.carpeta, ignore_errors=True)
+            self.carpeta = None
+        self.usado = 0
+        self.estructuras = weakref.WeakSet()
+
+
+class ListaDesbordable:
+    """
+    Lista de solo añadir que vuelca sus elementos a disco (pickle por bloques) cuando el
+    presupuesto se supera. Se puede recorrer varias veces, siempre en orden de inserción.
+    """
+
+    def __init__(self, presupuesto: PresupuestoMemoria):
+        self.presupuesto = presupuesto
+        self.memoria = []
+        self.archivos = []
+        self.longitud = 0
+        self.bytes_memoria = 0
+        self.bytes_por_elemento = 0
+        presupuesto.registrar(self)
+
+    def __len__(self) -> int:
+        return self.longitud
+
+    def __bool__(self) -> bool:
+        return self.longitud > 0
+
+    def append(self, elemento: Any):
+        """Añade un elemento, volcando a disco si se supera el presupuesto."""
+        if not self.bytes_por_elemento or self.longitud % MUESTREO_TAMANO == 0:
+            muestra = estimar_tamano(elemento)
+            self.bytes_por_elemento = (self.bytes_por_elemento + muestra) // 2 if self.bytes_por_elemento else muestra
+
+        self.memoria.append(elemento)
+        self.longitud += 1
+        self.bytes_memoria += self.bytes_por_elemento
+        self.presupuesto.usado += self.bytes_por_elemento
+
+        if self.presupuesto.usado > self.presupuesto.limite_bytes:
+            self.presupuesto.comprobar()
+
+    def extend(self, elementos: Iterable[Any]):
+        """
+        Añade varios elementos. Si es otra ListaDesbordable del mismo presupuesto, sus
+        bloques ya volcados se incorporan sin releerlos.
+        """
+        if isinstance(elementos, ListaDesbordable) and elementos.presupuesto is self.presupuesto:
+            if elementos.archivos:
+                self.volcar()
+                self.archivos.extend(elementos.archivos)
+                self.longitud += elementos.longitud - len(elementos.memoria)
+                elementos.archivos = []
+            for elemento in elementos.memoria:
+                self.append(elemento)
+            elementos.vaciar_memoria()
+            return
+
+        for elemento in elementos:
+            self.append(elemento)
+
+    def vaciar_memoria(self):
+        """Descarta los elementos en memoria y los descuenta del presupuesto."""
+        self.presupuesto.usado -= self.bytes_memoria
+        self.memoria = []
+        self.bytes_memoria = 0
+
+    def volcar(self):
+        """Escribe los elementos en memoria a un archivo temporal por bloques."""
+        if not self.memoria:
+            return
+
+        ruta = self.presupuesto.ruta_temporal('lista')
+        with open(ruta, 'wb') as f:
+            for inicio in range(0, len(self.memoria), ELEMENTOS_POR_BLOQUE):
+                pickle.dump(self.memoria[inicio:inicio + ELEMENTOS_POR_BLOQUE], f, pickle.HIGHEST_PROTOCOL)
+        self.archivos.append(ruta)
+        self.vaciar_memoria()
+
+    def __iter__(self) -> Iterator[Any]:
+        for ruta in self.archivos:
+            with open(ruta, 'rb') as f:
+                while True:
+                    try:
+                        bloque = pickle.load(f)
+                    except EOFError:
+                        break
+                    yield from bloque
+        yield from self.memoria
+
+
+class OrdenacionExterna:
+    """
+    Ordenación externa por tramos. Cada tramo añadido (ej: un archivo trimestral ya
+    parseado) se ordena por separado y se guarda; al recorrerla, todos los tramos se mezclan
+    en streaming (k-way merge), de modo que nunca hace falta ordenar todo junto.
+
+    Con presupuesto, los tramos se cortan cada ELEMENTOS_POR_TRAMO elementos y se guardan
+    en listas desbordables: durante la mezcla solo hay en memoria un bloque por tramo.
+    Se puede recorrer varias veces; los elementos con la misma clave conservan el orden
+    de inserción.
+    """
+
+    def __init__(self, clave: Callable[[Any], Any], presupuesto: Optional[PresupuestoMemoria] = None):
+        """
+        Args:
+            clave: Función que da la clave de orden de un elemento
+            presupuesto: Presupuesto de memoria opcional (sin él, los tramos quedan en memoria)
+        """
+        self.clave = clave
+        self.presupuesto = presupuesto
+        self.tramos = []
+        self.longitud = 0
+
+    def __len__(self) -> int:
+        return self.longitud
+
+    def __bool__(self) -> bool:
+        return self.longitud > 0
+
+    def agregar_tramo(self, elementos: Iterable[Any]):
+        """Ordena y guarda un tramo (en varios trozos si hay presupuesto)."""
+        if self.presupuesto is None:
+            self.guardar_tramo(sorted(elementos, key=self.clave))
+            return
+
+        trozo = []
+        for elemento in elementos:
+            trozo.append(elemento)
+            if len(trozo) >= ELEMENTOS_POR_TRAMO:
+                self.guardar_tramo(sorted(trozo, key=self.clave))
+                trozo = []
+        if trozo:
+            self.guardar_tramo(sorted(trozo, key=self.clave))
+
+    def guardar_tramo(self, tramo: List[Any]):
+        if not tramo:
+            return
+        if self.presupuesto is not None:
+            lista = self.presupuesto.lista()
+            lista.extend(tramo)
+            tramo = lista
+        self.tramos.append(tramo)
+        self.longitud += len(tramo)
+
+    def __iter__(self) -> Iterator[Any]:
+        if len(self.tramos) == 1:
+            return iter(self.tramos[0])
+        return heapq.merge(*self.tramos, key=self.clave)
+
+
+class AgregadorDesbordable:
+    """
+    Suma por clave (groupby().sum()) de DataFrames que llegan por lotes.
+
+    Los parciales se combinan en memoria; si superan el presupuesto se reparten por hash
+    de la clave en PARTICIONES_AGREGADO archivos y cada partición se agrega por separado
+    al final, de modo que nunca se cargan a la vez todos los parciales volcados.
+    """
+
+    def __init__(self, clave: str, presupuesto: PresupuestoMemoria):
+        """
+        Args:
+            clave: Columna por la que se agrupa (el resto de columnas se suman)
+            presupuesto: Presupuesto de memoria compartido
+        """
+        self.clave = clave
+        self.presupuesto = presupuesto
+        self.parciales = []
+        self.particiones = None
+        self.bytes_memoria = 0
+        presupuesto.registrar(self)
+
+    def agregar(self, df: pd.DataFrame):
+        """Añade un lote (columna clave + columnas numéricas)."""
+        self.parciales.append(df.groupby(self.clave, dropna=False, sort=False).sum())
+
+        # Combinar los parciales para que la memoria dependa solo del número de claves
+        if len(self.parciales) >= 8:
+            self.parciales = [self.combinar(self.parciales)]
+
+        self.actualizar_bytes(int(sum(p.memory_usage(deep=True).sum() for p in self.parciales)))
+        self.presupuesto.comprobar()
+
+    def combinar(self, parciales: List[pd.DataFrame]) -> pd.DataFrame:
+        """Combina varios parciales indexados por la clave."""
+        return pd.concat(parciales).groupby(level=0, dropna=False, sort=False).sum()
+
+    def actualizar_bytes(self, bytes_memoria: int):
+        self.presupuesto.usado += bytes_memoria - self.bytes_memoria
+        self.bytes_memoria = bytes_memoria
+
+    def volcar(self):
+        """Reparte los parciales en memoria por partición de clave y los añade a disco."""
+        if not self.parciales:
+            return
+
+        if self.particiones is None:
+            self.particiones = [self.presupuesto.ruta_temporal(f'agregado_{i:02d}')
+                                for i in range(PARTICIONES_AGREGADO)]
+
+        parcial = self.combinar(self.parciales)
+        particion = pd.util.hash_pandas_object(parcial.index, index=False).to_numpy() % PARTICIONES_AGREGADO
+        for i, ruta in enumerate(self.particiones):
+            trozo = parcial[particion == i]
+            if not trozo.empty:
+                with open(ruta, 'ab') as f:
+                    pickle.dump(trozo, f, pickle.HIGHEST_PROTOCOL)
+
+        self.parciales = []
+        self.actualizar_bytes(0)
+
+    def resultado(self, columnas: Optional[List[str]] = None) -> pd.DataFrame:
+        """
+        Devuelve la suma por clave ordenada por clave (como groupby().sum().reset_index()).
+
+        Args:
+            columnas: Columnas numéricas esperadas, para devolver un DataFrame vacío con
+                esas columnas si no se agregó ningún lote
+        """
+        if self.particiones is None:
+            agregado = self.combinar(self.parciales) if self.parciales else None
+        else:
+            self.volcar()
+            trozos = []
+            for ruta in self.particiones:
+                if not ruta.exists():
+                    continue
+                piezas = []
+                with open(ruta, 'rb') as f:
+                    while True:
+                        try:
+                            piezas.append(pickle.load(f))
+                        except EOFError:
+                            break
+                trozos.append(self.combinar(piezas))
+                ruta.unlink()
+            agregado = pd.concat(trozos) if trozos else None
+            self.particiones = None
+
+        self.parciales = []
+        self.actualizar_bytes(0)
+
+        if agregado is None:
+            return pd.DataFrame(columns=[self.clave] + list(columnas or []))
+
+        agregado.index.name = self.clave
+        return agregado.sort_index().reset_index()
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Perfilado bajo demanda (--profile) del trabajo de cada sociedad.
+
+Por cada sociedad se guardan en la carpeta de perfiles:
+    <etapa>_<sociedad>.prof          Estadísticas de cProfile (abrir con pstats o snakeviz)
+    <etapa>_<sociedad>_memoria.txt   Pico de memoria y líneas que más memoria asignan (tracemalloc)
+
+Sin carpeta de perfiles no se importa ni activa nada, así que el coste es nulo.
+"""
+
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+from typing import Iterator, Optional
+
+
+# Líneas de código que se listan en el informe de memoria
+LINEAS_INFORME_MEMORIA = 25
+
+
+def perfilar(etapa: str, nombre: str, carpeta: Optional[Path]):
+    """
+    Contexto que perfila el bloque si hay carpeta de perfiles; si no, no hace nada.
+
+    Args:
+        etapa: Etapa del pipeline (ej: 'process', 'totalidad'), prefijo de los archivos
+        nombre: Nombre de la sociedad (normalizado para usarlo en rutas)
+        carpeta: Carpeta de salida de los perfiles, o None para desactivar
+    """
+    if carpeta is None:
+        return nullcontext()
+    return _perfilar(Path(carpeta) / f"{etapa}_{nombre}")
+
+
+@contextmanager
+def _perfilar(base: Path) -> Iterator[None]:
+    import cProfile
+    import tracemalloc
+
+    base.parent.mkdir(parents=True, exist_ok=True)
+    perfil = cProfile.Profile()
+    tracemalloc.start()
+    perfil.enable()
+
+    try:
+        yield
+    finally:
+        perfil.disable()
+        instantanea = tracemalloc.take_snapshot()
+        actual, pico = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        perfil.dump_stats(str(base) + '.prof')
+
+        # Los archivos de tracemalloc no interesan en el informe
+        instantanea = instantanea.filter_traces([tracemalloc.Filter(False, tracemalloc.__file__)])
+        lineas = [
+            f"Pico de memoria: {pico / 1024 / 1024:.1f} MB",
+            f"Memoria asignada al terminar: {actual / 1024 / 1024:.1f} MB",
+            '',
+            f"Top {LINEAS_INFORME_MEMORIA} líneas por memoria asignada al terminar:",
+        ]
+        for posicion, estadistica in enumerate(instantanea.statistics('lineno')[:LINEAS_INFORME_MEMORIA], 1):
+            marco = estadistica.traceback[0]
+            lineas.append(f"{posicion:>3}. {marco.filename}:{marco.lineno} "
+                          f"{estadistica.size / 1024:.1f} KB en {estadistica.count} bloques")
+
+        ruta_memoria = base.with_name(base.name + '_memoria.txt')
+        ruta_memoria.write_text('\n'.join(lineas) + '\n', encoding='utf-8')
+        print(f"🔬 Perfil guardado: {base}.prof ({pico / 1024 / 1024:.1f} MB de pico)")
@@ -7,33 +7,245 @@ Convierte archivos de formato "informe" a formato tabular CSV.
 import json
 import csv
 import re
+import hashlib
+from array import array
+from bisect import bisect_left
+from contextlib import contextmanager
+from itertools import islice
 from pathlib import Path
-from typing import Dict, List, Tuple, Any
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 from datetime import datetime
+import io
+import random
+import numpy as np
 import pandas as pd
+from openpyxl import Workbook
+from openpyxl.styles import Font
 import tempfile
 import os
+import sys
+
+from almacenamiento import (GuardadoSegundoPlano, abrir_texto_anexado_atomico, abrir_texto_escritura_atomica,
+                            buscar_csv, eliminar_csv, eliminar_otras_compresiones, guardar_json_atomico, ruta_con_compresion,
+                            ruta_temporal_atomica, validar_compresion)
+from mapeo_columnas import CacheMapeoColumnas, detectar_columnas_ld, detectar_columnas_sys, leer_cabecera_csv
+from indice_periodos import anexar_indice, cargar_indice, construir_indice, guardar_indice, parsear_fecha
+from memoria import OrdenacionExterna, PresupuestoMemoria
+from perfilado import perfilar
+from progreso import INTERVALO_PROGRESO, Progreso, abrir_lectura, recorrer_lineas
+
+
+# Filas por lote al leer CSV grandes en streaming
+TAMANO_LOTE_CSV = 500_000
+
+# Prefijos de cuenta (PGC) de operaciones con empresas del grupo que se eliminan en la consolidación:
+# 403 Proveedores y 433 Clientes empresas del grupo, 5523 Cuenta corriente con empresas del grupo
+PREFIJOS_ELIMINACION_GRUPO = ['403', '433', '5523']
+
+# Columnas de cabecera candidatas a fecha contable del asiento, por orden de preferencia
+COLUMNAS_FECHA_CONTABLE = ['Fe.contab.', 'Fecha contab.', 'Registrado', 'Fecha doc.']
+
+# Columnas de detalle candidatas a número de línea (posición) dentro del asiento
+COLUMNAS_LINEA_ASIENTO = ['Pos', 'Pos.', 'Posición', 'Línea', 'Apunte']
+
+# Columnas de cabecera o detalle candidatas a ejercicio
+COLUMNAS_EJERCICIO = ['Ejerc.', 'Ejercicio', 'Año']
+
+# Columnas de cabecera o detalle candidatas a ledger (libros paralelos de S/4HANA)
+COLUMNAS_LEDGER = ['Ledger', 'Ledger ppal.']
+
+# Dígito en un valor de sumas y saldos (la ruta rápida descarta antes los dígitos no ASCII)
+PATRON_DIGITO = re.compile('[0-9]')
+
+# Valores distintos a partir de los cuales una columna deja de internarse (importes, textos
+# libres): por debajo, todas sus líneas comparten el mismo str por valor
+MAX_VALORES_INTERNADOS = 4096
+
+# Bytes del inicio de un archivo original con los que se decide su codificación
+BYTES_DETECCION_CODIFICACION = 4096
+
+# Máximo de caracteres por registro de ejemplo en la previsualización
+ANCHO_REGISTRO_PREVIEW = 240
+
+# Columnas de resumen_asientos_<anio>.csv y asientos_descuadrados_<anio>.csv
+COLUMNAS_RESUMEN_ASIENTOS = ['GT_ASIENTO', 'Soc.', 'GT_DEBE', 'GT_HABER', 'GT_IMPORTE_MONEDA_LOCAL', 'GT_LINEAS']
+
+
+def codificacion_de_bytes(cabeza: bytes) -> str:
+    """Codificación de un archivo original según sus primeros bytes: 'utf-16-le' o 'utf-8'."""
+    # Los .XLS de SAP son UTF-16 LE: en texto latino la mitad de los bytes son nulos
+    es_utf16 = cabeza.startswith(b'\xff\xfe') or cabeza.count(b'\x00') > len(cabeza) // 4
+    return 'utf-16-le' if es_utf16 else 'utf-8'
+
+
+def clave_natural(valor: str) -> Tuple[int, int, str]:
+    """Clave de orden de un texto: los números enteros van primero y por valor, el resto por texto."""
+    if valor.isascii() and valor.isdigit():
+        return 0, int(valor), ''
+    return 1, 0, valor
+
+
+class ConjuntoHuellas:
+    """
+    Conjunto compacto de claves ya vistas para deduplicar líneas entre archivos.
+
+    Cada clave se reduce a una huella de 8 bytes (blake2b). Una línea solo se compara con
+    las de los archivos anteriores, no con las del mismo archivo: dos líneas con la misma
+    clave dentro de un archivo son legítimas. Las huellas del archivo en curso se acumulan
+    aparte y se mezclan con las anteriores al terminarlo (terminar_archivo), en un array
+    ordenado de enteros de 64 bits (8 bytes por línea) donde se busca por bisección.
+    El conjunto se guarda junto al libro diario (huellas_diario_<anio>.bin) para poder
+    deduplicar después los archivos que se le anexen.
+    """
+
+    def __init__(self):
+        self.ordenadas = array('Q')
+        self.archivo_actual = array('Q')
+
+    def huella(self, clave: str) -> int:
+        """Huella de 64 bits de una clave."""
+        return int.from_bytes(hashlib.blake2b(clave.encode('utf-8'), digest_size=8).digest(), 'little')
+
+    def __len__(self) -> int:
+        return len(self.ordenadas) + len(self.archivo_actual)
+
+    def contiene(self, huella: int) -> bool:
+        """Indica si la huella está en alguno de los archivos anteriores."""
+        posicion = bisect_left(self.ordenadas, huella)
+        return posicion < len(self.ordenadas) and self.ordenadas[posicion] == huella
+
+    def agregar_si_nueva(self, clave: str) -> bool:
+        """
+        Registra la clave en el archivo en curso si no estaba en uno anterior.
+
+        Returns:
+            True si la clave es nueva, False si es un duplicado
+        """
+        huella = self.huella(clave)
+        if self.contiene(huella):
+            return False
+
+        self.archivo_actual.append(huella)
+        return True
+
+    def terminar_archivo(self):
+        """Mezcla las huellas del archivo en curso con las anteriores (sin pasar por int de Python)."""
+        if self.archivo_actual:
+            todas = np.concatenate([np.frombuffer(self.ordenadas, dtype=np.uint64),
+                                    np.frombuffer(self.archivo_actual, dtype=np.uint64)])
+            self.ordenadas = array('Q', np.unique(todas).tobytes())
+            self.archivo_actual = array('Q')
+
+    def guardar(self, ruta: Path):
+        """Guarda las huellas (array ordenado de 64 bits) de forma atómica."""
+        self.terminar_archivo()
+        with ruta_temporal_atomica(ruta) as ruta_temporal:
+            with open(ruta_temporal, 'wb') as f:
+                self.ordenadas.tofile(f)
+
+    @classmethod
+    def cargar(cls, ruta: Path) -> 'ConjuntoHuellas':
+        """Carga un conjunto guardado con guardar."""
+        conjunto = cls()
+        with open(ruta, 'rb') as f:
+            conjunto.ordenadas.frombytes(f.read())
+        return conjunto
 
 
 class ProcesadorDatos:
     """Clase para procesar archivos de libro diario y sumas y saldos."""
 
-    def __init__(self, ruta_estructura_json: str, ruta_datos_originales: str, ruta_datos_tratados: str):
+    def __init__(self, ruta_estructura_json: str, ruta_datos_originales: str, ruta_datos_tratados: str,
+                 formato_normalizado: bool = False, compresion: str = None, nivel_compresion: int = None,
+                 reanudar: bool = False, prefijos_eliminacion: List[str] = None,
+                 deduplicar: bool = True, memoria_max_mb: int = None, carpeta_temporal: str = None,
+                 carpeta_perfiles: str = None, receptor=None, escribir_csv: bool = True,
+                 ordenar_diario: bool = False, intervalo_progreso: Optional[float] = INTERVALO_PROGRESO):
         """
         Inicializa el procesador.
 
         Args:
-            ruta_estructura_json: Ruta al archivo JSON con la estructura
+            ruta_estructura_json: Ruta al archivo JSON con la estructura (None para usar
+                solo previsualizar_archivo)
             ruta_datos_originales: Ruta a la carpeta con datos originales
             ruta_datos_tratados: Ruta donde se guardarán los datos procesados
+            formato_normalizado: Si es True, los libros diarios se guardan como una tabla
+                de asientos (una fila por cabecera) y otra de líneas con ID_ASIENTO
+                en lugar de repetir la cabecera en cada línea
+            compresion: Códec para los CSV de salida (None, 'gzip' o 'zstd')
+            nivel_compresion: Nivel del códec (None = nivel por defecto)
+            reanudar: Si es True, se omiten las sociedades y archivos ya completados
+                en una ejecución anterior (según el checkpoint) cuyas fuentes no cambiaron.
+                Además se guardan las huellas de cada libro diario (huellas_diario_<anio>.bin)
+                para poder anexarle después archivos nuevos
+            prefijos_eliminacion: Prefijos de cuenta a eliminar en la consolidación de grupo
+                (por defecto PREFIJOS_ELIMINACION_GRUPO)
+            deduplicar: Si es True, al consolidar varios libros diarios se omiten las
+                líneas repetidas por clave (Soc., Nº doc., ejercicio, línea)
+            memoria_max_mb: Memoria máxima (MB) para los registros acumulados de un grupo.
+                Si se supera, los registros se vuelcan a archivos temporales y se releen
+                al guardar (más lento, mismo resultado). None = sin límite
+            carpeta_temporal: Carpeta en disco local para los volcados (por defecto la del sistema)
+            carpeta_perfiles: Si se indica, el trabajo de cada sociedad se perfila con cProfile
+                y tracemalloc y los resultados se guardan en esa carpeta
+            receptor: ReceptorTotalidad opcional (modo pipeline). Recibe cada grupo ya
+                parseado y genera la totalidad de cada sociedad al terminarla, sin releer
+                los CSV; los agregados por cuenta también se calculan en memoria.
+                No es compatible con reanudar
+            escribir_csv: Si es False (solo con receptor), no se escriben los CSV de libro
+                diario, sumas y saldos ni resumen por asiento, ni el checkpoint
+            ordenar_diario: Si es True, el libro diario de cada año se guarda ordenado por
+                asiento (fecha contable, Nº doc., ver clave_orden_ld): cada archivo parseado
+                es un tramo ordenado y los tramos se mezclan en streaming al guardar (ver
+                OrdenacionExterna)
+            intervalo_progreso: Segundos entre informes de progreso (MB, líneas/s, ETA) al
+                leer y parsear cada archivo original. None o 0 = sin informes
         """
-        self.ruta_estructura_json = Path(ruta_estructura_json)
+        if receptor is None and not escribir_csv:
+            raise ValueError("Sin receptor de totalidad hay que escribir los CSV")
+        if receptor is not None and reanudar:
+            raise ValueError("El modo pipeline no admite reanudar: necesita todos los grupos en memoria")
+
+        self.ruta_estructura_json = Path(ruta_estructura_json) if ruta_estructura_json else None
         self.ruta_datos_originales = Path(ruta_datos_originales)
         self.ruta_datos_tratados = Path(ruta_datos_tratados)
-
-        # Cargar estructura
-        with open(self.ruta_estructura_json, 'r', encoding='utf-8') as f:
-            self.estructura = json.load(f)
+        self.formato_normalizado = formato_normalizado
+        validar_compresion(compresion)
+        self.compresion = compresion
+        self.nivel_compresion = nivel_compresion
+        self.reanudar = reanudar
+        self.deduplicar = deduplicar
+        self.prefijos_eliminacion = (PREFIJOS_ELIMINACION_GRUPO if prefijos_eliminacion is None
+                                     else list(prefijos_eliminacion))
+        self.presupuesto = PresupuestoMemoria(memoria_max_mb, carpeta_temporal) if memoria_max_mb else None
+        self.carpeta_perfiles = Path(carpeta_perfiles) if carpeta_perfiles else None
+        self.receptor = receptor
+        self.escribir_csv = escribir_csv
+        self.ordenar_diario = ordenar_diario
+        self.intervalo_progreso = intervalo_progreso
+
+        # Agregados por cuenta de cada sociedad calculados en memoria (modo pipeline)
+        self.agregados_memoria = {}
+
+        # Cargar estructura (sin estructura solo se pueden previsualizar archivos sueltos)
+        self.estructura = {'sociedades': []}
+        if self.ruta_estructura_json is not None:
+            with open(self.ruta_estructura_json, 'r', encoding='utf-8') as f:
+                self.estructura = json.load(f)
+
+        # Caché de mapeos de columnas compartida con generar_totalidad.py
+        self.cache_columnas = CacheMapeoColumnas(self.ruta_datos_tratados / '_mapeo_columnas.json')
+
+        # Checkpoint de unidades (archivos de salida) y sociedades completadas
+        self.ruta_checkpoint = self.ruta_datos_tratados / '_checkpoint_procesamiento.json'
+        self.checkpoint = {'unidades': {}, 'sociedades': {}}
+        if self.reanudar and self.ruta_checkpoint.exists():
+            with open(self.ruta_checkpoint, 'r', encoding='utf-8') as f:
+                self.checkpoint = json.load(f)
+
+    def nueva_lista(self):
+        """Lista para acumular registros: desbordable a disco si hay presupuesto de memoria."""
+        return self.presupuesto.lista() if self.presupuesto else []
 
     def normalizar_nombre_sociedad(self, nombre_sociedad: str) -> str:
         """Normaliza el nombre de la sociedad para uso en rutas."""
@@ -74,26 +286,42 @@ class ProcesadorDatos:
             print(f"⚠️  Error convirtiendo {ruta_archivo.name} a texto: {e}")
             return []
 
-    def leer_archivo_utf16(self, ruta_archivo: Path) -> List[str]:
-        """Lee un archivo UTF-16 LE y retorna lista de líneas. Soporta .xlsx y .xlsm."""
-        extension = ruta_archivo.suffix.lower()
+    @contextmanager
+    def abrir_lineas(self, ruta_archivo: Path) -> Iterator[Iterator[str]]:
+        """
+        Líneas de un archivo original en streaming, sin cargarlo completo: la memoria no
+        depende del tamaño del archivo sino de los registros acumulados (que se pueden
+        volcar a disco con memoria_max_mb). La codificación (UTF-16 LE de SAP o UTF-8) se
+        decide por el inicio del archivo. Los .xlsx y .xlsm se convierten completos.
+        El progreso de lectura informa a la vez del parseo, que avanza con ella.
+        """
+        if ruta_archivo.suffix.lower() in ['.xlsx', '.xlsm']:
+            yield iter(self.convertir_xlsx_a_texto(ruta_archivo))
+            return
 
-        # Si es un archivo Excel moderno (.xlsx, .xlsm), usar pandas
-        if extension in ['.xlsx', '.xlsm']:
-            return self.convertir_xlsx_a_texto(ruta_archivo)
+        with open(ruta_archivo, 'rb') as f:
+            codificacion = codificacion_de_bytes(f.read(BYTES_DETECCION_CODIFICACION))
+        with abrir_lectura(ruta_archivo, 'parseo', self.intervalo_progreso, codificacion) as f:
+            yield f
 
-        # Para archivos .XLS (formato antiguo de Excel exportado a texto)
-        try:
-            with open(ruta_archivo, 'r', encoding='utf-16-le') as f:
-                return f.readlines()
-        except UnicodeDecodeError:
-            # Intentar con UTF-8
-            try:
-                with open(ruta_archivo, 'r', encoding='utf-8') as f:
-                    return f.readlines()
-            except Exception as e:
-                print(f"⚠️  Error leyendo {ruta_archivo.name}: {e}")
-                return []
+    def buscar_inicio_datos(self, lineas: Iterator[str], detectar: Callable, ventana: int) -> Tuple:
+        """
+        Lee líneas hasta que detectar (detectar_inicio_datos_ld o _sys) encuentra la cabecera
+        en las últimas 'ventana' líneas, y deja 'lineas' en la primera línea de datos.
+
+        Returns:
+            Lo que devuelve detectar, con el inicio 0 si no hay cabecera
+        """
+        ultimas = []
+        for linea in lineas:
+            ultimas = (ultimas + [linea])[-ventana:]
+            resultado = detectar(ultimas)
+            if resultado[0]:
+                # El inicio cuenta desde la primera línea de la ventana: saltar las que faltan
+                for _ in islice(lineas, resultado[0] - len(ultimas)):
+                    pass
+                return resultado
+        return detectar([])
 
     def parsear_linea_tabs(self, texto: str) -> List[str]:
         """
@@ -149,15 +377,127 @@ class ProcesadorDatos:
         """
         Procesa un archivo de sumas y saldos y retorna lista de registros.
         """
-        lineas = self.leer_archivo_utf16(ruta_archivo)
-        inicio, columnas = self.detectar_inicio_datos_sys(lineas)
+        if ruta_archivo.suffix.lower() not in ['.xlsx', '.xlsm']:
+            registros = self.procesar_sys_rapido(ruta_archivo)
+            if registros is not None:
+                return registros
+
+        with self.abrir_lineas(ruta_archivo) as lineas:
+            inicio, columnas = self.buscar_inicio_datos(lineas, self.detectar_inicio_datos_sys, 1)
+
+            if inicio == 0:
+                print(f"⚠️  No se pudo detectar inicio de datos en {ruta_archivo.name}")
+                return []
+
+            return self.parsear_sys(lineas, 0, columnas)
 
+    def procesar_sys_rapido(self, ruta_archivo: Path) -> Optional[List[Dict[str, Any]]]:
+        """
+        Versión vectorizada de procesar_sys para los .XLS de SAP (texto UTF-16 LE).
+
+        Tras localizar la cabecera 'Soc.' se descartan las líneas vacías, de '=' y de
+        'Página', y el resto se lee con el lector C de read_csv como texto. La limpieza
+        de importes (sin separador de miles y con punto decimal, manteniendo el texto) es
+        la de parsear_sys aplicada una vez por valor distinto de cada columna, así que los
+        registros son idénticos.
+
+        Returns:
+            Lista de registros, o None si el archivo debe leerse línea a línea (no es
+            UTF-16, no tiene cabecera, contiene dígitos no ASCII o caracteres nulos, o
+            read_csv no lo admite)
+        """
+        try:
+            with abrir_lectura(ruta_archivo, intervalo=self.intervalo_progreso, encoding='utf-16-le') as f:
+                texto = f.read()
+        except UnicodeDecodeError:
+            return None
+
+        # PATRON_DIGITO solo reconoce los dígitos 0-9 (isdigit() acepta más), y el lector C
+        # de read_csv corta los campos en un carácter nulo
+        if '\x00' in texto or any(c.isdigit() for c in set(re.findall(r'[^\x00-\x7f]', texto))):
+            return None
+
+        lineas = texto.split('\n')
+        inicio, columnas = self.detectar_inicio_datos_sys(lineas)
         if inicio == 0:
-            print(f"⚠️  No se pudo detectar inicio de datos en {ruta_archivo.name}")
+            return None
+
+        # Posiciones de cada columna con nombre (con nombres repetidos gana la última presente)
+        posiciones = {}
+        for i, nombre in enumerate(columnas):
+            if nombre:
+                posiciones.setdefault(nombre, []).append(i)
+        if 'Soc.' not in posiciones or 'Cta.mayor' not in posiciones:
+            return []
+
+        # Descartar líneas vacías, separadores y saltos de página
+        datos = [linea for linea in islice(lineas, inicio, None)
+                 if linea.strip() and '=' not in linea and 'Página' not in linea]
+        if not datos:
             return []
 
+        # Campos de cada línea: las claves de las columnas a las que no llega no se crean
+        num_campos = np.array([linea.count('\t') + 1 for linea in datos])
+        try:
+            tabla = pd.read_csv(
+                io.StringIO('\n'.join(datos)), sep='\t', header=None, names=range(len(columnas)),
+                usecols=range(len(columnas)), dtype=object, keep_default_na=False, na_filter=False,
+                quoting=csv.QUOTE_NONE, skip_blank_lines=False, lineterminator='\n', engine='c'
+            )
+        except pd.errors.ParserError:
+            return None
+
+        # Cada valor distinto de cada columna se limpia una sola vez (ceros, sociedad,
+        # moneda e importes repetidos) y se reparte con los códigos de factorize
+        valores = {}
+        for nombre, indices in posiciones.items():
+            columna = tabla[indices[0]].to_numpy()
+            for i in indices[1:]:
+                columna = np.where(num_campos > i, tabla[i].to_numpy(), columna)
+
+            codigos, distintos = pd.factorize(columna)
+            limpios = np.array([self.limpiar_valor_sys(valor.strip()) for valor in distintos], dtype=object)
+            valores[nombre] = limpios[codigos]
+
+        # Solo registros con sociedad y cuenta (presentes en la línea y no vacías)
+        presentes = {nombre: num_campos > indices[0] for nombre, indices in posiciones.items()}
+        validos = ((valores['Soc.'] != '') & presentes['Soc.']
+                   & (valores['Cta.mayor'] != '') & presentes['Cta.mayor'])
+
+        nombres = list(valores)
+        filas = zip(*(valores[nombre][validos].tolist() for nombre in nombres))
+        registros = [dict(zip(nombres, fila)) for fila in filas]
+
+        # Las líneas cortas no tienen las claves de las columnas que les faltan
+        cortas = [nombre for nombre in nombres if not presentes[nombre][validos].all()]
+        if cortas:
+            for registro, campos in zip(registros, num_campos[validos]):
+                for nombre in cortas:
+                    if campos <= posiciones[nombre][0]:
+                        del registro[nombre]
+
+        return registros
+
+    def limpiar_valor_sys(self, valor: str) -> str:
+        """Quita el separador de miles y cambia la coma decimal a punto si hay dígitos."""
+        if PATRON_DIGITO.search(valor):
+            return valor.replace('.', '').replace(',', '.')
+        return valor
+
+    def parsear_sys(self, lineas: Iterable[str], inicio: int, columnas: List[str],
+                    progreso: Progreso = None) -> List[Dict[str, Any]]:
+        """
+        Convierte en registros las líneas de datos de sumas y saldos a partir de 'inicio'.
+
+        Args:
+            lineas: Líneas del archivo en streaming (o de un fragmento, ver previsualizar_archivo)
+            inicio: Índice de la primera línea de datos
+            columnas: Nombres de columnas detectados en la cabecera
+            progreso: Progreso opcional del parseo (abrir_lineas ya lo informa al leer)
+        """
         registros = []
-        for linea in lineas[inicio:]:
+        tablas = self.nuevas_tablas_valores(columnas)
+        for linea in recorrer_lineas(lineas, inicio, progreso):
             # Solo eliminar salto de línea, NO los tabs
             linea = linea.rstrip('\n\r')
             if not linea.strip() or '=' in linea or 'Página' in linea:
@@ -173,9 +513,18 @@ class ProcesadorDatos:
             for i in range(len(valores)):
                 if i < len(columnas) and columnas[i]:  # Solo si la columna tiene nombre
                     valor = valores[i] if i < len(valores) else ''
+                    tabla = tablas[i]
+                    if tabla is not None and valor in tabla:
+                        registro[columnas[i]] = tabla[valor]
+                        continue
+                    original = valor
                     # Limpiar valores numéricos (quitar separador de miles, cambiar coma a punto)
                     if valor and any(c.isdigit() for c in valor):
                         valor = valor.replace('.', '').replace(',', '.')
+                    if tabla is not None:
+                        tabla[original] = valor
+                        if len(tabla) > MAX_VALORES_INTERNADOS:
+                            tablas[i] = None
                     registro[columnas[i]] = valor
 
             # Solo agregar si tiene sociedad y cuenta
@@ -184,23 +533,114 @@ class ProcesadorDatos:
 
         return registros
 
-    def procesar_ld(self, ruta_archivo: Path) -> List[Dict[str, Any]]:
+    def nuevas_tablas_valores(self, claves: List[Optional[str]]) -> List[Optional[Dict[str, str]]]:
+        """
+        Tablas de internado de textos de las columnas de un archivo.
+
+        Columnas como Soc., Mon., Cl., Usuario o Cuenta se repiten en millones de líneas con
+        pocos valores distintos. Cada tabla guarda un valor leído -> su valor limpio, y todas
+        las líneas comparten ese mismo str en lugar de una copia por línea (cada línea solo
+        guarda una referencia) y no se vuelve a limpiar. Así además pandas factoriza y agrupa
+        más rápido, porque el hash de cada str se calcula una sola vez.
+        Una columna deja de internarse (su tabla pasa a None) en cuanto supera
+        MAX_VALORES_INTERNADOS valores distintos. Las columnas sin nombre no tienen tabla.
+        """
+        return [{} if clave else None for clave in claves]
+
+    def convertir_importe(self, valor: str) -> float:
+        """Convierte un importe ya limpiado (punto decimal) a float, 0.0 si no es válido."""
+        try:
+            return float(valor) if valor else 0.0
+        except ValueError:
+            return 0.0
+
+    def cerrar_asiento(self, resumen_asientos: List[Dict[str, Any]], asiento: Dict[str, Any]):
+        """Añade el resumen de un asiento terminado si tiene al menos una línea."""
+        if asiento and asiento['GT_LINEAS']:
+            asiento['GT_DEBE'] = round(asiento['GT_DEBE'], 2)
+            asiento['GT_HABER'] = round(asiento['GT_HABER'], 2)
+            asiento['GT_IMPORTE_MONEDA_LOCAL'] = round(asiento['GT_DEBE'] - asiento['GT_HABER'], 2)
+            resumen_asientos.append(asiento)
+
+    def procesar_ld(self, ruta_archivo: Path,
+                    resumen_asientos: List[Dict[str, Any]] = None,
+                    vistos: ConjuntoHuellas = None) -> List[Dict[str, Any]]:
         """
         Procesa un archivo de libro diario y retorna lista de registros.
         Convierte formato jerárquico a formato tabular plano.
+        Cada registro incluye GT_FECHA (fecha contable ISO) y GT_PERIODO (AAAA-MM)
+        tomados de la primera columna de COLUMNAS_FECHA_CONTABLE con una fecha válida.
+
+        Args:
+            ruta_archivo: Ruta al archivo de libro diario
+            resumen_asientos: Lista opcional donde se añade, por cada asiento, la suma
+                de debe y haber acumulada durante la lectura (GT_ASIENTO, GT_DEBE,
+                GT_HABER, GT_IMPORTE_MONEDA_LOCAL, GT_LINEAS)
+            vistos: Conjunto opcional de líneas ya leídas de otros archivos. Las líneas cuya
+                clave (Soc., Nº doc., ejercicio, línea) ya esté en el conjunto se omiten.
         """
-        lineas = self.leer_archivo_utf16(ruta_archivo)
-        inicio, cols_cabecera, cols_detalle = self.detectar_inicio_datos_ld(lineas)
+        with self.abrir_lineas(ruta_archivo) as lineas:
+            inicio, cols_cabecera, cols_detalle = self.buscar_inicio_datos(lineas, self.detectar_inicio_datos_ld, 2)
 
-        if inicio == 0:
-            print(f"⚠️  No se pudo detectar inicio de datos en {ruta_archivo.name}")
-            return []
+            if inicio == 0:
+                print(f"⚠️  No se pudo detectar inicio de datos en {ruta_archivo.name}")
+                return []
 
-        registros = []
+            return self.parsear_ld(lineas, 0, cols_cabecera, cols_detalle, ruta_archivo.name,
+                                   resumen_asientos, vistos)
+
+    def parsear_ld(self, lineas: Iterable[str], inicio: int, cols_cabecera: List[str], cols_detalle: List[str],
+                   nombre_archivo: str, resumen_asientos: List[Dict[str, Any]] = None,
+                   vistos: ConjuntoHuellas = None, progreso: Progreso = None) -> List[Dict[str, Any]]:
+        """
+        Convierte en registros las líneas de datos de un libro diario a partir de 'inicio'.
+        La línea 'inicio' debe ser la cabecera de un asiento.
+
+        Args:
+            lineas: Líneas del archivo en streaming (o de un fragmento, ver previsualizar_archivo)
+            inicio: Índice de la primera línea de datos
+            cols_cabecera: Columnas de cabecera de asiento detectadas
+            cols_detalle: Columnas de línea de detalle detectadas
+            nombre_archivo: Nombre del archivo para los avisos
+            resumen_asientos, vistos: Como en procesar_ld
+            progreso: Progreso opcional del parseo (abrir_lineas ya lo informa al leer)
+        """
+        # Columnas de importe (mismo criterio que la totalidad) y de número de documento
+        mapeo_importes = detectar_columnas_ld(cols_detalle)
+        col_debe, col_haber = mapeo_importes['debe'], mapeo_importes['haber']
+        claves_fecha = [f'cab_{col}' for col in COLUMNAS_FECHA_CONTABLE if col in cols_cabecera]
+        if 'Nº doc.' in cols_cabecera:
+            clave_asiento = 'cab_Nº doc.'
+        elif 'Nº doc.' in cols_detalle:
+            clave_asiento = 'det_Nº doc.'
+        else:
+            clave_asiento = None
+
+        # Clave de deduplicación: sin número de documento no es posible deduplicar
+        if vistos is not None and clave_asiento is None:
+            print(f"⚠️  {nombre_archivo} no tiene 'Nº doc.', no se deduplica")
+            vistos = None
+        clave_soc = 'cab_Soc.' if 'Soc.' in cols_cabecera else 'det_Soc.'
+        clave_ejercicio = next((f'cab_{c}' for c in COLUMNAS_EJERCICIO if c in cols_cabecera),
+                               next((f'det_{c}' for c in COLUMNAS_EJERCICIO if c in cols_detalle), None))
+        clave_linea = next((f'det_{c}' for c in COLUMNAS_LINEA_ASIENTO if c in cols_detalle), None)
+        duplicadas = 0
+        linea_en_asiento = 0
+
+        # Claves de cada columna creadas una sola vez y compartidas por todos los registros
+        claves_cabecera = [f'cab_{col}' if col else None for col in cols_cabecera]
+        claves_detalle = [f'det_{col}' if col else None for col in cols_detalle]
+
+        # Internado de los textos de las columnas repetitivas (ver nuevas_tablas_valores)
+        tablas_cabecera = self.nuevas_tablas_valores(claves_cabecera)
+        tablas_detalle = self.nuevas_tablas_valores(claves_detalle)
+
+        registros = self.nueva_lista()
         asiento_actual = {}
+        resumen_actual = {}
         es_cabecera = True  # La primera línea de datos es siempre cabecera
 
-        for linea in lineas[inicio:]:
+        for linea in recorrer_lineas(lineas, inicio, progreso):
             # Solo eliminar saltos de línea
             linea = linea.rstrip('\n\r')
 
@@ -220,9 +660,31 @@ class ProcesadorDatos:
                 # Crear diccionario de asiento
                 asiento_actual = {}
                 for i in range(len(valores)):
-                    if i < len(cols_cabecera) and cols_cabecera[i]:
+                    if i < len(claves_cabecera) and claves_cabecera[i]:
                         valor = valores[i]
-                        asiento_actual[f'cab_{cols_cabecera[i]}'] = valor
+                        tabla = tablas_cabecera[i]
+                        if tabla is not None:
+                            valor = tabla.setdefault(valor, valor)
+                            if len(tabla) > MAX_VALORES_INTERNADOS:
+                                tablas_cabecera[i] = None
+                        asiento_actual[claves_cabecera[i]] = valor
+
+                # Fecha contable y período del asiento
+                fecha = next((f for f in (parsear_fecha(asiento_actual.get(clave, ''))
+                                          for clave in claves_fecha) if f), None)
+                asiento_actual['GT_FECHA'] = fecha or ''
+                asiento_actual['GT_PERIODO'] = fecha[:7] if fecha else ''
+                linea_en_asiento = 0
+
+                if resumen_asientos is not None:
+                    self.cerrar_asiento(resumen_asientos, resumen_actual)
+                    resumen_actual = {
+                        'GT_ASIENTO': asiento_actual.get(clave_asiento, '') if clave_asiento else 'Sin_Asiento',
+                        'Soc.': asiento_actual.get('cab_Soc.', ''),
+                        'GT_DEBE': 0.0,
+                        'GT_HABER': 0.0,
+                        'GT_LINEAS': 0
+                    }
 
                 es_cabecera = False  # Las siguientes son detalles
             else:
@@ -233,27 +695,204 @@ class ProcesadorDatos:
                 registro = asiento_actual.copy()
 
                 for i in range(len(valores)):
-                    if i < len(cols_detalle) and cols_detalle[i]:
+                    if i < len(claves_detalle) and claves_detalle[i]:
                         valor = valores[i]
+                        tabla = tablas_detalle[i]
+                        if tabla is not None and valor in tabla:
+                            # Valor ya visto: se reutiliza su versión limpia
+                            registro[claves_detalle[i]] = tabla[valor]
+                            continue
+                        original = valor
                         # Limpiar valores numéricos
                         if valor and any(c.isdigit() for c in valor):
                             valor = valor.replace('.', '').replace(',', '.')
-                        registro[f'det_{cols_detalle[i]}'] = valor
+                        if tabla is not None:
+                            tabla[original] = valor
+                            if len(tabla) > MAX_VALORES_INTERNADOS:
+                                tablas_detalle[i] = None
+                        registro[claves_detalle[i]] = valor
 
                 if registro.get('det_Cuenta'):  # Solo agregar si tiene cuenta
+                    linea_en_asiento += 1
+
+                    if vistos is not None:
+                        # Sin columna de ejercicio o de posición se usan el año contable y el orden
+                        ejercicio = registro.get(clave_ejercicio) if clave_ejercicio else registro['GT_FECHA'][:4]
+                        posicion = registro.get(clave_linea) if clave_linea else str(linea_en_asiento)
+                        clave = '\x1f'.join((registro.get(clave_soc, ''), registro.get(clave_asiento, ''),
+                                              ejercicio or '', posicion or ''))
+                        if not vistos.agregar_si_nueva(clave):
+                            duplicadas += 1
+                            continue
+
                     registros.append(registro)
 
+                    if resumen_asientos is not None:
+                        if clave_asiento == 'det_Nº doc.' and not resumen_actual['GT_ASIENTO']:
+                            resumen_actual['GT_ASIENTO'] = registro.get(clave_asiento, '')
+                        # Sin sociedad en la cabecera, la de la primera línea de detalle
+                        if not resumen_actual['Soc.']:
+                            resumen_actual['Soc.'] = registro.get('det_Soc.', '')
+                        if col_debe:
+                            resumen_actual['GT_DEBE'] += self.convertir_importe(registro.get(f'det_{col_debe}', ''))
+                        if col_haber:
+                            resumen_actual['GT_HABER'] += self.convertir_importe(registro.get(f'det_{col_haber}', ''))
+                        resumen_actual['GT_LINEAS'] += 1
+
+        if resumen_asientos is not None:
+            self.cerrar_asiento(resumen_asientos, resumen_actual)
+
+        if duplicadas:
+            print(f"   ♻️  {duplicadas} líneas ya incluidas desde otro archivo, omitidas")
+
         return registros
 
-    def consolidar_archivos(self, archivos: List[Path], tipo: str) -> List[Dict[str, Any]]:
+    def leer_lineas_fragmento(self, datos: bytes, codificacion: str) -> List[str]:
+        """Decodifica un fragmento de bytes y lo separa en líneas como readlines()."""
+        if codificacion == 'utf-16-le':
+            datos = datos[:len(datos) - len(datos) % 2]
+        return io.StringIO(datos.decode(codificacion, errors='ignore'), newline=None).readlines()
+
+    def previsualizar_archivo(self, ruta_archivo: Path, kb_inicio: int = 256, muestras: int = 4,
+                              kb_muestra: int = 64, registros_por_muestra: int = 3,
+                              semilla: int = 0) -> Dict[str, Any]:
+        """
+        Comprueba en menos de un segundo si el parser entiende un archivo, sin leerlo entero.
+
+        Se leen los primeros kb_inicio KB (cabeceras y primeros asientos) y 'muestras'
+        fragmentos de kb_muestra KB en posiciones aleatorias (reproducibles con 'semilla').
+        Cada fragmento se resincroniza en el siguiente límite de asiento (línea vacía) y se
+        descarta el último asiento, que puede estar cortado. Sobre las muestras se ejecutan
+        la detección de cabeceras y el mismo parseo que en procesar_ld / procesar_sys.
+
+        Returns:
+            Diccionario con 'tipo' ('LD', 'SYS' o None), 'codificacion', 'columnas'
+            (de salida), 'mapeo' (columnas GT_) y 'muestras' (posición -> número de registros)
+        """
+        ruta_archivo = Path(ruta_archivo)
+        tamano = ruta_archivo.stat().st_size
+        resultado = {'tipo': None, 'codificacion': None, 'columnas': [], 'mapeo': {}, 'muestras': {}}
+        print(f"\n🔎 {ruta_archivo.name} ({tamano / 1024 / 1024:.1f} MB)")
+
+        fragmentos = []
+        inicio_cortado = False  # El inicio solo está cortado si no se leyó el archivo completo
+        if ruta_archivo.suffix.lower() in ['.xlsx', '.xlsm']:
+            # Un .xlsx es un zip: no admite lecturas parciales, se convierte completo
+            print("   ⚠️  Excel moderno: sin muestreo, se convierte el archivo completo")
+            resultado['codificacion'] = 'xlsx'
+            lineas_inicio = self.convertir_xlsx_a_texto(ruta_archivo)
+        else:
+            with open(ruta_archivo, 'rb') as f:
+                cabeza = f.read(kb_inicio * 1024)
+                codificacion = codificacion_de_bytes(cabeza)
+                es_utf16 = codificacion == 'utf-16-le'
+                resultado['codificacion'] = codificacion
+
+                lineas_inicio = self.leer_lineas_fragmento(cabeza, codificacion)
+                if len(cabeza) < tamano:
+                    inicio_cortado = True
+                    lineas_inicio = lineas_inicio[:-1]  # Última línea posiblemente cortada
+
+                    rng = random.Random(semilla)
+                    for posicion in sorted(rng.randrange(len(cabeza), tamano) for _ in range(muestras)):
+                        posicion -= posicion % 2 if es_utf16 else 0
+                        f.seek(posicion)
+                        lineas = self.leer_lineas_fragmento(f.read(kb_muestra * 1024), codificacion)
+                        # La primera y la última línea pueden estar cortadas
+                        fragmentos.append((f"byte {posicion:,}", lineas[1:-1]))
+
+        # Detección de cabeceras sobre el inicio del archivo
+        inicio, cols_cabecera, cols_detalle = self.detectar_inicio_datos_ld(lineas_inicio)
+        if inicio:
+            resultado['tipo'] = 'LD'
+            print(f"   Tipo: libro diario ({resultado['codificacion']})")
+            print(f"   Columnas de cabecera ({len([c for c in cols_cabecera if c])}): "
+                  f"{', '.join(c for c in cols_cabecera if c)}")
+            print(f"   Columnas de detalle ({len([c for c in cols_detalle if c])}): "
+                  f"{', '.join(c for c in cols_detalle if c)}")
+        else:
+            inicio, columnas_sys = self.detectar_inicio_datos_sys(lineas_inicio)
+            if not inicio:
+                print("   ❌ No se detectaron cabeceras de libro diario ni de sumas y saldos")
+                return resultado
+            resultado['tipo'] = 'SYS'
+            print(f"   Tipo: sumas y saldos ({resultado['codificacion']})")
+            print(f"   Columnas ({len([c for c in columnas_sys if c])}): {', '.join(c for c in columnas_sys if c)}")
+
+        def parsear(lineas: List[str], desde: Optional[int], cortado: bool) -> List[Dict[str, Any]]:
+            if resultado['tipo'] == 'SYS':
+                return self.parsear_sys(lineas, desde or 0, columnas_sys)
+            # Solo asientos completos: desde el primer límite de asiento (línea vacía)
+            # si no se conoce el inicio, hasta el último si el fragmento está cortado
+            limites = [i for i, linea in enumerate(lineas) if i >= (desde or 0) and not linea.strip()]
+            if desde is None:
+                if not limites:
+                    return []
+                desde = limites.pop(0) + 1
+            if cortado:
+                if not limites:
+                    return []
+                lineas = lineas[:limites[-1]]
+            return self.parsear_ld(lineas, desde, cols_cabecera, cols_detalle, ruta_archivo.name)
+
+        fragmentos.insert(0, ('inicio', lineas_inicio))
+        columnas = set()
+        for posicion, lineas in fragmentos:
+            if posicion == 'inicio':
+                registros = parsear(lineas, inicio, inicio_cortado)
+            else:
+                registros = parsear(lineas, None, True)
+            resultado['muestras'][posicion] = len(registros)
+            simbolo = '✅' if registros else '⚠️ '
+            print(f"   {simbolo} [{posicion}] {len(registros)} registros")
+
+            for registro in registros:
+                columnas.update(clave[4:] if clave.startswith(('cab_', 'det_')) else clave for clave in registro)
+            for registro in registros[:registros_por_muestra]:
+                texto = ' | '.join(f"{clave[4:] if clave.startswith(('cab_', 'det_')) else clave}={valor}"
+                                   for clave, valor in registro.items() if valor)
+                print(f"      {texto[:ANCHO_REGISTRO_PREVIEW]}")
+
+        # Columnas GT_ que resolverían procesar_datos.py y generar_totalidad.py con esa salida
+        if resultado['tipo'] == 'LD':
+            columnas.add('GT_CUENTA')
+            mapeo = detectar_columnas_ld(sorted(columnas))
+        else:
+            mapeo = detectar_columnas_sys(sorted(columnas))
+        resultado['columnas'] = sorted(columnas)
+        resultado['mapeo'] = mapeo
+
+        print(f"   Mapeo de columnas: {', '.join(f'{rol}={col}' for rol, col in mapeo.items())}")
+        sin_columna = [rol for rol, col in mapeo.items() if col is None]
+        if sin_columna:
+            print(f"   ⚠️  Sin columna para: {', '.join(sin_columna)}")
+
+        return resultado
+
+    def consolidar_archivos(self, archivos: List[Path], tipo: str,
+                            resumen_asientos: List[Dict[str, Any]] = None,
+                            vistos: ConjuntoHuellas = None) -> List[Dict[str, Any]]:
         """
         Consolida múltiples archivos (ej: trimestres) en uno solo.
 
         Args:
             archivos: Lista de rutas a archivos
             tipo: 'LD' o 'SYS'
+            resumen_asientos: Lista opcional para el resumen por asiento (solo LD)
+            vistos: Huellas de líneas ya incluidas (solo LD). Por defecto se crea un conjunto
+                nuevo si hay que deduplicar
+
+        Con varios libros diarios y self.deduplicar activo, las líneas que aparecen en más
+        de un archivo (exportaciones acumuladas o solapadas) se incluyen una sola vez.
+        Con self.ordenar_diario, los libros diarios se devuelven ordenados por
+        clave_orden_ld (mezcla de un tramo ordenado por archivo) en lugar de concatenados.
         """
-        todos_registros = []
+        if tipo == 'LD' and self.ordenar_diario:
+            todos_registros = OrdenacionExterna(self.clave_orden_ld, self.presupuesto)
+        else:
+            todos_registros = self.nueva_lista()
+        if vistos is None and tipo == 'LD' and self.deduplicar and len(archivos) > 1:
+            vistos = ConjuntoHuellas()
 
         for archivo in sorted(archivos):
             if not archivo.exists():
@@ -265,14 +904,50 @@ class ProcesadorDatos:
             if tipo == 'SYS':
                 registros = self.procesar_sys(archivo)
             else:  # LD
-                registros = self.procesar_ld(archivo)
+                registros = self.procesar_ld(archivo, resumen_asientos, vistos)
+                if vistos is not None:
+                    vistos.terminar_archivo()
 
-            todos_registros.extend(registros)
+            if isinstance(todos_registros, OrdenacionExterna):
+                todos_registros.agregar_tramo(registros)
+            else:
+                todos_registros.extend(registros)
 
         return todos_registros
 
+    def clave_orden_ld(self, registro: Dict[str, Any]) -> Tuple:
+        """
+        Clave de orden de un asiento de libro diario: fecha contable, Nº doc., sociedad,
+        ejercicio y ledger. No incluye la línea: OrdenacionExterna conserva el orden de
+        inserción con claves iguales, así que las líneas de cada asiento siguen juntas y en
+        su orden original, y dos asientos con la misma clave (ej: mismo número en dos
+        ejercicios sin columna de ejercicio) no se intercalan. Los valores numéricos se
+        comparan como números (ej: '99' antes que '100').
+        """
+        def valor(columnas: List[str]) -> str:
+            return next((registro[f'{prefijo}{col}'] for col in columnas for prefijo in ('cab_', 'det_')
+                         if registro.get(f'{prefijo}{col}')), '')
+
+        return (registro.get('GT_FECHA', ''), clave_natural(valor(['Nº doc.'])), valor(['Soc.']),
+                clave_natural(valor(COLUMNAS_EJERCICIO)), valor(COLUMNAS_LEDGER))
+
+    @contextmanager
+    def abrir_csv_salida(self, ruta: Path):
+        """
+        Abre un CSV de salida con la compresión configurada. ruta debe terminar en .csv.
+        Se escribe en un temporal que solo reemplaza al archivo final si no hay errores;
+        entonces se borran las copias del mismo CSV escritas antes con otro códec.
+        """
+        with abrir_texto_escritura_atomica(ruta_con_compresion(ruta, self.compresion),
+                                           self.compresion, self.nivel_compresion) as f:
+            yield f
+        eliminar_otras_compresiones(ruta, self.compresion)
+
     def guardar_csv(self, registros: List[Dict[str, Any]], ruta_salida: Path):
-        """Guarda registros en un archivo CSV, removiendo prefijos cab_ y det_."""
+        """
+        Guarda registros en un archivo CSV, removiendo prefijos cab_ y det_.
+        Si hay compresión configurada se añade su extensión (ej: .csv.gz).
+        """
         if not registros:
             print(f"⚠️  No hay registros para guardar en {ruta_salida}")
             return
@@ -280,47 +955,440 @@ class ProcesadorDatos:
         # Crear directorio si no existe
         ruta_salida.parent.mkdir(parents=True, exist_ok=True)
 
-        # Renombrar columnas removiendo prefijos cab_ y det_
-        registros_renombrados = []
+        # Obtener todas las columnas (primera pasada, sin copiar los registros)
+        columnas = self.columnas_csv(registros)
+
+        # Guardar CSV con UTF-8-sig para compatibilidad con Excel, renombrando fila a fila
+        with self.abrir_csv_salida(ruta_salida) as f:
+            writer = csv.DictWriter(f, fieldnames=columnas)
+            writer.writeheader()
+            writer.writerows(self.fila_csv(registro) for registro in registros)
+
+        print(f"✅ CSV guardado: {ruta_con_compresion(ruta_salida, self.compresion)} ({len(registros)} registros)")
+
+    def fila_csv(self, registro: Dict[str, Any]) -> Dict[str, Any]:
+        """Fila del CSV plano de un registro: sin prefijo cab_/det_ y con GT_CUENTA."""
+        registro_nuevo = {}
+        for clave, valor in registro.items():
+            if clave.startswith('cab_') or clave.startswith('det_'):
+                registro_nuevo[clave[4:]] = valor
+            else:
+                registro_nuevo[clave] = valor
+        registro_nuevo['GT_CUENTA'] = self.obtener_gt_cuenta(registro_nuevo)
+        return registro_nuevo
+
+    def columnas_csv(self, registros: List[Dict[str, Any]]) -> List[str]:
+        """Columnas del CSV plano de unos registros: claves sin prefijo cab_/det_ y GT_CUENTA."""
+        claves = set()
         for registro in registros:
-            registro_nuevo = {}
-            for clave, valor in registro.items():
-                # Remover prefijo cab_ o det_
+            claves.update(registro.keys())
+        return sorted({clave[4:] if clave.startswith(('cab_', 'det_')) else clave for clave in claves}
+                      | {'GT_CUENTA'})
+
+    def tabla_registros(self, registros: List[Dict[str, Any]], columnas: List[str]) -> pd.DataFrame:
+        """
+        Columnas indicadas de unos registros con los valores que tendrían en su CSV, sin
+        escribirlo: sin prefijo cab_/det_ (prevalece el detalle), con GT_CUENTA y con los
+        vacíos como NaN, igual que los lee read_csv. Los registros se recorren una sola vez
+        para todas las columnas (con presupuesto de memoria, cada pasada relee los volcados).
+        """
+        def valor(registro: Dict[str, Any], columna: str) -> str:
+            for clave in (f'det_{columna}', f'cab_{columna}', columna):
+                if clave in registro:
+                    return registro[clave]
+            return ''
+
+        def valor_gt_cuenta(registro: Dict[str, Any]) -> str:
+            return self.obtener_gt_cuenta({col: valor(registro, col) for col in ('Lib.mayor', 'Cta.mayor', 'Cuenta')})
+
+        valores = {columna: [] for columna in columnas}
+        for registro in registros:
+            for columna, lista in valores.items():
+                lista.append(valor_gt_cuenta(registro) if columna == 'GT_CUENTA' else valor(registro, columna))
+
+        datos = {columna: pd.Series(lista, dtype=object).replace('', np.nan) for columna, lista in valores.items()}
+        return pd.DataFrame(datos, columns=columnas)
+
+    def entregar_grupo(self, tipo: str, registros: List[Dict[str, Any]], carpeta_salida: Path,
+                       resumen_asientos: List[Dict[str, Any]] = None):
+        """
+        Modo pipeline: entrega un grupo consolidado al receptor de totalidad y, si es un
+        libro diario, guarda en memoria su agregado por cuenta.
+        """
+        nombre_sociedad = carpeta_salida.relative_to(self.ruta_datos_tratados).parts[0]
+        columnas = self.columnas_csv(registros)
+
+        # Columnas ya extraídas: las que se vuelven a pedir no recorren otra vez los registros
+        extraidas = {}
+
+        def extraer(usadas: List[str]) -> pd.DataFrame:
+            faltan = [col for col in usadas if col not in extraidas]
+            if faltan:
+                extraidas.update(self.tabla_registros(registros, faltan).items())
+            return pd.DataFrame({col: extraidas[col] for col in usadas}, columns=usadas)
+
+        if tipo == 'SYS':
+            self.receptor.recibir_sumas_saldos(nombre_sociedad, columnas, extraer)
+            return
+
+        self.receptor.recibir_libro_diario(nombre_sociedad, columnas, extraer, resumen_asientos)
+
+        mapeo = self.cache_columnas.obtener('LD', columnas)
+        if mapeo['debe'] or mapeo['haber']:
+            usadas = [col for col in (mapeo['debe'], mapeo['haber'], mapeo['cuenta']) if col]
+            df = extraer(usadas).astype({mapeo['cuenta']: str} if mapeo['cuenta'] else {})
+            self.agregados_memoria.setdefault(nombre_sociedad, []).append(
+                self.agregar_lote_cuentas(df, mapeo['cuenta'], mapeo['debe'], mapeo['haber'])
+            )
+
+    def obtener_gt_cuenta(self, registro: Dict[str, Any]) -> str:
+        """
+        Obtiene el valor de GT_CUENTA de un registro con columnas sin prefijo.
+        Prioridad: Lib.mayor > Cta.mayor > Cuenta
+        """
+        if 'Lib.mayor' in registro and registro['Lib.mayor']:
+            return registro['Lib.mayor']
+        elif 'Cta.mayor' in registro and registro['Cta.mayor']:
+            return registro['Cta.mayor']
+        elif 'Cuenta' in registro and registro['Cuenta']:
+            return registro['Cuenta']
+        return ''
+
+    def guardar_csv_normalizado(self, registros: List[Dict[str, Any]], carpeta: Path, anio: str):
+        """
+        Guarda un libro diario en formato normalizado:
+        - asientos_diario_<anio>.csv: una fila por cabecera (campos cab_) con ID_ASIENTO
+        - lineas_diario_<anio>.csv: una fila por línea (campos det_ y GT_CUENTA) con ID_ASIENTO
+
+        Los registros consecutivos con la misma cabecera pertenecen al mismo asiento.
+        """
+        if not registros:
+            print(f"⚠️  No hay registros para guardar en {carpeta}")
+            return
+
+        carpeta.mkdir(parents=True, exist_ok=True)
+
+        # Primera pasada: columnas de cada tabla
+        cols_asiento = set()
+        cols_linea = {'GT_CUENTA'}
+        for registro in registros:
+            for clave in registro.keys():
                 if clave.startswith('cab_'):
-                    nueva_clave = clave[4:]  # Quitar 'cab_'
-                elif clave.startswith('det_'):
-                    nueva_clave = clave[4:]  # Quitar 'det_'
+                    cols_asiento.add(clave[4:])
                 else:
-                    nueva_clave = clave
-                registro_nuevo[nueva_clave] = valor
-            registros_renombrados.append(registro_nuevo)
-
-        # Agregar columna GT_CUENTA
-        # Prioridad: Lib.mayor > Cta.mayor > Cuenta
-        for registro in registros_renombrados:
-            if 'Lib.mayor' in registro and registro['Lib.mayor']:
-                registro['GT_CUENTA'] = registro['Lib.mayor']
-            elif 'Cta.mayor' in registro and registro['Cta.mayor']:
-                registro['GT_CUENTA'] = registro['Cta.mayor']
-            elif 'Cuenta' in registro and registro['Cuenta']:
-                registro['GT_CUENTA'] = registro['Cuenta']
+                    cols_linea.add(clave[4:] if clave.startswith('det_') else clave)
+
+        # Segunda pasada: ambas tablas se escriben a la vez, fila a fila
+        num_asientos = 0
+        num_lineas = 0
+        with self.abrir_csv_salida(carpeta / f"asientos_diario_{anio}.csv") as f_asientos, \
+                self.abrir_csv_salida(carpeta / f"lineas_diario_{anio}.csv") as f_lineas:
+            writer_asientos = csv.DictWriter(f_asientos, fieldnames=['ID_ASIENTO'] + sorted(cols_asiento))
+            writer_lineas = csv.DictWriter(f_lineas, fieldnames=['ID_ASIENTO'] + sorted(cols_linea))
+            writer_asientos.writeheader()
+            writer_lineas.writeheader()
+
+            cabecera_anterior = None
+            asiento = {}
+            for registro in registros:
+                cabecera = tuple((clave[4:], valor) for clave, valor in registro.items() if clave.startswith('cab_'))
+                if cabecera != cabecera_anterior:
+                    num_asientos += 1
+                    asiento = {'ID_ASIENTO': num_asientos}
+                    asiento.update(cabecera)
+                    writer_asientos.writerow(asiento)
+                    cabecera_anterior = cabecera
+
+                linea = {'ID_ASIENTO': num_asientos}
+                for clave, valor in registro.items():
+                    if not clave.startswith('cab_'):
+                        linea[clave[4:] if clave.startswith('det_') else clave] = valor
+                linea['GT_CUENTA'] = self.obtener_gt_cuenta({**asiento, **linea})
+                writer_lineas.writerow(linea)
+                num_lineas += 1
+
+        print(f"✅ CSV normalizado guardado: {carpeta} ({num_asientos} asientos, {num_lineas} líneas)")
+
+    def guardar_libro_diario(self, registros: List[Dict[str, Any]], carpeta: Path, anio: str):
+        """
+        Guarda un libro diario en el formato configurado (plano o normalizado)
+        y su índice de períodos (indice_periodos_<anio>.json). Si el año se guardó antes
+        en el otro formato, esos archivos se borran.
+        """
+        if not registros:
+            print(f"⚠️  No hay registros para guardar en {carpeta}")
+            return
+
+        # Se borra la salida del otro formato del mismo año: totalidad lee ambos y la sumaría dos veces
+        if self.formato_normalizado:
+            self.guardar_csv_normalizado(registros, carpeta, anio)
+            ruta_csv = carpeta / f"lineas_diario_{anio}.csv"
+            eliminar_csv(carpeta / f"libro_diario_{anio}.csv")
+        else:
+            ruta_csv = carpeta / f"libro_diario_{anio}.csv"
+            self.guardar_csv(registros, ruta_csv)
+            eliminar_csv(carpeta / f"asientos_diario_{anio}.csv")
+            eliminar_csv(carpeta / f"lineas_diario_{anio}.csv")
+
+        # Las filas de datos de ambos formatos siguen el orden de los registros
+        nombre_csv = ruta_con_compresion(ruta_csv, self.compresion).name
+        indice = construir_indice((registro.get('GT_PERIODO', '') for registro in registros), nombre_csv)
+        guardar_indice(indice, carpeta / f"indice_periodos_{anio}.json")
+
+    def guardar_resumen_asientos(self, resumen_asientos: List[Dict[str, Any]], carpeta: Path, anio: str,
+                                 anexar: bool = False):
+        """
+        Guarda el resumen por asiento calculado durante el parseo y la lista de
+        asientos descuadrados (|GT_IMPORTE_MONEDA_LOCAL| >= 0.01).
+
+        Args:
+            anexar: Si es True, las filas se añaden a los CSV existentes (ver anexar_libro_diario)
+        """
+        if not resumen_asientos:
+            return
+
+        carpeta.mkdir(parents=True, exist_ok=True)
+        descuadrados = [a for a in resumen_asientos if abs(a['GT_IMPORTE_MONEDA_LOCAL']) >= 0.01]
+
+        for nombre, filas in [(f"resumen_asientos_{anio}.csv", resumen_asientos),
+                              (f"asientos_descuadrados_{anio}.csv", descuadrados)]:
+            if anexar:
+                if not filas:
+                    continue
+                salida = abrir_texto_anexado_atomico(ruta_con_compresion(carpeta / nombre, self.compresion),
+                                                     self.compresion, self.nivel_compresion)
             else:
-                registro['GT_CUENTA'] = ''
+                salida = self.abrir_csv_salida(carpeta / nombre)
+            with salida as f:
+                writer = csv.DictWriter(f, fieldnames=COLUMNAS_RESUMEN_ASIENTOS)
+                if not anexar:
+                    writer.writeheader()
+                writer.writerows(filas)
+
+        ruta_resumen = ruta_con_compresion(carpeta / f"resumen_asientos_{anio}.csv", self.compresion)
+        print(f"✅ Resumen por asiento {'ampliado' if anexar else 'guardado'}: {ruta_resumen} "
+              f"({len(resumen_asientos)} asientos, {len(descuadrados)} descuadrados)")
+
+    def huella_fuentes(self, archivos: List[Path]) -> List[Dict[str, Any]]:
+        """Huella (nombre, tamaño, fecha de modificación) de los archivos fuente existentes."""
+        huella = []
+        for archivo in sorted(archivos):
+            if archivo.exists():
+                info = archivo.stat()
+                huella.append({
+                    'archivo': str(archivo.relative_to(self.ruta_datos_originales)),
+                    'tamano': info.st_size,
+                    'mtime': info.st_mtime
+                })
+        return huella
+
+    def huella_unidad(self, archivos: List[Path]) -> Dict[str, Any]:
+        """Huella de una unidad de salida: fuentes y opciones que afectan al resultado."""
+        return {
+            'fuentes': self.huella_fuentes(archivos),
+            'formato_normalizado': self.formato_normalizado,
+            'compresion': self.compresion,
+            'deduplicar': self.deduplicar,
+            'ordenar_diario': self.ordenar_diario
+        }
+
+    def guardar_checkpoint(self):
+        """Guarda el checkpoint de forma atómica."""
+        guardar_json_atomico(self.ruta_checkpoint, self.checkpoint)
+
+    def rutas_salida(self, tipo: str, carpeta: Path, anio: str) -> List[Path]:
+        """Archivos que puede escribir una unidad (libro diario o sumas y saldos de un año)."""
+        if tipo == 'SYS':
+            return [ruta_con_compresion(carpeta / f"sumas_saldos_{anio}.csv", self.compresion)]
+
+        nombres = ['asientos_diario', 'lineas_diario'] if self.formato_normalizado else ['libro_diario']
+        return [ruta_con_compresion(carpeta / f"{nombre}_{anio}.csv", self.compresion)
+                for nombre in nombres + ['resumen_asientos', 'asientos_descuadrados']] + [
+            carpeta / f"indice_periodos_{anio}.json",
+            carpeta / f"huellas_diario_{anio}.bin",
+        ]
+
+    def huella_salidas(self, tipo: str, carpeta: Path, anio: str) -> Dict[str, int]:
+        """Tamaño de cada archivo de salida existente de una unidad."""
+        return {ruta.name: ruta.stat().st_size for ruta in self.rutas_salida(tipo, carpeta, anio) if ruta.exists()}
+
+    def salidas_presentes(self, clave: str, carpeta: Path) -> bool:
+        """
+        Indica si siguen existiendo los archivos de salida que el checkpoint registró para
+        una unidad. Sin registro (checkpoint de una versión anterior) no se puede comprobar.
+        """
+        salidas = self.checkpoint.get('salidas', {}).get(clave)
+        return salidas is not None and all((carpeta / nombre).exists() for nombre in salidas)
+
+    def salidas_sociedad_presentes(self, nombre_normalizado: str) -> bool:
+        """Indica si siguen existiendo las salidas de todas las unidades de una sociedad y su agregado por cuenta."""
+        carpeta = self.ruta_datos_tratados / nombre_normalizado
+        if not ruta_con_compresion(carpeta / 'agregados_cuenta.csv', self.compresion).exists():
+            return False
+        prefijo = f"{nombre_normalizado}/"
+        return all(self.salidas_presentes(clave, self.ruta_datos_tratados / clave.rsplit('/', 1)[0])
+                   for clave in self.checkpoint['unidades'] if clave.startswith(prefijo))
+
+    def huellas_grupo(self, archivos: List[Path]) -> Optional[ConjuntoHuellas]:
+        """
+        Huellas de las líneas de un libro diario para deduplicar entre sus archivos. Con
+        --resume se calculan también con un solo archivo, para guardarlas junto al CSV y
+        deduplicar los archivos que se anexen después con la misma regla (una línea solo
+        se compara con las de archivos anteriores).
+        """
+        if not self.deduplicar:
+            return None
+        if len(archivos) > 1 or (self.reanudar and self.escribir_csv):
+            return ConjuntoHuellas()
+        return None
 
-        # Obtener todas las columnas
-        columnas = set()
-        for registro in registros_renombrados:
-            columnas.update(registro.keys())
+    def archivos_anexables(self, clave: str, archivos: List[Path], carpeta: Path, anio: str) -> List[Path]:
+        """
+        Archivos de un libro diario que se pueden anexar a su salida existente en lugar de
+        reconstruir el año: las fuentes anteriores del checkpoint siguen iguales, solo hay
+        archivos nuevos y van después de ellas en el orden de consolidar_archivos, las
+        opciones no cambiaron y los archivos de salida son los que se escribieron entonces.
 
-        columnas = sorted(columnas)
+        Returns:
+            Archivos nuevos, o lista vacía si hay que reconstruir el año completo
+        """
+        anterior = self.checkpoint['unidades'].get(clave)
+        if not anterior or self.formato_normalizado or self.ordenar_diario or self.compresion == 'zstd':
+            return []
 
-        # Guardar CSV con UTF-8-sig para compatibilidad con Excel
-        with open(ruta_salida, 'w', newline='', encoding='utf-8-sig') as f:
-            writer = csv.DictWriter(f, fieldnames=columnas)
-            writer.writeheader()
-            writer.writerows(registros_renombrados)
+        huella = self.huella_unidad(archivos)
+        if any(anterior.get(opcion) != valor for opcion, valor in huella.items() if opcion != 'fuentes'):
+            return []
+
+        fuentes_anteriores = anterior['fuentes']
+        nuevas = [fuente for fuente in huella['fuentes'] if fuente not in fuentes_anteriores]
+        if not fuentes_anteriores or not nuevas or any(f not in huella['fuentes'] for f in fuentes_anteriores):
+            return []
+
+        rutas_nuevas = [self.ruta_datos_originales / fuente['archivo'] for fuente in nuevas]
+        rutas_anteriores = [self.ruta_datos_originales / fuente['archivo'] for fuente in fuentes_anteriores]
+        if min(rutas_nuevas) < max(rutas_anteriores):
+            return []
+
+        salidas = self.checkpoint.get('salidas', {}).get(clave)
+        if not salidas or salidas != self.huella_salidas('LD', carpeta, anio):
+            return []
+        if self.deduplicar and f"huellas_diario_{anio}.bin" not in salidas:
+            return []
 
-        print(f"✅ CSV guardado: {ruta_salida} ({len(registros)} registros)")
+        return rutas_nuevas
+
+    def anexar_libro_diario(self, archivos: List[Path], carpeta: Path, anio: str) -> bool:
+        """
+        Parsea solo los archivos nuevos de un libro diario y añade sus líneas al CSV del año,
+        a su resumen por asiento y a su índice de períodos. Las líneas ya incluidas se
+        descartan con las huellas guardadas. El resultado es el mismo que reconstruir el
+        año con todos los archivos.
+
+        Returns:
+            True si se anexó; False si las columnas no coinciden y hay que reconstruir
+        """
+        ruta_csv = ruta_con_compresion(carpeta / f"libro_diario_{anio}.csv", self.compresion)
+        ruta_huellas = carpeta / f"huellas_diario_{anio}.bin"
+        print(f"   ➕ LD {anio}: se anexan {len(archivos)} archivos nuevos a {ruta_csv.name}")
+
+        vistos = ConjuntoHuellas.cargar(ruta_huellas) if self.deduplicar else None
+        resumen_asientos = self.nueva_lista()
+        registros = self.consolidar_archivos(archivos, 'LD', resumen_asientos, vistos)
+
+        # Con columnas que el CSV no tiene, la cabecera cambiaría: hay que reconstruir
+        cabecera = leer_cabecera_csv(ruta_csv)
+        nuevas = set(self.columnas_csv(registros)) - set(cabecera)
+        if nuevas:
+            print(f"   ⚠️  Columnas nuevas ({', '.join(sorted(nuevas))}), se reconstruye el año completo")
+            return False
+
+        if registros:
+            with abrir_texto_anexado_atomico(ruta_csv, self.compresion, self.nivel_compresion) as f:
+                writer = csv.DictWriter(f, fieldnames=cabecera)
+                writer.writerows(self.fila_csv(registro) for registro in registros)
+            print(f"✅ CSV ampliado: {ruta_csv} (+{len(registros)} registros)")
+
+            indice = cargar_indice(ruta_csv)
+            guardar_indice(anexar_indice(indice, (registro.get('GT_PERIODO', '') for registro in registros)),
+                           carpeta / f"indice_periodos_{anio}.json")
+            self.guardar_resumen_asientos(resumen_asientos, carpeta, anio, anexar=True)
+
+        if vistos is not None:
+            vistos.guardar(ruta_huellas)
+        return True
+
+    def procesar_grupo(self, archivos: List[Path], tipo: str, carpeta_salida: Path, anio: str,
+                       stats: Dict[str, int]):
+        """
+        Consolida y guarda un grupo de archivos (libros diarios o sumas y saldos de un año).
+        Cada grupo es una unidad del checkpoint: si ya se completó con las mismas fuentes
+        y se está reanudando, se omite. Si a un libro diario solo se le añadieron archivos,
+        se parsean solo esos y se anexan a su salida (ver archivos_anexables).
+
+        Args:
+            archivos: Archivos fuente del grupo
+            tipo: 'LD' o 'SYS'
+            carpeta_salida: Carpeta de la sociedad (y año) en datos_tratados
+            anio: Año del grupo
+            stats: Estadísticas de la sociedad a actualizar
+        """
+        clave = f"{carpeta_salida.relative_to(self.ruta_datos_tratados).as_posix()}/{tipo}_{anio}"
+        huella = self.huella_unidad(archivos)
+        clave_stats = tipo.lower()
+
+        if self.reanudar and self.checkpoint['unidades'].get(clave) == huella:
+            if self.salidas_presentes(clave, carpeta_salida):
+                print(f"   ⏭️  {tipo} {anio} ya procesado en una ejecución anterior, se omite")
+                stats[clave_stats] += 1
+                return
+            print(f"   ⚠️  {tipo} {anio} ya procesado, pero faltan archivos de salida: se vuelve a procesar")
+
+        try:
+            # Libro diario con archivos nuevos (ej: un trimestre más): solo se parsean esos
+            anexables = []
+            if tipo == 'LD' and self.reanudar:
+                anexables = self.archivos_anexables(clave, archivos, carpeta_salida, anio)
+
+            if anexables and self.anexar_libro_diario(anexables, carpeta_salida, anio):
+                stats[clave_stats] += 1
+            elif tipo == 'LD':
+                resumen_asientos = self.nueva_lista()
+                vistos = self.huellas_grupo(archivos)
+                registros = self.consolidar_archivos(archivos, 'LD', resumen_asientos, vistos)
+                if registros:
+                    if self.escribir_csv:
+                        self.guardar_libro_diario(registros, carpeta_salida, anio)
+                        self.guardar_resumen_asientos(resumen_asientos, carpeta_salida, anio)
+                        # Las huellas solo hacen falta para anexar con --resume; sin él no se guardan
+                        # y se borran las de una ejecución anterior, que ya no corresponden al CSV
+                        ruta_huellas = carpeta_salida / f"huellas_diario_{anio}.bin"
+                        if vistos is not None and self.reanudar and not self.formato_normalizado:
+                            vistos.guardar(ruta_huellas)
+                        else:
+                            ruta_huellas.unlink(missing_ok=True)
+                    if self.receptor is not None:
+                        self.entregar_grupo('LD', registros, carpeta_salida, resumen_asientos)
+                    stats[clave_stats] += 1
+            else:
+                registros = self.consolidar_archivos(archivos, 'SYS')
+                if registros:
+                    if self.escribir_csv:
+                        self.guardar_csv(registros, carpeta_salida / f"sumas_saldos_{anio}.csv")
+                    if self.receptor is not None:
+                        self.entregar_grupo('SYS', registros, carpeta_salida)
+                    stats[clave_stats] += 1
+        finally:
+            if self.presupuesto:
+                # Los registros de este grupo ya están guardados (o falló): borrar sus volcados
+                self.presupuesto.limpiar()
+
+        if self.escribir_csv:
+            self.checkpoint['unidades'][clave] = huella
+            # Salida escrita: al reanudar se comprueba que sigue ahí y, en los libros
+            # diarios, que sus tamaños no cambiaron antes de anexarles archivos
+            self.checkpoint.setdefault('salidas', {})[clave] = self.huella_salidas(tipo, carpeta_salida, anio)
+            self.guardar_checkpoint()
 
     def procesar_sociedad(self, sociedad_info: Dict[str, Any]) -> Dict[str, int]:
         """
@@ -359,12 +1427,7 @@ class ProcesadorDatos:
                         carpeta_sociedad_original / anio / item['archivo']
                         for item in anio_info['libros_diarios']
                     ]
-                    registros_ld = self.consolidar_archivos(archivos_ld, 'LD')
-
-                    if registros_ld:
-                        ruta_csv = carpeta_sociedad_tratada / anio / f"libro_diario_{anio}.csv"
-                        self.guardar_csv(registros_ld, ruta_csv)
-                        stats['ld'] += 1
+                    self.procesar_grupo(archivos_ld, 'LD', carpeta_sociedad_tratada / anio, anio, stats)
 
                 # Procesar sumas y saldos del año
                 if anio_info['sumas_saldos']:
@@ -372,12 +1435,7 @@ class ProcesadorDatos:
                         carpeta_sociedad_original / anio / item['archivo']
                         for item in anio_info['sumas_saldos']
                     ]
-                    registros_sys = self.consolidar_archivos(archivos_sys, 'SYS')
-
-                    if registros_sys:
-                        ruta_csv = carpeta_sociedad_tratada / anio / f"sumas_saldos_{anio}.csv"
-                        self.guardar_csv(registros_sys, ruta_csv)
-                        stats['sys'] += 1
+                    self.procesar_grupo(archivos_sys, 'SYS', carpeta_sociedad_tratada / anio, anio, stats)
 
         else:
             # No tiene años, archivos directos
@@ -387,14 +1445,9 @@ class ProcesadorDatos:
                     carpeta_sociedad_original / item['archivo']
                     for item in sociedad_info['libros_diarios']
                 ]
-                registros_ld = self.consolidar_archivos(archivos_ld, 'LD')
-
-                if registros_ld:
-                    # Extraer año del nombre del archivo si es posible
-                    anio = self.extraer_anio_de_archivos(sociedad_info['libros_diarios'])
-                    ruta_csv = carpeta_sociedad_tratada / f"libro_diario_{anio}.csv"
-                    self.guardar_csv(registros_ld, ruta_csv)
-                    stats['ld'] += 1
+                # Extraer año del nombre del archivo si es posible
+                anio = self.extraer_anio_de_archivos(sociedad_info['libros_diarios'])
+                self.procesar_grupo(archivos_ld, 'LD', carpeta_sociedad_tratada, anio, stats)
 
             # Procesar sumas y saldos
             if sociedad_info.get('sumas_saldos'):
@@ -402,16 +1455,26 @@ class ProcesadorDatos:
                     carpeta_sociedad_original / item['archivo']
                     for item in sociedad_info['sumas_saldos']
                 ]
-                registros_sys = self.consolidar_archivos(archivos_sys, 'SYS')
-
-                if registros_sys:
-                    anio = self.extraer_anio_de_archivos(sociedad_info['sumas_saldos'])
-                    ruta_csv = carpeta_sociedad_tratada / f"sumas_saldos_{anio}.csv"
-                    self.guardar_csv(registros_sys, ruta_csv)
-                    stats['sys'] += 1
+                anio = self.extraer_anio_de_archivos(sociedad_info['sumas_saldos'])
+                self.procesar_grupo(archivos_sys, 'SYS', carpeta_sociedad_tratada, anio, stats)
 
         return stats
 
+    def archivos_fuente_sociedad(self, sociedad_info: Dict[str, Any]) -> List[Path]:
+        """Lista todos los archivos fuente (LD y SyS) de una sociedad según la estructura."""
+        carpeta = self.ruta_datos_originales / sociedad_info['sociedad']
+        archivos = []
+
+        if 'por_anios' in sociedad_info:
+            for anio_info in sociedad_info['por_anios']:
+                for item in anio_info['libros_diarios'] + anio_info['sumas_saldos']:
+                    archivos.append(carpeta / anio_info['anio'] / item['archivo'])
+        else:
+            for item in sociedad_info.get('libros_diarios', []) + sociedad_info.get('sumas_saldos', []):
+                archivos.append(carpeta / item['archivo'])
+
+        return archivos
+
     def extraer_anio_de_archivos(self, archivos_info: List[Dict[str, str]]) -> str:
         """Extrae el año de los nombres de archivo."""
         for item in archivos_info:
@@ -422,85 +1485,214 @@ class ProcesadorDatos:
                 return match.group()
         return '2025'  # Por defecto
 
+    def calcular_agregados_cuenta(self, nombre_normalizado: str) -> pd.DataFrame:
+        """
+        Agrega debe y haber por GT_CUENTA de todos los libros diarios de una sociedad.
+        Los CSV se leen por lotes (solo las columnas necesarias), de modo que nunca se
+        mantienen las líneas en memoria, solo el agregado por cuenta.
+
+        Returns:
+            DataFrame con columnas GT_CUENTA, Debe, Haber, Saldo (Debe - Haber)
+        """
+        carpeta_sociedad = self.ruta_datos_tratados / nombre_normalizado
+        agregado = pd.DataFrame(columns=['GT_CUENTA', 'Debe', 'Haber'])
+
+        if self.receptor is not None:
+            # Modo pipeline: los agregados de cada libro diario ya se calcularon en memoria
+            parciales = self.agregados_memoria.pop(nombre_normalizado, [])
+            archivos_ld = []
+        elif not carpeta_sociedad.exists():
+            return agregado.assign(Saldo=0.0)
+        else:
+            # Buscar todos los archivos de libro diario (plano o líneas del formato normalizado)
+            archivos_ld = buscar_csv(carpeta_sociedad, 'libro_diario_')
+            archivos_ld += buscar_csv(carpeta_sociedad, 'lineas_diario_')
+            parciales = []
+
+        for archivo_csv in archivos_ld:
+            try:
+                # Resolver columnas desde la cabecera y leer solo esas
+                mapeo = self.cache_columnas.obtener_de_archivo('LD', archivo_csv)
+                col_debe = mapeo['debe']
+                col_haber = mapeo['haber']
+                col_cuenta = mapeo['cuenta']
+                usadas = [col for col in (col_debe, col_haber, col_cuenta) if col]
+                if not col_debe and not col_haber:
+                    continue
+
+                lotes = pd.read_csv(archivo_csv, usecols=usadas, chunksize=TAMANO_LOTE_CSV,
+                                    dtype={col_cuenta: str} if col_cuenta else None)
+                for df in lotes:
+                    parciales.append(self.agregar_lote_cuentas(df, col_cuenta, col_debe, col_haber))
+
+                    # Combinar los parciales para que la memoria dependa solo del número de cuentas
+                    if len(parciales) >= 8:
+                        parciales = [pd.concat(parciales).groupby(level=0, dropna=False).sum()]
+
+            except Exception as e:
+                print(f"⚠️  Error calculando totales de {archivo_csv.name}: {e}")
+
+        if parciales:
+            agregado = pd.concat(parciales).groupby(level=0, dropna=False).sum().reset_index()
+            agregado['GT_CUENTA'] = agregado['GT_CUENTA'].fillna('')
+
+        agregado['Saldo'] = agregado['Debe'] - agregado['Haber']
+        return agregado
+
+    def agregar_lote_cuentas(self, df: pd.DataFrame, col_cuenta: Optional[str], col_debe: Optional[str],
+                             col_haber: Optional[str]) -> pd.DataFrame:
+        """Suma debe y haber por cuenta de un lote de líneas de libro diario."""
+        lote = pd.DataFrame({
+            'GT_CUENTA': df[col_cuenta] if col_cuenta else '',
+            'Debe': pd.to_numeric(df[col_debe], errors='coerce').fillna(0) if col_debe else 0.0,
+            'Haber': pd.to_numeric(df[col_haber], errors='coerce').fillna(0) if col_haber else 0.0
+        })
+        return lote.groupby('GT_CUENTA', dropna=False).sum()
+
     def calcular_totales_sociedad(self, nombre_sociedad: str, nombre_normalizado: str) -> Dict[str, float]:
         """
         Calcula los totales de debe y haber para una sociedad a partir de sus archivos CSV de libro diario.
+        En la misma pasada guarda el agregado por cuenta (agregados_cuenta.csv) que usa
+        la consolidación de grupo.
 
         Returns:
             Diccionario con 'debe' y 'haber' totales
         """
         carpeta_sociedad = self.ruta_datos_tratados / nombre_normalizado
 
-        if not carpeta_sociedad.exists():
+        if self.receptor is None and not carpeta_sociedad.exists():
             return {'debe': 0.0, 'haber': 0.0}
 
-        total_debe = 0.0
-        total_haber = 0.0
+        agregados = self.calcular_agregados_cuenta(nombre_normalizado)
 
-        # Buscar todos los archivos de libro diario
-        archivos_ld = list(carpeta_sociedad.glob('**/libro_diario_*.csv'))
+        with self.abrir_csv_salida(carpeta_sociedad / 'agregados_cuenta.csv') as f:
+            agregados.to_csv(f, index=False)
 
-        for archivo_csv in archivos_ld:
-            try:
-                df = pd.read_csv(archivo_csv)
+        return {'debe': float(agregados['Debe'].sum()), 'haber': float(agregados['Haber'].sum())}
+
+    def generar_consolidacion_grupo(self) -> Path:
+        """
+        Genera el balance de sumas consolidado por cuenta de todas las sociedades.
+
+        Combina los agregados por cuenta de cada sociedad (agregados_cuenta.csv) uno a uno,
+        por lo que la memoria depende del número de cuentas y no de las líneas.
+        Las cuentas cuyo código empieza por alguno de self.prefijos_eliminacion se eliminan
+        en el saldo consolidado (operaciones entre empresas del grupo).
+
+        Returns:
+            Ruta del Excel generado
+        """
+        consolidado = None
+        saldos_sociedad = []
 
-                # Buscar columnas de debe y haber en el libro diario
-                col_debe = None
-                col_haber = None
+        for sociedad_info in self.estructura['sociedades']:
+            nombre_sociedad = sociedad_info['sociedad']
+            carpeta_sociedad = self.ruta_datos_tratados / self.normalizar_nombre_sociedad(nombre_sociedad)
+            # El agregado que se acaba de escribir, con la compresión configurada
+            ruta_agregados = ruta_con_compresion(carpeta_sociedad / 'agregados_cuenta.csv', self.compresion)
+            if not ruta_agregados.exists():
+                continue
 
-                for col in df.columns:
-                    col_lower = col.lower()
-                    # Buscar columnas Debe o Haber (sin prefijos det_)
-                    if 'debe' in col_lower and 'moneda local' in col_lower and col_debe is None:
-                        col_debe = col
-                    elif 'haber' in col_lower and 'moneda local' in col_lower and col_haber is None:
-                        col_haber = col
+            df = pd.read_csv(ruta_agregados, dtype={'GT_CUENTA': str}, keep_default_na=False)
+            df = df.set_index('GT_CUENTA')[['Debe', 'Haber', 'Saldo']]
+            df['Sociedades'] = 1
 
-                # Sumar los valores de debe y haber
-                if col_debe and col_debe in df.columns:
-                    debe_serie = pd.to_numeric(df[col_debe], errors='coerce').fillna(0)
-                    total_debe += debe_serie.sum()
+            saldos_sociedad.append(df['Saldo'].rename(nombre_sociedad))
+            if consolidado is None:
+                consolidado = df
+            else:
+                consolidado = consolidado.add(df, fill_value=0)
 
-                if col_haber and col_haber in df.columns:
-                    haber_serie = pd.to_numeric(df[col_haber], errors='coerce').fillna(0)
-                    total_haber += haber_serie.sum()
+        ruta_reporte = self.ruta_datos_tratados / 'reporte_consolidacion_grupo.xlsx'
 
-            except Exception as e:
-                print(f"⚠️  Error calculando totales de {archivo_csv.name}: {e}")
+        if consolidado is None:
+            print("⚠️  No hay agregados por cuenta para consolidar")
+            return ruta_reporte
 
-        return {'debe': total_debe, 'haber': total_haber}
+        consolidado = consolidado.sort_index().reset_index()
+        consolidado['Sociedades'] = consolidado['Sociedades'].astype(int)
 
-    def generar_reporte_excel(self, datos_reporte: List[Dict[str, Any]]):
+        # Eliminaciones por prefijo de cuenta
+        prefijos = tuple(self.prefijos_eliminacion)
+        es_eliminada = consolidado['GT_CUENTA'].str.startswith(prefijos) if prefijos else False
+        consolidado['Eliminaciones'] = consolidado['Saldo'].where(es_eliminada, 0.0)
+        consolidado['Saldo_Consolidado'] = consolidado['Saldo'] - consolidado['Eliminaciones']
+        consolidado = consolidado.round(2)
+
+        por_sociedad = pd.concat(saldos_sociedad, axis=1).fillna(0).sort_index().round(2)
+        por_sociedad.index.name = 'GT_CUENTA'
+        por_sociedad = por_sociedad.reset_index()
+
+        resumen_eliminaciones = pd.DataFrame([
+            {
+                'Prefijo': prefijo,
+                'Cuentas': int(consolidado['GT_CUENTA'].str.startswith(prefijo).sum()),
+                'Saldo_Eliminado': round(consolidado.loc[consolidado['GT_CUENTA'].str.startswith(prefijo), 'Saldo'].sum(), 2)
+            }
+            for prefijo in self.prefijos_eliminacion
+        ], columns=['Prefijo', 'Cuentas', 'Saldo_Eliminado'])
+
+        with pd.ExcelWriter(ruta_reporte, engine='openpyxl') as writer:
+            for nombre_hoja, df in [('Balance_Grupo', consolidado),
+                                    ('Saldo_Por_Sociedad', por_sociedad),
+                                    ('Eliminaciones', resumen_eliminaciones)]:
+                df.to_excel(writer, sheet_name=nombre_hoja, index=False)
+                worksheet = writer.sheets[nombre_hoja]
+                worksheet.column_dimensions['A'].width = 20
+                for columna in worksheet.iter_cols(min_row=2, min_col=2):
+                    for celda in columna:
+                        if isinstance(celda.value, float):
+                            celda.number_format = '#,##0.00'
+
+        print(f"✅ Consolidación de grupo generada: {ruta_reporte} "
+              f"({len(consolidado)} cuentas, {len(saldos_sociedad)} sociedades)")
+        return ruta_reporte
+
+    def generar_reporte_excel(self, datos_reporte: List[Dict[str, Any]], guardado: GuardadoSegundoPlano = None):
         """
         Genera un reporte Excel con los importes finales de debe y haber por sociedad.
+        Los importes se guardan como números con formato de celda '#,##0.00'.
 
         Args:
             datos_reporte: Lista de diccionarios con información de cada sociedad
+            guardado: Guardado en segundo plano opcional; si se indica, el archivo se
+                escribe en otro hilo y este método vuelve sin esperar (el aviso de
+                reporte generado se muestra cuando termina, en guardado.cerrar())
         """
-        # Crear DataFrame
-        df = pd.DataFrame(datos_reporte)
+        # Crear DataFrame ordenado por sociedad
+        df = pd.DataFrame(datos_reporte, columns=['Sociedad', 'Debe', 'Haber']).sort_values('Sociedad')
+
+        wb = Workbook()
+        ws = wb.active
+        ws.title = 'Importes Finales'
+
+        ws.append(list(df.columns))
+        for celda in ws[1]:
+            celda.font = Font(bold=True)
 
-        # Ordenar por sociedad
-        df = df.sort_values('Sociedad')
+        for sociedad, debe, haber in df.itertuples(index=False):
+            ws.append([sociedad, round(float(debe), 2), round(float(haber), 2)])
+            for celda in ws[ws.max_row][1:]:
+                celda.number_format = '#,##0.00'
 
-        # Formatear números
-        df['Debe'] = df['Debe'].apply(lambda x: f"{x:,.2f}")
-        df['Haber'] = df['Haber'].apply(lambda x: f"{x:,.2f}")
+        # Ajustar ancho de columnas
+        ws.column_dimensions['A'].width = 35
+        ws.column_dimensions['B'].width = 20
+        ws.column_dimensions['C'].width = 20
 
-        # Guardar en Excel
         ruta_reporte = self.ruta_datos_tratados / 'reporte_importes_finales.xlsx'
 
-        # Usar ExcelWriter para mejor formato
-        with pd.ExcelWriter(ruta_reporte, engine='openpyxl') as writer:
-            df.to_excel(writer, sheet_name='Importes Finales', index=False)
+        def al_terminar(error: Optional[Exception]):
+            # Si falla, GuardadoSegundoPlano ya muestra el error
+            if error is None:
+                print(f"\n✅ Reporte Excel generado: {ruta_reporte}")
 
-            # Ajustar ancho de columnas
-            worksheet = writer.sheets['Importes Finales']
-            worksheet.column_dimensions['A'].width = 35
-            worksheet.column_dimensions['B'].width = 20
-            worksheet.column_dimensions['C'].width = 20
+        if guardado is not None:
+            guardado.guardar(wb, ruta_reporte, al_terminar)
+        else:
+            wb.save(ruta_reporte)
+            al_terminar(None)
 
-        print(f"\n✅ Reporte Excel generado: {ruta_reporte}")
         return ruta_reporte
 
     def procesar_todo(self):
@@ -512,28 +1704,64 @@ class ProcesadorDatos:
         total_stats = {'ld': 0, 'sys': 0, 'errores': 0, 'sociedades': 0}
         datos_reporte = []
 
+        if not self.reanudar:
+            # Ejecución completa: se empieza un checkpoint nuevo
+            self.checkpoint = {'unidades': {}, 'sociedades': {}}
+
         for sociedad_info in self.estructura['sociedades']:
             nombre_sociedad = sociedad_info['sociedad']
             nombre_normalizado = self.normalizar_nombre_sociedad(nombre_sociedad)
+            huella = self.huella_unidad(self.archivos_fuente_sociedad(sociedad_info))
+
+            completada = self.checkpoint['sociedades'].get(nombre_sociedad)
+            if self.reanudar and completada and completada['huella'] == huella:
+                if self.salidas_sociedad_presentes(nombre_normalizado):
+                    print(f"\n⏭️  {nombre_sociedad} ya procesada en una ejecución anterior, se omite")
+                    for clave in ('ld', 'sys', 'errores'):
+                        total_stats[clave] += completada['stats'][clave]
+                    total_stats['sociedades'] += 1
+                    datos_reporte.append({
+                        'Sociedad': nombre_sociedad,
+                        'Debe': completada['totales']['debe'],
+                        'Haber': completada['totales']['haber']
+                    })
+                    continue
+                print(f"\n⚠️  {nombre_sociedad} ya procesada, pero faltan archivos de salida: se vuelve a procesar")
 
             try:
-                stats = self.procesar_sociedad(sociedad_info)
-                total_stats['ld'] += stats['ld']
-                total_stats['sys'] += stats['sys']
-                total_stats['errores'] += stats['errores']
-                total_stats['sociedades'] += 1
-
-                # Calcular totales de debe y haber para el reporte
-                totales = self.calcular_totales_sociedad(nombre_sociedad, nombre_normalizado)
+                with perfilar('process', nombre_normalizado, self.carpeta_perfiles):
+                    stats = self.procesar_sociedad(sociedad_info)
+                    total_stats['ld'] += stats['ld']
+                    total_stats['sys'] += stats['sys']
+                    total_stats['errores'] += stats['errores']
+                    total_stats['sociedades'] += 1
+
+                    # Calcular totales de debe y haber para el reporte
+                    totales = self.calcular_totales_sociedad(nombre_sociedad, nombre_normalizado)
+
+                    if self.receptor is not None:
+                        # Modo pipeline: generar ya la totalidad con los grupos recibidos
+                        self.receptor.terminar_sociedad(nombre_normalizado)
                 datos_reporte.append({
                     'Sociedad': nombre_sociedad,
                     'Debe': totales['debe'],
                     'Haber': totales['haber']
                 })
 
+                if self.escribir_csv:
+                    self.checkpoint['sociedades'][nombre_sociedad] = {
+                        'huella': huella,
+                        'stats': stats,
+                        'totales': {'debe': float(totales['debe']), 'haber': float(totales['haber'])},
+                        'completada': datetime.now().isoformat(timespec='seconds')
+                    }
+                    self.guardar_checkpoint()
+
             except Exception as e:
                 print(f"❌ Error procesando {sociedad_info['sociedad']}: {e}")
                 total_stats['errores'] += 1
+                if self.receptor is not None:
+                    self.receptor.descartar_sociedad(nombre_normalizado)
                 # Agregar al reporte con valores en 0
                 datos_reporte.append({
                     'Sociedad': nombre_sociedad,
@@ -554,18 +1782,25 @@ class ProcesadorDatos:
         print("\n" + "="*70)
         print("📊 GENERANDO REPORTE DE IMPORTES FINALES")
         print("="*70)
-        self.generar_reporte_excel(datos_reporte)
+        # El reporte se escribe en segundo plano mientras se calcula la consolidación
+        guardado = GuardadoSegundoPlano()
+        self.generar_reporte_excel(datos_reporte, guardado)
+
+        # Consolidación de grupo por cuenta
+        try:
+            print("\n" + "="*70)
+            print("🏢 GENERANDO CONSOLIDACIÓN DE GRUPO")
+            print("="*70)
+            self.generar_consolidacion_grupo()
+        finally:
+            guardado.cerrar()
 
 
 def main():
-    """Función principal."""
-    procesador = ProcesadorDatos(
-        ruta_estructura_json='estructura_json.json',
-        ruta_datos_originales='datos_originales',
-        ruta_datos_tratados='datos_tratados'
-    )
-
-    procesador.procesar_todo()
+    """Función principal. Equivale a 'python hotusa.py process'."""
+    import hotusa
+
+    hotusa.main(['process'] + sys.argv[1:], prog='procesar_datos.py')
 
 
 if __name__ == '__main__':
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Informe de progreso (bytes, líneas por segundo, MB/s y tiempo restante) de la lectura y
+el parseo de archivos grandes.
+
+El coste en los bucles es mínimo: la lectura informa una vez por bloque leído del disco
+y el parseo recorre las líneas por bloques de LINEAS_POR_BLOQUE, así que el reloj solo se
+consulta entre bloques y nunca por línea. Como mucho se imprime una línea cada
+'intervalo' segundos; un archivo que se procesa antes del primer intervalo no imprime nada.
+"""
+
+import io
+import time
+from itertools import chain, islice
+from pathlib import Path
+from typing import IO, Iterator, Optional, Sequence
+
+
+# Segundos mínimos entre dos informes de progreso del mismo archivo
+INTERVALO_PROGRESO = 5.0
+
+# Líneas parseadas entre dos consultas del reloj
+LINEAS_POR_BLOQUE = 16_384
+
+
+def formatear_duracion(segundos: float) -> str:
+    """Duración como m:ss o h:mm:ss."""
+    minutos, segundos = divmod(int(segundos), 60)
+    horas, minutos = divmod(minutos, 60)
+    return f"{horas}:{minutos:02d}:{segundos:02d}" if horas else f"{minutos}:{segundos:02d}"
+
+
+class Progreso:
+    """Progreso de una etapa (lectura, parseo) de un archivo frente a su tamaño en disco."""
+
+    def __init__(self, nombre: str, total_bytes: int, etapa: str, intervalo: float = INTERVALO_PROGRESO):
+        """
+        Args:
+            nombre: Nombre del archivo en los informes
+            total_bytes: Tamaño del archivo (stat)
+            etapa: Etapa que se mide (ej: 'lectura', 'parseo')
+            intervalo: Segundos mínimos entre informes
+        """
+        self.nombre = nombre
+        self.total_bytes = max(int(total_bytes), 1)
+        self.etapa = etapa
+        self.intervalo = intervalo
+        self.inicio = time.monotonic()
+        self.siguiente_informe = self.inicio + intervalo
+        self.informes = 0
+
+    def avanzar(self, bytes_procesados: int, lineas: Optional[int] = None):
+        """Registra la posición alcanzada e informa si ha pasado el intervalo."""
+        ahora = time.monotonic()
+        if ahora < self.siguiente_informe:
+            return
+        self.siguiente_informe = ahora + self.intervalo
+        self.informes += 1
+
+        transcurrido = ahora - self.inicio
+        fraccion = min(bytes_procesados / self.total_bytes, 1.0)
+        partes = [f"{bytes_procesados / 1024 / 1024:.1f}/{self.total_bytes / 1024 / 1024:.1f} MB "
+                  f"({fraccion:.0%})",
+                  f"{bytes_procesados / 1024 / 1024 / transcurrido:.1f} MB/s"]
+        if lineas is not None:
+            partes.append(f"{lineas / transcurrido:,.0f} líneas/s".replace(',', '.'))
+        if fraccion > 0:
+            partes.append(f"ETA {formatear_duracion(transcurrido * (1 - fraccion) / fraccion)}")
+        print(f"   ⏳ {self.nombre} ({self.etapa}): {' · '.join(partes)}", flush=True)
+
+    def terminar(self, lineas: Optional[int] = None):
+        """Resumen final, solo si el archivo tardó lo bastante como para informar antes."""
+        if not self.informes:
+            return
+        transcurrido = max(time.monotonic() - self.inicio, 1e-9)
+        partes = [f"{self.total_bytes / 1024 / 1024:.1f} MB en {formatear_duracion(transcurrido)}",
+                  f"{self.total_bytes / 1024 / 1024 / transcurrido:.1f} MB/s"]
+        if lineas is not None:
+            partes.append(f"{lineas / transcurrido:,.0f} líneas/s".replace(',', '.'))
+        print(f"   ⏱️  {self.nombre} ({self.etapa}): {' · '.join(partes)}", flush=True)
+
+    def recorrer(self, lineas: Sequence[str], inicio: int = 0) -> Iterator[str]:
+        """
+        Recorre lineas[inicio:] informando entre bloques. Los bytes parseados se estiman
+        como la fracción de líneas recorridas del tamaño del archivo.
+        """
+        total = len(lineas)
+
+        def bloques():
+            for desde in range(inicio, total, LINEAS_POR_BLOQUE):
+                self.avanzar(self.total_bytes * desde // total, desde - inicio)
+                yield lineas[desde:desde + LINEAS_POR_BLOQUE]
+            self.terminar(total - inicio)
+
+        return chain.from_iterable(bloques())
+
+
+def recorrer_lineas(lineas: Sequence[str], inicio: int, progreso: Optional[Progreso] = None) -> Iterator[str]:
+    """lineas[inicio:] sin copiarlas, con informe de progreso si se indica."""
+    if progreso is None:
+        return islice(lineas, inicio, None)
+    return progreso.recorrer(lineas, inicio)
+
+
+class LecturaConProgreso(io.RawIOBase):
+    """
+    Archivo binario de solo lectura que informa de los bytes leídos del disco. Si está
+    comprimido, el progreso es el de los bytes comprimidos frente al tamaño del archivo.
+    """
+
+    def __init__(self, ruta: Path, progreso: Progreso):
+        super().__init__()
+        self.archivo = open(ruta, 'rb', buffering=0)
+        self.progreso = progreso
+        self.leidos = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, destino) -> int:
+        leidos = self.archivo.readinto(destino)
+        if leidos:
+            self.leidos += leidos
+            self.progreso.avanzar(self.leidos)
+        return leidos
+
+    def close(self):
+        if not self.closed:
+            self.archivo.close()
+            self.progreso.terminar()
+        super().close()
+
+
+def abrir_lectura(ruta: Path, etapa: str = 'lectura', intervalo: Optional[float] = INTERVALO_PROGRESO,
+                  encoding: Optional[str] = None) -> IO:
+    """
+    Abre un archivo para lectura (binaria, o de texto si se indica encoding) informando
+    del progreso cada 'intervalo' segundos. Con intervalo None o 0 es un open() normal.
+    """
+    ruta = Path(ruta)
+    if not intervalo:
+        return open(ruta, 'rb') if encoding is None else open(ruta, 'r', encoding=encoding)
+
+    progreso = Progreso(ruta.name, ruta.stat().st_size, etapa, intervalo)
+    binario = io.BufferedReader(LecturaConProgreso(ruta, progreso))
+    return binario if encoding is None else io.TextIOWrapper(binario, encoding=encoding)
@@ -0,0 +1,314 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Servicio local de consultas sobre datos_tratados (hotusa.py serve).
+
+Mantiene en memoria los datos de las sociedades consultadas más recientemente (líneas del
+libro diario, sumas y saldos y resumen por cuenta) y expulsa la menos usada (LRU) cuando
+se supera el límite de memoria. Una sociedad solo se vuelve a cargar si cambian sus CSV
+(misma huella de entradas que la caché de generar_totalidad.py).
+
+Solo escucha en localhost. Todas las respuestas son JSON.
+
+Consultas (GET):
+    /sociedades                              Sociedades disponibles y si están en caché
+    /saldo?sociedad=S&cuenta=C               Libro diario, sumas y saldos y diferencia de una cuenta
+    /asiento?sociedad=S&asiento=N            Líneas de un asiento con todas sus columnas
+    /conciliacion?sociedad=S[&todas=1]       Validación de totalidad y cuentas con diferencia
+    /nivel?sociedad=S&digitos=D[&prefijo=P]  Totales por prefijo de cuenta (ver cubo_cuentas.py)
+    /estado                                  Sociedades en caché y memoria ocupada
+"""
+
+import json
+import threading
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Tuple
+from urllib.parse import parse_qs, urlparse
+
+import pandas as pd
+
+from cubo_cuentas import construir_cubo, nivel
+from generar_totalidad import GeneradorTotalidad, concatenar_libro_diario
+
+
+# Puerto por defecto del servicio
+PUERTO_POR_DEFECTO = 8765
+
+# Memoria máxima por defecto (MB) de los datos de sociedades en caché
+CACHE_MAX_MB = 2048
+
+# Una columna de texto pasa a categórica si tiene menos valores distintos que esta fracción de filas
+FRACCION_CATEGORICA = 0.5
+
+
+class ErrorConsulta(Exception):
+    """Error de una consulta, con el código HTTP que se devuelve."""
+
+    def __init__(self, mensaje: str, codigo: int = 400):
+        super().__init__(mensaje)
+        self.codigo = codigo
+
+
+class DatosSociedad:
+    """Datos de una sociedad cargados en memoria para responder consultas."""
+
+    def __init__(self, nombre: str, huella: str, df_diario: pd.DataFrame, df_sumas: pd.DataFrame,
+                 resumen_cuenta: pd.DataFrame, validacion: Tuple[bool, int]):
+        self.nombre = nombre
+        self.huella = huella
+        self.df_diario = df_diario
+        self.df_sumas = df_sumas
+        self.resumen_cuenta = resumen_cuenta
+        self.validacion_exitosa, self.no_cumplen = validacion
+        self.cubo = construir_cubo(resumen_cuenta.reset_index())
+        self.bytes_memoria = int(sum(df.memory_usage(deep=True).sum()
+                                     for df in (df_diario, df_sumas, resumen_cuenta)))
+        self.cargada = time.strftime('%Y-%m-%dT%H:%M:%S')
+
+
+class CacheSociedades:
+    """
+    Caché LRU de DatosSociedad limitada por memoria. Es segura entre hilos: las cargas se
+    hacen bajo un cerrojo y los DataFrames cargados no se modifican después.
+    """
+
+    def __init__(self, generador: GeneradorTotalidad, cache_max_mb: int = CACHE_MAX_MB):
+        """
+        Args:
+            generador: Generador de totalidad (rutas, mapeo de columnas y cálculo del resumen)
+            cache_max_mb: Memoria máxima (MB) de los datos en caché. La sociedad recién
+                cargada se conserva aunque ella sola supere el límite
+        """
+        self.generador = generador
+        self.limite_bytes = int(cache_max_mb) * 1024 * 1024
+        self.sociedades = OrderedDict()
+        self.cerrojo = threading.Lock()
+        self.aciertos = 0
+        self.cargas = 0
+
+    def archivos_por_sociedad(self) -> Dict[str, Dict[str, List]]:
+        return self.generador.buscar_archivos_por_sociedad()
+
+    def obtener(self, nombre_sociedad: str) -> DatosSociedad:
+        """Devuelve los datos de una sociedad, cargándolos si no están o si sus CSV cambiaron."""
+        archivos = self.archivos_por_sociedad().get(nombre_sociedad)
+        if archivos is None:
+            raise ErrorConsulta(f"Sociedad no encontrada: {nombre_sociedad}", 404)
+        huella = self.generador.huella_entradas(archivos)
+
+        with self.cerrojo:
+            datos = self.sociedades.get(nombre_sociedad)
+            if datos is not None and datos.huella == huella:
+                self.sociedades.move_to_end(nombre_sociedad)
+                self.aciertos += 1
+                return datos
+
+            datos = self.cargar(nombre_sociedad, archivos, huella)
+            self.sociedades[nombre_sociedad] = datos
+            self.sociedades.move_to_end(nombre_sociedad)
+            self.cargas += 1
+            self.expulsar()
+            return datos
+
+    def cargar(self, nombre_sociedad: str, archivos: Dict[str, List], huella: str) -> DatosSociedad:
+        """Lee los CSV de una sociedad y calcula su resumen por cuenta."""
+        inicio = time.perf_counter()
+        generador = self.generador
+
+        partes = [next(generador.leer_lotes_libro_diario(archivo, todas_las_columnas=True))
+                  for archivo in archivos.get('libro_diario', [])]
+        df_diario = compactar(concatenar_libro_diario(partes)) if partes else pd.DataFrame()
+        df_sumas = generador.procesar_sumas_saldos(archivos.get('sumas_saldos', []))
+
+        if df_diario.empty or df_sumas.empty:
+            raise ErrorConsulta(f"{nombre_sociedad}: faltan datos de libro diario o de sumas y saldos", 409)
+
+        resumen_cuenta = generador.calcular_resumen_cuenta(df_diario, df_sumas)
+        resumen_cuenta['GT_CUENTA'] = resumen_cuenta['GT_CUENTA'].astype(str)
+        datos = DatosSociedad(nombre_sociedad, huella, df_diario, df_sumas,
+                              resumen_cuenta.set_index('GT_CUENTA'),
+                              generador.evaluar_validacion(resumen_cuenta))
+
+        print(f"📄 {nombre_sociedad} cargada: {len(df_diario)} líneas, "
+              f"{datos.bytes_memoria / 1024 / 1024:.1f} MB ({time.perf_counter() - inicio:.2f}s)")
+        return datos
+
+    def expulsar(self):
+        """Expulsa las sociedades menos usadas hasta volver a estar dentro del límite."""
+        while len(self.sociedades) > 1 and self.bytes_memoria() > self.limite_bytes:
+            nombre, _ = self.sociedades.popitem(last=False)
+            print(f"♻️  {nombre} expulsada de la caché")
+
+    def bytes_memoria(self) -> int:
+        return sum(datos.bytes_memoria for datos in self.sociedades.values())
+
+    def estado(self) -> Dict[str, Any]:
+        """Sociedades en caché (de la menos a la más usada) y contadores."""
+        with self.cerrojo:
+            return {
+                'sociedades': [{'sociedad': datos.nombre, 'mb': round(datos.bytes_memoria / 1024 / 1024, 1),
+                                'cargada': datos.cargada} for datos in self.sociedades.values()],
+                'mb_usados': round(self.bytes_memoria() / 1024 / 1024, 1),
+                'mb_limite': round(self.limite_bytes / 1024 / 1024, 1),
+                'aciertos': self.aciertos,
+                'cargas': self.cargas
+            }
+
+    def en_cache(self) -> List[str]:
+        with self.cerrojo:
+            return list(self.sociedades)
+
+
+def compactar(df: pd.DataFrame) -> pd.DataFrame:
+    """Convierte a categóricas las columnas de texto repetitivas (Soc., Mon., Cl., Usuario...)."""
+    for columna in df.columns:
+        serie = df[columna]
+        if (serie.dtype == object or pd.api.types.is_string_dtype(serie.dtype)) \
+                and not isinstance(serie.dtype, pd.CategoricalDtype) \
+                and serie.nunique(dropna=True) < FRACCION_CATEGORICA * len(serie):
+            df[columna] = serie.astype('category')
+    return df
+
+
+def filas_json(df: pd.DataFrame) -> List[Dict[str, Any]]:
+    """Filas de un DataFrame como diccionarios serializables (NaN -> null)."""
+    return df.astype(object).where(df.notna(), None).to_dict('records')
+
+
+def redondear(valores: Dict[str, Any]) -> Dict[str, Any]:
+    return {clave: round(float(valor), 2) for clave, valor in valores.items()}
+
+
+def parametro(consulta: Dict[str, List[str]], nombre: str) -> str:
+    valores = consulta.get(nombre)
+    if not valores or not valores[0]:
+        raise ErrorConsulta(f"Falta el parámetro '{nombre}'")
+    return valores[0]
+
+
+def consultar_sociedades(cache: CacheSociedades, consulta: Dict[str, List[str]]) -> Dict[str, Any]:
+    en_cache = set(cache.en_cache())
+    return {'sociedades': [{'sociedad': nombre, 'en_cache': nombre in en_cache}
+                           for nombre in sorted(cache.archivos_por_sociedad())]}
+
+
+def consultar_saldo(cache: CacheSociedades, consulta: Dict[str, List[str]]) -> Dict[str, Any]:
+    datos = cache.obtener(parametro(consulta, 'sociedad'))
+    cuenta = parametro(consulta, 'cuenta')
+    if cuenta not in datos.resumen_cuenta.index:
+        raise ErrorConsulta(f"Cuenta no encontrada en {datos.nombre}: {cuenta}", 404)
+
+    fila = datos.resumen_cuenta.loc[cuenta]
+    return {'sociedad': datos.nombre, 'cuenta': cuenta,
+            **redondear(fila.to_dict()),
+            'cumple': bool(abs(fila['GT_DIFERENCIA']) < 0.01)}
+
+
+def consultar_asiento(cache: CacheSociedades, consulta: Dict[str, List[str]]) -> Dict[str, Any]:
+    datos = cache.obtener(parametro(consulta, 'sociedad'))
+    asiento = parametro(consulta, 'asiento')
+    lineas = datos.df_diario[datos.df_diario['GT_ASIENTO'] == asiento]
+    if lineas.empty:
+        raise ErrorConsulta(f"Asiento no encontrado en {datos.nombre}: {asiento}", 404)
+
+    return {'sociedad': datos.nombre, 'asiento': asiento,
+            **redondear(lineas[['GT_DEBE', 'GT_HABER', 'GT_IMPORTE_MONEDA_LOCAL']].sum().to_dict()),
+            'lineas': filas_json(lineas)}
+
+
+def consultar_conciliacion(cache: CacheSociedades, consulta: Dict[str, List[str]]) -> Dict[str, Any]:
+    datos = cache.obtener(parametro(consulta, 'sociedad'))
+    resumen = datos.resumen_cuenta
+    if consulta.get('todas', ['0'])[0] not in ('1', 'true', 'si', 'sí'):
+        resumen = resumen[abs(resumen['GT_DIFERENCIA']) >= 0.01]
+
+    return {'sociedad': datos.nombre, 'validacion_exitosa': datos.validacion_exitosa,
+            'no_cumplen': datos.no_cumplen, 'cuentas': len(datos.resumen_cuenta),
+            'resumen_por_cuenta': filas_json(resumen.reset_index())}
+
+
+def consultar_nivel(cache: CacheSociedades, consulta: Dict[str, List[str]]) -> Dict[str, Any]:
+    datos = cache.obtener(parametro(consulta, 'sociedad'))
+    digitos = parametro(consulta, 'digitos')
+    if not digitos.isdigit() or int(digitos) < 1:
+        raise ErrorConsulta(f"'digitos' debe ser un entero positivo: {digitos}")
+    prefijo = consulta.get('prefijo', [''])[0] or None
+
+    return {'sociedad': datos.nombre, 'digitos': int(digitos), 'prefijo': prefijo,
+            'niveles': filas_json(nivel(datos.cubo, int(digitos), prefijo))}
+
+
+def consultar_estado(cache: CacheSociedades, consulta: Dict[str, List[str]]) -> Dict[str, Any]:
+    return cache.estado()
+
+
+# Ruta de cada consulta -> función que la responde
+CONSULTAS = {
+    '/sociedades': consultar_sociedades,
+    '/saldo': consultar_saldo,
+    '/asiento': consultar_asiento,
+    '/conciliacion': consultar_conciliacion,
+    '/nivel': consultar_nivel,
+    '/estado': consultar_estado,
+}
+
+
+class ManejadorConsultas(BaseHTTPRequestHandler):
+    """Responde las consultas GET con la caché del servidor (self.server.cache)."""
+
+    def do_GET(self):
+        inicio = time.perf_counter()
+        url = urlparse(self.path)
+        funcion = CONSULTAS.get(url.path.rstrip('/') or '/')
+
+        try:
+            if funcion is None:
+                raise ErrorConsulta(f"Consulta desconocida: {url.path} (disponibles: {', '.join(CONSULTAS)})", 404)
+            codigo, respuesta = 200, funcion(self.server.cache, parse_qs(url.query))
+        except ErrorConsulta as e:
+            codigo, respuesta = e.codigo, {'error': str(e)}
+        except Exception as e:
+            codigo, respuesta = 500, {'error': f"{type(e).__name__}: {e}"}
+
+        cuerpo = json.dumps(respuesta, ensure_ascii=False, default=str).encode('utf-8')
+        self.send_response(codigo)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(cuerpo)))
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+        simbolo = "✅" if codigo == 200 else "❌"
+        print(f"{simbolo} {codigo} {self.path} ({(time.perf_counter() - inicio) * 1000:.0f} ms)")
+
+    def log_message(self, formato, *args):
+        # El registro de cada consulta ya se imprime en do_GET
+        pass
+
+
+def servir(ruta_datos_tratados: str, puerto: int = PUERTO_POR_DEFECTO, cache_max_mb: int = CACHE_MAX_MB,
+           ruta_salida: str = 'totalidad'):
+    """
+    Arranca el servicio en 127.0.0.1:puerto hasta Ctrl+C.
+
+    Args:
+        ruta_datos_tratados: Carpeta con los CSV procesados
+        puerto: Puerto local
+        cache_max_mb: Memoria máxima de la caché de sociedades
+        ruta_salida: Carpeta de totalidad (solo para el generador; no se escribe nada)
+    """
+    generador = GeneradorTotalidad(ruta_datos_tratados=ruta_datos_tratados, ruta_salida=ruta_salida,
+                                   usar_cache=False)
+    servidor = ThreadingHTTPServer(('127.0.0.1', puerto), ManejadorConsultas)
+    servidor.daemon_threads = True
+    servidor.cache = CacheSociedades(generador, cache_max_mb)
+
+    print(f"🔎 Servicio de consultas en http://127.0.0.1:{servidor.server_address[1]} "
+          f"(caché de {cache_max_mb} MB, Ctrl+C para terminar)")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        print("\n⏹️  Servicio detenido")
+    finally:
+        servidor.server_close()
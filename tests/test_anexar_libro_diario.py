@@ -0,0 +1,66 @@
+"""Anexar un trimestre con --resume da el mismo libro diario que reconstruir el año."""
+
+from pathlib import Path
+
+from procesar_datos import ProcesadorDatos
+
+
+CABECERA = '\tSoc.\tNº doc.\tEjerc.\tFecha doc.\tRegistrado\tReferencia\tNúmero'
+DETALLE = '\t\tPos\tCuenta\tLib.mayor\tTexto\tDebe moneda local\tHaber moneda local'
+
+
+def escribir_ld(ruta: Path, asientos):
+    """Libro diario SAP (UTF-16) con asientos (Nº doc., fecha, importe): dos líneas cada uno."""
+    lineas = ['SOCIEDAD X   Libro diario', 'MADRID   Página 1', '', CABECERA, DETALLE, '']
+    for documento, fecha, importe in asientos:
+        lineas += [f'\tBE00\t{documento}\t2025\t{fecha}\t{fecha}\tREF{documento}\t{documento}',
+                   f'\t\t1\t57200001\t57200001\tLinea\t{importe}\t',
+                   f'\t\t2\t70000000\t70000000\tContra\t\t{importe}',
+                   '']
+    ruta.parent.mkdir(parents=True, exist_ok=True)
+    ruta.write_text('﻿' + '\n'.join(lineas) + '\n', encoding='utf-16-le')
+
+
+def procesar(originales: Path, tratados: Path, archivos, reanudar: bool):
+    procesador = ProcesadorDatos(None, str(originales), str(tratados), reanudar=reanudar,
+                                 intervalo_progreso=None)
+    stats = {'ld': 0, 'sys': 0, 'errores': 0}
+    procesador.procesar_grupo(archivos, 'LD', tratados / 'BE', '2025', stats)
+    return procesador
+
+
+def test_anexar_igual_que_reconstruir_con_clave_repetida_en_un_archivo(tmp_path, monkeypatch):
+    originales = tmp_path / 'originales'
+    t1 = originales / 'LD 1T 2025.XLS'
+    t2 = originales / 'LD 2T 2025.XLS'
+    # El documento 1 aparece dos veces en el primer trimestre (mismas posiciones): ambas se
+    # conservan. El segundo trimestre repite el documento 2, que sí se descarta.
+    escribir_ld(t1, [('1', '10.01.2025', '100,00'), ('1', '11.01.2025', '200,00'), ('2', '12.02.2025', '300,00')])
+    escribir_ld(t2, [('2', '12.02.2025', '300,00'), ('3', '05.04.2025', '400,00')])
+
+    parseados = []
+    procesar_ld = ProcesadorDatos.procesar_ld
+
+    def registrar_parseo(self, ruta_archivo, *args, **kwargs):
+        parseados.append(ruta_archivo.name)
+        return procesar_ld(self, ruta_archivo, *args, **kwargs)
+
+    monkeypatch.setattr(ProcesadorDatos, 'procesar_ld', registrar_parseo)
+
+    anexado = tmp_path / 'anexado'
+    procesar(originales, anexado, [t1], reanudar=True)
+    parseados.clear()
+    procesar(originales, anexado, [t1, t2], reanudar=True)
+    # La segunda ejecución anexó el trimestre nuevo sin volver a leer el primero
+    assert parseados == [t2.name]
+
+    reconstruido = tmp_path / 'reconstruido'
+    procesar(originales, reconstruido, [t1, t2], reanudar=False)
+
+    for nombre in ('libro_diario_2025.csv', 'resumen_asientos_2025.csv', 'indice_periodos_2025.json'):
+        assert (anexado / 'BE' / nombre).read_bytes() == (reconstruido / 'BE' / nombre).read_bytes(), nombre
+
+    lineas = (reconstruido / 'BE' / 'libro_diario_2025.csv').read_text(encoding='utf-8-sig').splitlines()
+    assert len(lineas) == 1 + 8
+    assert (anexado / 'BE' / 'huellas_diario_2025.bin').exists()
+    assert not (reconstruido / 'BE' / 'huellas_diario_2025.bin').exists()
@@ -0,0 +1,49 @@
+"""Los totales por prefijo de cuenta del cubo coinciden con agrupar las cuentas directamente."""
+
+import numpy as np
+import pandas as pd
+
+from cubo_cuentas import COLUMNAS_CUBO, cargar_cubo, construir_cubo, guardar_cubo, nivel, totales_prefijo
+
+
+def resumen_cuenta() -> pd.DataFrame:
+    """Resumen por cuenta desordenado, con una cuenta que no cumple."""
+    cuentas = ['4720001', '1000000', '4300002', '4720000', '5720001', '4300001', '1290000']
+    rng = np.random.default_rng(0)
+    resumen = pd.DataFrame(rng.integers(-10_000, 10_000, (len(cuentas), len(COLUMNAS_CUBO))) / 100,
+                           columns=COLUMNAS_CUBO)
+    resumen['GT_DIFERENCIA'] = 0.0
+    resumen.loc[2, 'GT_DIFERENCIA'] = 5.0
+    resumen.insert(0, 'GT_CUENTA', cuentas)
+    return resumen
+
+
+def test_totales_prefijo_igual_que_filtrar():
+    resumen = resumen_cuenta()
+    cubo = construir_cubo(resumen)
+
+    for prefijo in ['1', '4', '43', '472', '4720001', '6', '']:
+        filas = resumen[resumen['GT_CUENTA'].str.startswith(prefijo)]
+        totales = totales_prefijo(cubo, prefijo)
+        assert totales['Cuentas'] == len(filas)
+        assert totales['No_Cumplen'] == int((filas['GT_DIFERENCIA'].abs() >= 0.01).sum())
+        for columna in COLUMNAS_CUBO:
+            assert totales[columna] == round(filas[columna].sum(), 2), (prefijo, columna)
+
+
+def test_nivel_igual_que_agrupar(tmp_path):
+    resumen = resumen_cuenta()
+    ruta = tmp_path / 'Totalidad_X.cubo.npz'
+    guardar_cubo(construir_cubo(resumen), ruta)
+    cubo = cargar_cubo(ruta)
+
+    grupos = nivel(cubo, 2)
+    esperado = resumen.groupby(resumen['GT_CUENTA'].str[:2])[COLUMNAS_CUBO].sum().round(2)
+    assert grupos['Prefijo'].tolist() == esperado.index.tolist()
+    assert grupos['Cuentas'].tolist() == resumen.groupby(resumen['GT_CUENTA'].str[:2]).size().tolist()
+    np.testing.assert_allclose(grupos[COLUMNAS_CUBO].to_numpy(), esperado.to_numpy())
+
+    # Bajar de nivel dentro de un prefijo
+    subcuentas = nivel(cubo, 4, prefijo='47')
+    assert subcuentas['Prefijo'].tolist() == ['4720']
+    assert subcuentas['Cuentas'].tolist() == [2]
@@ -0,0 +1,65 @@
+"""Deduplicación de líneas de libro diario por (Soc., Nº doc., ejercicio, línea) entre archivos."""
+
+from procesar_datos import ConjuntoHuellas, ProcesadorDatos
+
+
+CABECERA = '\tSoc.\tNº doc.\tEjerc.\tFecha doc.\tRegistrado\tReferencia\tNúmero'
+DETALLE = '\t\tPos\tCuenta\tLib.mayor\tTexto\tDebe moneda local\tHaber moneda local'
+
+
+def lineas_ld(asientos):
+    """Líneas de un libro diario SAP con asientos (Soc., Nº doc., ejercicio, importe) de dos líneas."""
+    lineas = ['SOCIEDAD X   Libro diario', 'MADRID   Página 1', '', CABECERA, DETALLE, '']
+    for sociedad, documento, ejercicio, importe in asientos:
+        lineas += [f'\t{sociedad}\t{documento}\t{ejercicio}\t10.01.{ejercicio}\t10.01.{ejercicio}\tREF\t{documento}',
+                   f'\t\t1\t57200001\t57200001\tLinea\t{importe}\t',
+                   f'\t\t2\t70000000\t70000000\tContra\t\t{importe}',
+                   '']
+    return lineas
+
+
+def parsear(tmp_path, lineas, vistos):
+    """Registros de un archivo deduplicados contra 'vistos', que pasa a incluirlo."""
+    procesador = ProcesadorDatos(None, str(tmp_path), str(tmp_path), intervalo_progreso=None)
+    inicio, cols_cabecera, cols_detalle = procesador.detectar_inicio_datos_ld(lineas)
+    registros = procesador.parsear_ld(lineas, inicio, cols_cabecera, cols_detalle, 'LD.XLS', vistos=vistos)
+    vistos.terminar_archivo()
+    return list(registros)
+
+
+def test_claves_repetidas_en_el_mismo_archivo_se_conservan(tmp_path):
+    vistos = ConjuntoHuellas()
+    registros = parsear(tmp_path, lineas_ld([('BE00', '1', '2025', '100,00'), ('BE00', '1', '2025', '200,00')]), vistos)
+
+    assert len(registros) == 4
+    assert len(vistos) == 2
+
+
+def test_se_omiten_solo_las_claves_de_archivos_anteriores(tmp_path):
+    vistos = ConjuntoHuellas()
+    parsear(tmp_path, lineas_ld([('BE00', '1', '2025', '100,00')]), vistos)
+
+    registros = parsear(tmp_path, lineas_ld([
+        ('BE00', '1', '2025', '100,00'),  # Repetido: se omite
+        ('BE01', '1', '2025', '100,00'),  # Otra sociedad
+        ('BE00', '1', '2024', '100,00'),  # Otro ejercicio
+        ('BE00', '2', '2025', '100,00'),  # Otro documento
+    ]), vistos)
+
+    claves = [(r['cab_Soc.'], r['cab_Nº doc.'], r['cab_Ejerc.'], r['det_Pos']) for r in registros]
+    assert claves == [('BE01', '1', '2025', '1'), ('BE01', '1', '2025', '2'),
+                      ('BE00', '1', '2024', '1'), ('BE00', '1', '2024', '2'),
+                      ('BE00', '2', '2025', '1'), ('BE00', '2', '2025', '2')]
+
+
+def test_huellas_guardadas_se_recuperan(tmp_path):
+    vistos = ConjuntoHuellas()
+    for clave in ('c', 'a', 'b'):
+        vistos.agregar_si_nueva(clave)
+    ruta = tmp_path / 'huellas.bin'
+    vistos.guardar(ruta)
+
+    cargado = ConjuntoHuellas.cargar(ruta)
+    assert list(cargado.ordenadas) == sorted(cargado.ordenadas)
+    assert not cargado.agregar_si_nueva('a')
+    assert cargado.agregar_si_nueva('d')
@@ -0,0 +1,41 @@
+"""Rangos de filas por período de los libros diarios y lectura de solo esos períodos."""
+
+import pandas as pd
+
+from indice_periodos import anexar_indice, construir_indice, leer_csv_periodos, rangos_de_periodos
+
+
+PERIODOS = ['2025-01', '2025-01', '2025-02', '2025-01', '2025-04', '2025-04', '2025-06']
+
+
+def test_rangos_por_periodo():
+    indice = construir_indice(PERIODOS, 'libro_diario_2025.csv')
+
+    assert indice['filas'] == 7
+    assert indice['periodos'] == {'2025-01': [[0, 2], [3, 4]], '2025-02': [[2, 3]],
+                                  '2025-04': [[4, 6]], '2025-06': [[6, 7]]}
+
+
+def test_anexar_igual_que_construir_todo():
+    for corte in range(len(PERIODOS) + 1):
+        indice = construir_indice(PERIODOS[:corte], 'libro_diario_2025.csv')
+        assert anexar_indice(indice, PERIODOS[corte:]) == construir_indice(PERIODOS, 'libro_diario_2025.csv')
+
+
+def test_trimestres_fusionan_rangos_contiguos():
+    indice = construir_indice(PERIODOS, 'libro_diario_2025.csv')
+
+    assert rangos_de_periodos(indice, ['2025-Q1']) == [(0, 4)]
+    assert rangos_de_periodos(indice, ['2025-T2']) == [(4, 7)]
+    assert rangos_de_periodos(indice, ['2025-01', '2025-06']) == [(0, 2), (3, 4), (6, 7)]
+    assert rangos_de_periodos(indice, ['2025-03']) == []
+
+
+def test_leer_solo_las_filas_de_los_periodos(tmp_path):
+    archivo = tmp_path / 'libro_diario_2025.csv'
+    pd.DataFrame({'GT_PERIODO': PERIODOS, 'Fila': range(len(PERIODOS))}).to_csv(archivo, index=False)
+    indice = construir_indice(PERIODOS, archivo.name)
+
+    assert leer_csv_periodos(archivo, indice, ['2025-01', '2025-06'])['Fila'].tolist() == [0, 1, 3, 6]
+    assert leer_csv_periodos(archivo, indice, ['2025-04'])['Fila'].tolist() == [4, 5]
+    assert leer_csv_periodos(archivo, indice, ['2025-03']).empty
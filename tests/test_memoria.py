@@ -0,0 +1,100 @@
+"""Con presupuesto de memoria las estructuras se vuelcan a disco y el resultado no cambia."""
+
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import memoria
+from memoria import AgregadorDesbordable, OrdenacionExterna, PresupuestoMemoria
+from procesar_datos import ProcesadorDatos
+
+
+CABECERA = '\tSoc.\tNº doc.\tEjerc.\tFecha doc.\tRegistrado\tReferencia\tNúmero'
+DETALLE = '\t\tPos\tCuenta\tLib.mayor\tTexto\tDebe moneda local\tHaber moneda local'
+
+
+def presupuesto_minimo(tmp_path: Path) -> PresupuestoMemoria:
+    """Presupuesto que se supera con unos pocos registros."""
+    presupuesto = PresupuestoMemoria(1, str(tmp_path / 'temporal'))
+    presupuesto.limite_bytes = 2_000
+    return presupuesto
+
+
+def test_lista_desbordable_conserva_el_orden(tmp_path):
+    presupuesto = presupuesto_minimo(tmp_path)
+    lista = presupuesto.lista()
+    elementos = [{'fila': str(i), 'texto': f'linea {i}'} for i in range(500)]
+    lista.extend(elementos)
+
+    assert lista.archivos
+    assert list(lista) == elementos
+    assert list(lista) == elementos
+    presupuesto.limpiar()
+
+
+def test_ordenacion_externa_estable(tmp_path, monkeypatch):
+    monkeypatch.setattr(memoria, 'ELEMENTOS_POR_TRAMO', 37)
+    presupuesto = presupuesto_minimo(tmp_path)
+    rng = np.random.default_rng(0)
+    elementos = [(int(clave), i) for i, clave in enumerate(rng.integers(0, 20, 300))]
+
+    ordenacion = OrdenacionExterna(lambda elemento: elemento[0], presupuesto)
+    ordenacion.agregar_tramo(elementos[:120])
+    ordenacion.agregar_tramo(elementos[120:])
+
+    assert len(ordenacion.tramos) > 2
+    assert list(ordenacion) == sorted(elementos, key=lambda elemento: elemento[0])
+    presupuesto.limpiar()
+
+
+def test_agregador_desbordable_igual_que_groupby(tmp_path):
+    presupuesto = presupuesto_minimo(tmp_path)
+    agregador = AgregadorDesbordable('GT_CUENTA', presupuesto)
+    rng = np.random.default_rng(0)
+    lotes = [pd.DataFrame({'GT_CUENTA': rng.integers(0, 50, 100).astype(str), 'GT_DEBE': rng.integers(0, 1000, 100)})
+             for _ in range(12)]
+    for lote in lotes:
+        agregador.agregar(lote)
+
+    assert agregador.particiones is not None
+    esperado = pd.concat(lotes).groupby('GT_CUENTA').sum().reset_index()
+    pd.testing.assert_frame_equal(agregador.resultado(['GT_DEBE']), esperado)
+    presupuesto.limpiar()
+
+
+def escribir_ld(ruta: Path, primer_documento: int, asientos: int):
+    """Libro diario SAP (UTF-16) con asientos de dos líneas en fechas desordenadas."""
+    lineas = ['SOCIEDAD X   Libro diario', 'MADRID   Página 1', '', CABECERA, DETALLE, '']
+    for documento in range(primer_documento, primer_documento + asientos):
+        fecha = f'{documento * 7 % 28 + 1:02d}.0{documento % 3 + 1}.2025'
+        lineas += [f'\tBE00\t{documento}\t2025\t{fecha}\t{fecha}\tREF{documento}\t{documento}',
+                   f'\t\t1\t57200001\t57200001\tLinea {documento}\t{documento},50\t',
+                   f'\t\t2\t70000000\t70000000\tContra\t\t{documento},50',
+                   '']
+    ruta.parent.mkdir(parents=True, exist_ok=True)
+    ruta.write_text('﻿' + '\n'.join(lineas) + '\n', encoding='utf-16-le')
+
+
+def test_libro_diario_igual_con_y_sin_presupuesto(tmp_path, monkeypatch):
+    monkeypatch.setattr(memoria, 'ELEMENTOS_POR_TRAMO', 50)
+    originales = tmp_path / 'originales'
+    archivos = [originales / 'LD 1T 2025.XLS', originales / 'LD 2T 2025.XLS']
+    escribir_ld(archivos[0], 1, 120)
+    escribir_ld(archivos[1], 100, 120)  # Solapa con el primero: se deduplica
+
+    salidas = {}
+    for nombre, memoria_max_mb in (('sin_presupuesto', None), ('con_presupuesto', 1)):
+        tratados = tmp_path / nombre
+        procesador = ProcesadorDatos(None, str(originales), str(tratados), ordenar_diario=True,
+                                     memoria_max_mb=memoria_max_mb, carpeta_temporal=str(tmp_path / 'temporal'),
+                                     intervalo_progreso=None)
+        if procesador.presupuesto:
+            procesador.presupuesto.limite_bytes = 20_000
+        procesador.procesar_grupo(archivos, 'LD', tratados / 'BE', '2025', {'ld': 0, 'sys': 0, 'errores': 0})
+        if procesador.presupuesto:
+            assert procesador.presupuesto.volcados
+        salidas[nombre] = {ruta.name: ruta.read_bytes() for ruta in (tratados / 'BE').iterdir()}
+
+    assert salidas['con_presupuesto'] == salidas['sin_presupuesto']
+    assert 'libro_diario_2025.csv' in salidas['sin_presupuesto']
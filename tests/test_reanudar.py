@@ -0,0 +1,54 @@
+"""--resume omite las unidades terminadas y vuelve a procesar las que perdieron su salida."""
+
+from pathlib import Path
+
+from procesar_datos import ProcesadorDatos
+
+
+CABECERA = '\tSoc.\t\tCta.mayor\t\tTexto explicativo\tMon.\tArrastre de saldos\tSaldo acumulado'
+
+
+def escribir_sys(ruta: Path):
+    """Informe de saldos SAP (UTF-16) con dos cuentas."""
+    lineas = ['SOCIEDAD X   Saldos de cuentas de mayor', '', CABECERA, '',
+              '\tBE00\t\t10000000\t\tCapital social\tEUR\t-3.050,00\t-3.050,00',
+              '\tBE00\t\t57200001\t\tBancos\tEUR\t3.050,00\t3.050,00']
+    ruta.parent.mkdir(parents=True, exist_ok=True)
+    ruta.write_text('﻿' + '\n'.join(lineas) + '\n', encoding='utf-16-le')
+
+
+def test_reanudar_vuelve_a_procesar_unidades_sin_salida(tmp_path, monkeypatch):
+    originales = tmp_path / 'originales'
+    tratados = tmp_path / 'tratados'
+    fuente = originales / 'SYS 2025.XLS'
+    escribir_sys(fuente)
+
+    parseados = []
+    procesar_sys = ProcesadorDatos.procesar_sys
+
+    def registrar_parseo(self, ruta_archivo):
+        parseados.append(ruta_archivo.name)
+        return procesar_sys(self, ruta_archivo)
+
+    monkeypatch.setattr(ProcesadorDatos, 'procesar_sys', registrar_parseo)
+
+    def ejecutar():
+        procesador = ProcesadorDatos(None, str(originales), str(tratados), reanudar=True, intervalo_progreso=None)
+        stats = {'ld': 0, 'sys': 0, 'errores': 0}
+        procesador.procesar_grupo([fuente], 'SYS', tratados / 'BE', '2025', stats)
+        assert stats['sys'] == 1
+
+    salida = tratados / 'BE' / 'sumas_saldos_2025.csv'
+    ejecutar()
+    contenido = salida.read_bytes()
+    assert parseados == [fuente.name]
+
+    # Terminada y con su salida: no se vuelve a leer
+    ejecutar()
+    assert parseados == [fuente.name]
+
+    # Terminada según el checkpoint pero sin salida: se reprocesa
+    salida.unlink()
+    ejecutar()
+    assert parseados == [fuente.name, fuente.name]
+    assert salida.read_bytes() == contenido
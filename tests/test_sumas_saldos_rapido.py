@@ -0,0 +1,60 @@
+"""La lectura vectorizada de sumas y saldos da los mismos registros que el parser por líneas."""
+
+from pathlib import Path
+
+from procesar_datos import ProcesadorDatos
+
+
+CABECERA = ('\tSoc.\t\tCta.mayor\t\t\tTexto explicativo\t\t\t\tMon.\tDiv.\t     Arrastre de saldos'
+            '\t\t   Saldo per.anteriores\t\tPeríodo de informe debe\t   Saldo Haber per.inf.\t        Saldo acumulado')
+
+
+def fila(cuenta: str, texto: str, arrastre: str, debe: str, haber: str) -> str:
+    return (f'\tEL00\t\t{cuenta}\t\t\t{texto}\t\t\t\tEUR\t\t{arrastre}\t\t                  0,00'
+            f'\t\t{debe:>22}\t{haber:>22}\t{arrastre}')
+
+
+def escribir_sys(ruta: Path, filas):
+    """Informe de saldos SAP (UTF-16) con salto de página, separadores y una fila incompleta."""
+    lineas = ['CRISOL   Saldos de cuentas de mayor   Fecha 23.10.2025', 'MADRID   Página         1',
+              'Períodos de arrastre 00-00 2025 Períodos informe 01-09 2025', '', CABECERA, '']
+    lineas += filas[:2] + ['=' * 40, 'CRISOL   Página         2', ''] + filas[2:]
+    lineas += ['\tEL00\t\t57000000\t\t\tCaja']
+    ruta.write_text('﻿' + '\n'.join(lineas) + '\n', encoding='utf-16-le')
+
+
+def parsear_por_lineas(procesador: ProcesadorDatos, ruta: Path):
+    lineas = ruta.read_text(encoding='utf-16-le').splitlines(keepends=True)
+    inicio, columnas = procesador.detectar_inicio_datos_sys(lineas)
+    return procesador.parsear_sys(lineas, inicio, columnas)
+
+
+FILAS = [
+    fila('10000000', 'Capital social', '-3.050,00', '0,00', '0,00'),
+    fila('11300000', 'Reservas voluntarias', '-962.492,51', '0,00', '1.617.837,52'),
+    fila('12900000', 'Resultado del ejercicio', '-1.617.837,52', '1.617.837,52', '0,00'),
+    fila('43000000', 'Clientes (€) año', '1.234,5', '12,00', '7,25'),
+]
+
+
+def test_lectura_rapida_igual_que_por_lineas(tmp_path):
+    ruta = tmp_path / 'SYS 30.09.2025.XLS'
+    escribir_sys(ruta, FILAS)
+    procesador = ProcesadorDatos(None, str(tmp_path), str(tmp_path), intervalo_progreso=None)
+
+    rapido = procesador.procesar_sys_rapido(ruta)
+    assert rapido is not None
+    assert rapido == parsear_por_lineas(procesador, ruta)
+    assert len(rapido) == len(FILAS) + 1
+    assert rapido[1]['Saldo Haber per.inf.'] == '1617837.52'
+
+
+def test_caracter_nulo_usa_el_parser_por_lineas(tmp_path):
+    ruta = tmp_path / 'SYS 30.09.2025.XLS'
+    escribir_sys(ruta, FILAS[:2] + [fila('20000000', 'Texto\x00cortado', '1,00', '0,00', '0,00')] + FILAS[2:])
+    procesador = ProcesadorDatos(None, str(tmp_path), str(tmp_path), intervalo_progreso=None)
+
+    assert procesador.procesar_sys_rapido(ruta) is None
+    registros = procesador.procesar_sys(ruta)
+    assert registros == parsear_por_lineas(procesador, ruta)
+    assert registros[2]['Texto explicativo'] == 'Texto\x00cortado'